@@ -0,0 +1,219 @@
+"""
+Magasin de sauvegarde adressé par contenu (dédupliqué)
+
+Remplace l'arborescence miroir des sauvegardes quand elle est activée: chaque
+fichier supprimé est stocké une seule fois sous blobs/, nommé par le SHA-256
+de son contenu, et un index SQLite associe chaque chemin d'origine à son
+blob. Un album réimporté puis supprimé à nouveau ne recopie rien; la
+restauration se fait toujours par chemin d'origine.
+
+Disposition:
+    <racine>/index.db
+    <racine>/blobs/ab/cd/abcd...   (SHA-256 hexadécimal)
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from file_backup import BackupStrategy
+
+# Taille des lectures pour le hachage
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def content_hash(file_path: Path) -> str:
+    """SHA-256 hexadécimal du contenu complet d'un fichier"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ContentBackupStore:
+    """Blobs dédupliqués par contenu + index chemin d'origine -> blob
+
+    put() hache le fichier; si le blob existe déjà, rien n'est écrit
+    (méthode 'dedup'), sinon il est placé via BackupStrategy (rename,
+    hardlink, reflink, copie) sous un nom temporaire puis renommé: un blob
+    présent est toujours complet. L'entrée et une intention (table pending)
+    sont validées avant de toucher au fichier: après une interruption,
+    recover() termine ou annule les placements en cours. Utilisable depuis
+    plusieurs threads.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.blob_dir = self.root / 'blobs'
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.strategy = BackupStrategy(self.root)
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.root / 'index.db'), check_same_thread=False)
+        self.conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            stored_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_path TEXT NOT NULL,
+            hash TEXT NOT NULL REFERENCES blobs(hash),
+            backed_up_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_path ON entries(original_path);
+        CREATE INDEX IF NOT EXISTS entries_hash ON entries(hash);
+        CREATE TABLE IF NOT EXISTS pending (
+            temporary TEXT PRIMARY KEY,     -- nom temporaire du blob en cours de placement
+            hash TEXT NOT NULL,
+            entry_id INTEGER NOT NULL
+        );
+        """)
+        # (blobs terminés, entrées annulées) par la reprise à l'ouverture
+        self.recovered = self.recover()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest[2:4] / digest
+
+    def put(self, file_path: Path, move: bool = False) -> Tuple[str, str]:
+        """Sauvegarde un fichier; retourne (méthode, hash)
+
+        Avec move=True le fichier peut être déplacé dans le magasin
+        (méthode 'rename'); sinon, et pour 'dedup', il reste en place.
+        """
+        digest = content_hash(file_path)
+        blob = self.blob_path(digest)
+        now = datetime.now().isoformat()
+
+        if blob.exists():
+            with self.lock:
+                self.conn.execute("INSERT INTO entries (original_path, hash, backed_up_at) VALUES (?, ?, ?)",
+                                  (str(file_path), digest, now))
+                self.conn.commit()
+            return self.strategy.count('dedup'), digest
+
+        size = file_path.stat().st_size
+        temporary = blob.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        # Intention validée avant tout déplacement: une interruption ne perd jamais le fichier
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO blobs (hash, size, stored_at) VALUES (?, ?, ?)",
+                              (digest, size, now))
+            entry_id = self.conn.execute(
+                "INSERT INTO entries (original_path, hash, backed_up_at) VALUES (?, ?, ?)",
+                (str(file_path), digest, now)).lastrowid
+            self.conn.execute("INSERT OR REPLACE INTO pending (temporary, hash, entry_id) VALUES (?, ?, ?)",
+                              (str(temporary), digest, entry_id))
+            self.conn.commit()
+
+        try:
+            method = self.strategy.place_at(file_path, temporary, move)
+            os.replace(temporary, blob)
+        except Exception:
+            temporary.unlink(missing_ok=True)
+            with self.lock:
+                self.conn.execute("DELETE FROM pending WHERE temporary = ?", (str(temporary),))
+                self._forget_entry(entry_id, digest)
+                self.conn.commit()
+            raise
+
+        with self.lock:
+            self.conn.execute("DELETE FROM pending WHERE temporary = ?", (str(temporary),))
+            self.conn.commit()
+        return method, digest
+
+    def _forget_entry(self, entry_id: int, digest: str):
+        """Retire une entrée dont le blob n'a pas été placé (verrou tenu par l'appelant)"""
+        self.conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        if not self.blob_path(digest).exists():
+            self.conn.execute("""
+                DELETE FROM blobs WHERE hash = ?
+                AND hash NOT IN (SELECT hash FROM entries)
+                AND hash NOT IN (SELECT hash FROM pending)
+            """, (digest,))
+
+    def recover(self) -> Tuple[int, int]:
+        """Termine ou annule les placements interrompus; retourne (blobs terminés, entrées annulées)
+
+        Un fichier temporaire complet (hash vérifié) devient le blob: le
+        fichier d'origine a pu y être déplacé, il n'est plus ailleurs. Sinon
+        le fichier d'origine n'a pas quitté sa place et l'entrée est retirée.
+        """
+        completed = cancelled = 0
+        with self.lock:
+            pending = self.conn.execute("SELECT temporary, hash, entry_id FROM pending").fetchall()
+            for temporary, digest, entry_id in pending:
+                temporary = Path(temporary)
+                blob = self.blob_path(digest)
+                if temporary.exists():
+                    if not blob.exists() and content_hash(temporary) == digest:
+                        os.replace(temporary, blob)
+                        completed += 1
+                    else:
+                        temporary.unlink()
+                self.conn.execute("DELETE FROM pending WHERE temporary = ?", (str(temporary),))
+                if not blob.exists():
+                    self._forget_entry(entry_id, digest)
+                    cancelled += 1
+            self.conn.commit()
+        return completed, cancelled
+
+    def versions(self, original_path: str) -> List[Dict]:
+        """Sauvegardes d'un chemin d'origine, la plus récente en premier"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT e.hash, e.backed_up_at, b.size FROM entries e
+                JOIN blobs b ON b.hash = e.hash
+                WHERE e.original_path = ?
+                ORDER BY e.id DESC
+            """, (original_path,)).fetchall()
+        return [{'hash': digest, 'backed_up_at': backed_up_at, 'size': size}
+                for digest, backed_up_at, size in rows]
+
+    def restore(self, original_path: str, destination: Optional[Path] = None,
+                overwrite: bool = False) -> Path:
+        """Recopie la dernière sauvegarde d'un chemin (par défaut à son emplacement d'origine)
+
+        Copie indépendante du blob (jamais de hardlink: une écriture de tags
+        sur le fichier restauré modifierait la sauvegarde). Lève
+        FileNotFoundError si le chemin n'a pas de sauvegarde, FileExistsError
+        si la destination existe et overwrite est faux.
+        """
+        versions = self.versions(original_path)
+        if not versions:
+            raise FileNotFoundError(f"Aucune sauvegarde pour {original_path}")
+        target = Path(destination) if destination else Path(original_path)
+        if target.exists() and not overwrite:
+            raise FileExistsError(f"Destination existante: {target}")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(self.blob_path(versions[0]['hash']), target)
+        return target
+
+    def prune(self, max_age_days: float) -> Tuple[int, int]:
+        """Oublie les sauvegardes plus anciennes que max_age_days et supprime les blobs orphelins
+
+        Retourne (entrées supprimées, blobs supprimés).
+        """
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        with self.lock:
+            removed_entries = self.conn.execute("DELETE FROM entries WHERE backed_up_at < ?", (cutoff,)).rowcount
+            orphans = [row[0] for row in self.conn.execute(
+                "SELECT hash FROM blobs WHERE hash NOT IN (SELECT hash FROM entries)")]
+            for digest in orphans:
+                try:
+                    self.blob_path(digest).unlink()
+                except FileNotFoundError:
+                    pass
+                self.conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            self.conn.commit()
+        return removed_entries, len(orphans)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,137 @@
+"""
+Journal d'écriture anticipée (write-ahead) des suppressions
+
+Une purge se déroule en phases journalisées dans un fichier JSON Lines:
+1. begin + plan: la liste complète des fichiers à supprimer, synchronisée
+   sur disque (fsync) avant de toucher au moindre fichier
+2. deleted: un enregistrement par fichier sauvegardé puis supprimé, écrits
+   par lots (un fsync par lot, pas par fichier)
+3. db_cleaned: nettoyage de la base Plex en une transaction
+4. fin: le rapport est écrit et le journal supprimé
+
+Après un arrêt brutal, le journal restant est rejoué: les fichiers planifiés
+encore présents sont supprimés, ceux déjà absents comptent comme supprimés,
+puis la base et le rapport sont traités. Rejouer plusieurs fois ne change
+rien de plus.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_DELETION_JOURNAL = Path.home() / '.cache' / 'plex_ratings_sync' / 'deletion_journal.jsonl'
+
+# Enregistrements « deleted » accumulés avant chaque écriture + fsync
+JOURNAL_BATCH_SIZE = 200
+
+class DeletionJournal:
+    """Journal de suppression en JSON Lines, ajouts groupés, utilisable depuis plusieurs threads"""
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = JOURNAL_BATCH_SIZE):
+        self.path = Path(path) if path else DEFAULT_DELETION_JOURNAL
+        self.batch_size = max(1, batch_size)
+        self.lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._file = None
+
+        # État relu du journal existant (exécution interrompue)
+        self.header: Optional[Dict] = None
+        self.planned: Dict[str, Dict] = {}
+        self.deleted: Dict[str, Dict] = {}
+        self.db_cleaned = False
+        self.cleaned_entries = 0
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par l'arrêt: ignorée
+                    continue
+                op = record.get('op')
+                if op == 'begin':
+                    self.header = record
+                elif op == 'plan':
+                    self.planned[record['file']['file_path']] = record['file']
+                elif op == 'deleted':
+                    self.deleted[record['file']['file_path']] = record['file']
+                elif op == 'db_cleaned':
+                    self.db_cleaned = True
+                    self.cleaned_entries = record.get('entries', 0)
+
+    @property
+    def pending(self) -> bool:
+        """Vrai si une purge précédente n'a pas été menée à son terme"""
+        return self.header is not None
+
+    def begin(self, files: List[Dict], **header):
+        """Ouvre une purge: en-tête et plan complet, synchronisés avant toute suppression"""
+        self.header = {'op': 'begin', 'started_at': datetime.now().isoformat(), **header}
+        self.planned = {f['file_path']: f for f in files}
+        self.deleted = {}
+        self.db_cleaned = False
+        self.cleaned_entries = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._buffer.append(json.dumps(self.header, ensure_ascii=False))
+            self._buffer.extend(json.dumps({'op': 'plan', 'file': f}, ensure_ascii=False) for f in files)
+            self._flush()
+
+    def resume(self):
+        """Reprend l'ajout à la suite d'un journal existant (rejeu)"""
+        with self.lock:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record_deleted(self, record: Dict):
+        """Mémorise un fichier supprimé; écrit sur disque par lots de batch_size"""
+        with self.lock:
+            self.deleted[record['file_path']] = record
+            self._buffer.append(json.dumps({'op': 'deleted', 'file': record}, ensure_ascii=False))
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def mark_db_cleaned(self, cleaned_entries: int):
+        with self.lock:
+            self.db_cleaned = True
+            self.cleaned_entries = cleaned_entries
+            self._buffer.append(json.dumps({'op': 'db_cleaned', 'entries': cleaned_entries}))
+            self._flush()
+
+    def sync(self):
+        """Écrit et synchronise les enregistrements en attente"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer or self._file is None:
+            return
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+
+    def finish(self):
+        """Purge terminée (base nettoyée, rapport écrit): le journal est supprimé"""
+        with self.lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.path.unlink(missing_ok=True)
+        self.header = None
+
+    def close(self):
+        """Ferme le journal sans le supprimer (purge interrompue, rejouée plus tard)"""
+        with self.lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,124 @@
+"""
+Sauvegarde des fichiers avant suppression sans recopier le contenu audio
+
+Quand le répertoire de sauvegarde est sur le même système de fichiers que la
+bibliothèque, le fichier est simplement déplacé (rename) dans la quarantaine
+ou lié (hardlink): aucune donnée n'est copiée. Sur un système copy-on-write
+(Btrfs, XFS reflink...) un clone FICLONE partage les blocs. La copie
+intégrale (shutil.copy2, sendfile côté noyau) n'est que le dernier recours.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+# ioctl Linux FICLONE = _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Backups (et suppressions) simultanés lors des purges
+DEFAULT_BACKUP_JOBS = 4
+
+# Erreurs signifiant « méthode non applicable ici », pas un échec de sauvegarde:
+# - pour tout le périphérique (mémorisées, la méthode n'est plus retentée)
+DEVICE_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS, errno.ENOTTY}
+# - pour ce fichier seulement (protected_hardlinks, propriétaire, trop de liens...)
+FILE_UNSUPPORTED_ERRNOS = {errno.EPERM, errno.EMLINK, errno.EINVAL}
+UNSUPPORTED_ERRNOS = DEVICE_UNSUPPORTED_ERRNOS | FILE_UNSUPPORTED_ERRNOS
+
+class BackupStrategy:
+    """Sauvegarde miroir (chemin absolu recréé sous backup_dir) au moindre coût
+
+    Ordre: rename (si move=True: le fichier quitte la bibliothèque), hardlink,
+    reflink FICLONE, copie. Une méthode que le périphérique source ne prend
+    pas en charge n'est plus retentée pour lui; un refus propre au fichier
+    (EPERM, EMLINK...) ne vaut que pour ce fichier. Les compteurs par méthode sont dans
+    self.counts. Utilisable depuis plusieurs threads.
+    """
+
+    METHODS = ('rename', 'hardlink', 'reflink', 'copy')
+
+    def __init__(self, backup_dir: Path):
+        self.backup_dir = Path(backup_dir)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {method: 0 for method in self.METHODS}
+        # Répertoires de destination créés (évite un mkdir par fichier)
+        self._created_dirs = set()
+        # (périphérique source, méthode) refusés vers backup_dir
+        self._unsupported = set()
+
+    def backup_path(self, file_path: Path) -> Path:
+        """Chemin miroir du fichier dans le répertoire de sauvegarde"""
+        return self.backup_dir / file_path.relative_to(file_path.anchor)
+
+    def place(self, source: Path, move: bool = False) -> Tuple[str, Path]:
+        """Sauvegarde source; move=True autorise le déplacement (suppression incluse)
+
+        Retourne (méthode, chemin de sauvegarde). Lève OSError si aucune
+        méthode n'aboutit.
+        """
+        destination = self.backup_path(source)
+        return self.place_at(source, destination, move), destination
+
+    def place_at(self, source: Path, destination: Path, move: bool = False) -> str:
+        """Place source à un chemin donné; retourne la méthode utilisée"""
+        self._ensure_dir(destination.parent)
+        device = source.stat().st_dev
+        attempts = [('hardlink', self._hardlink), ('reflink', self._reflink)]
+        if move:
+            attempts.insert(0, ('rename', os.replace))
+
+        for method, operation in attempts:
+            key = (device, method)
+            if key in self._unsupported:
+                continue
+            try:
+                operation(source, destination)
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                if e.errno in DEVICE_UNSUPPORTED_ERRNOS:
+                    with self.lock:
+                        self._unsupported.add(key)
+                continue
+            return self.count(method)
+
+        shutil.copy2(source, destination)
+        return self.count('copy')
+
+    def count(self, method: str) -> str:
+        """Comptabilise une sauvegarde (méthode de METHODS ou propre à l'appelant)"""
+        with self.lock:
+            self.counts[method] = self.counts.get(method, 0) + 1
+        return method
+
+    def _ensure_dir(self, directory: Path):
+        key = str(directory)
+        if key in self._created_dirs:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            self._created_dirs.add(key)
+
+    @staticmethod
+    def _hardlink(source: Path, destination: Path):
+        # Sauvegarde précédente au même chemin: remplacée comme le faisait copy2
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            os.unlink(destination)
+            os.link(source, destination)
+
+    @staticmethod
+    def _reflink(source: Path, destination: Path):
+        with open(source, 'rb') as src:
+            with open(destination, 'wb') as dst:
+                try:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                except OSError:
+                    dst.close()
+                    os.unlink(destination)
+                    raise
+        shutil.copystat(source, destination)
@@ -0,0 +1,126 @@
+"""
+Carte d'existence des fichiers construite par listage de répertoires
+
+Sur un montage réseau ou USB (NFS/SMB), un stat par fichier coûte un aller-
+retour. Les chemins candidats sont regroupés par répertoire et chaque
+répertoire est listé une seule fois avec os.scandir, plusieurs répertoires en
+parallèle. Les étapes suivantes (vérification, suppression, identification,
+écriture de tags) interrogent la carte au lieu de refaire Path.exists().
+"""
+
+import os
+import stat
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple, TypeVar
+
+from worker_pool import run_bounded
+
+# Répertoires listés simultanément
+DEFAULT_SCAN_JOBS = 8
+# Éléments lus d'un flux avant chaque listage groupé (prefetch)
+PREFETCH_CHUNK_SIZE = 500
+
+T = TypeVar('T')
+
+class FileCatalog:
+    """Existence et (taille, mtime en ns) des fichiers, par répertoire listé
+
+    Seuls les fichiers candidats d'un répertoire sont stat-és lors du
+    listage (dans le même worker); les autres noms sont stat-és à la demande.
+    Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, jobs: int = DEFAULT_SCAN_JOBS):
+        self.jobs = max(1, jobs)
+        self.lock = threading.Lock()
+        # Répertoire -> {nom: (taille, mtime_ns) ou None si pas encore stat-é}; None si illisible
+        self._dirs: Dict[str, Optional[Dict[str, Optional[Tuple[int, int]]]]] = {}
+        self.dirs_listed = 0
+
+    def scan(self, paths: Iterable[str]) -> int:
+        """Liste les répertoires des chemins donnés pas encore connus; retourne leur nombre"""
+        wanted: Dict[str, Set[str]] = {}
+        with self.lock:
+            for path in paths:
+                directory, name = os.path.split(path)
+                if directory not in self._dirs:
+                    wanted.setdefault(directory, set()).add(name)
+
+        for _index, directory, entries in run_bounded(
+                lambda directory: self._list_dir(directory, wanted[directory]), wanted, self.jobs):
+            with self.lock:
+                self._dirs[directory] = entries
+                self.dirs_listed += 1
+        return len(wanted)
+
+    def prefetch(self, items: Iterable[T], key: Callable[[T], str],
+                 chunk_size: int = PREFETCH_CHUNK_SIZE) -> Iterator[T]:
+        """Relaie un flux en listant les répertoires de chaque paquet avant de le céder"""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self.scan(key(entry) for entry in chunk)
+                yield from chunk
+                chunk = []
+        if chunk:
+            self.scan(key(entry) for entry in chunk)
+            yield from chunk
+
+    def stat(self, path: str) -> Optional[Tuple[int, int]]:
+        """(taille, mtime en ns) d'un fichier, ou None s'il n'existe pas"""
+        directory, name = os.path.split(path)
+        with self.lock:
+            listed = directory in self._dirs
+        if not listed:
+            self.scan([path])
+
+        with self.lock:
+            entries = self._dirs[directory]
+            if entries is None or name not in entries:
+                return None
+            fingerprint = entries[name]
+        if fingerprint is None:
+            # Présent au listage mais pas candidat: stat ponctuel
+            try:
+                info = os.stat(path)
+            except OSError:
+                return None
+            if not stat.S_ISREG(info.st_mode):
+                return None
+            fingerprint = (info.st_size, info.st_mtime_ns)
+            with self.lock:
+                entries[name] = fingerprint
+        return fingerprint
+
+    def exists(self, path: str) -> bool:
+        """Vrai si le fichier était présent au listage de son répertoire"""
+        return self.stat(path) is not None
+
+    def forget(self, path: str):
+        """Retire un fichier de la carte (supprimé ou déplacé par nous)"""
+        directory, name = os.path.split(path)
+        with self.lock:
+            entries = self._dirs.get(directory)
+            if entries:
+                entries.pop(name, None)
+
+    @staticmethod
+    def _list_dir(directory: str, candidates: Set[str]) -> Optional[Dict[str, Optional[Tuple[int, int]]]]:
+        entries = {}
+        try:
+            with os.scandir(directory or '.') as iterator:
+                for entry in iterator:
+                    if entry.name not in candidates:
+                        entries[entry.name] = None
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    entries[entry.name] = (info.st_size, info.st_mtime_ns)
+        except OSError:
+            return None
+        return entries
@@ -0,0 +1,91 @@
+"""
+Envoi asynchrone et groupé des notifications via plex_notifications.sh
+
+Les événements par fichier (identification songrec...) sont accumulés en
+mémoire puis fusionnés en une seule notification à la fin d'une étape.
+Les appels au script tournent dans un thread dédié: la boucle de traitement
+n'attend jamais un fork de bash ni notify-send.
+"""
+
+import queue
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+NOTIFICATIONS_SCRIPT = Path(__file__).parent / 'plex_notifications.sh'
+
+# Nombre maximal de lignes de détail dans une notification groupée
+MAX_BATCH_DETAILS = 20
+
+class NotificationDispatcher:
+    """File de notifications vidée par un thread en arrière-plan"""
+
+    def __init__(self, script_path: Optional[Path] = None, logger: Optional[logging.Logger] = None,
+                 timeout: float = 10):
+        self.script_path = Path(script_path) if script_path else NOTIFICATIONS_SCRIPT
+        self.logger = logger or logging.getLogger(__name__)
+        self.timeout = timeout
+        self.available = self.script_path.exists()
+
+        self.events: Dict[str, List[Tuple[str, str]]] = {}
+        self.events_lock = threading.Lock()
+        self.queue: queue.Queue = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+
+    def send(self, action: str, *args, description: Optional[str] = None):
+        """Met une notification en file (non bloquant)"""
+        if not self.available:
+            self.logger.warning(f"Script de notifications introuvable: {self.script_path}")
+            return
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name='notifications', daemon=True)
+            self.worker.start()
+        self.queue.put(([str(self.script_path), action] + [str(arg) for arg in args], description))
+
+    def add_event(self, stage: str, kind: str, text: str):
+        """Accumule un événement par fichier, envoyé plus tard par flush()"""
+        with self.events_lock:
+            self.events.setdefault(stage, []).append((kind, text))
+
+    def flush(self, stage: str, action: str, kinds: Sequence[str]):
+        """Fusionne les événements d'une étape en une notification groupée
+
+        Arguments passés au script: un compteur par type d'événement (dans
+        l'ordre de kinds) puis les lignes de détail, tronquées à MAX_BATCH_DETAILS.
+        """
+        with self.events_lock:
+            events = self.events.pop(stage, [])
+        if not events:
+            return
+
+        counts = [sum(1 for kind, _text in events if kind == wanted) for wanted in kinds]
+        details = [text for _kind, text in events[:MAX_BATCH_DETAILS]]
+        if len(events) > MAX_BATCH_DETAILS:
+            details.append(f"... et {len(events) - MAX_BATCH_DETAILS} autre(s)")
+
+        self.send(action, *counts, '\n'.join(details),
+                  description=f"{len(events)} événement(s) {stage} groupés")
+
+    def close(self, timeout: float = 30):
+        """Attend l'envoi des notifications en file (au plus timeout secondes)"""
+        if self.worker is None:
+            return
+        self.queue.put(None)
+        self.worker.join(timeout)
+        if self.worker.is_alive():
+            self.logger.warning("⚠️ Notifications encore en file à la fermeture")
+        self.worker = None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            command, description = item
+            try:
+                subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+                self.logger.debug(f"🔔 Notification envoyée: {description or command[1]}")
+            except Exception as e:
+                self.logger.warning(f"Erreur lors de l'envoi de la notification {command[1]}: {e}")
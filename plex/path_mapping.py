@@ -0,0 +1,99 @@
+"""
+Réécriture des préfixes de chemins entre Plex et l'hôte
+
+Plex enregistre dans media_parts.file les chemins tels que Plex Media Server
+les voit (montages de conteneur, autre machine); la synchronisation tourne sur
+l'hôte où la même bibliothèque est ailleurs (/mnt/mybook/itunes/Music...).
+Les correspondances sont compilées une fois en un index par longueur de
+préfixe: chaque chemin coûte au plus une recherche de dictionnaire par
+longueur distincte, le plus long préfixe l'emporte.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def parse_path_mapping(spec: str) -> Tuple[str, str]:
+    """'PRÉFIXE_PLEX=PRÉFIXE_HÔTE' -> (préfixe Plex, préfixe hôte)"""
+    plex_prefix, separator, host_prefix = spec.partition('=')
+    if not separator or not plex_prefix or not host_prefix:
+        raise ValueError(f"Correspondance invalide (attendu PRÉFIXE_PLEX=PRÉFIXE_HÔTE): {spec}")
+    return plex_prefix, host_prefix
+
+class PathMapper:
+    """Correspondances de préfixes compilées (Plex -> hôte et hôte -> Plex)
+
+    Un préfixe ne s'applique qu'à une frontière de composant: /music
+    couvre /music/a.mp3 mais pas /music2/a.mp3. Sans correspondance, le
+    chemin est renvoyé tel quel. Les correspondances doivent être
+    réversibles (ValueError sinon): un préfixe Plex ne mène qu'à un préfixe
+    hôte et réciproquement, faute de quoi le nettoyage de la base Plex
+    retrouverait un autre chemin que celui enregistré.
+    """
+
+    def __init__(self, mappings: Iterable[Tuple[str, str]] = ()):
+        pairs = list(dict.fromkeys((self._normalize(plex), self._normalize(host)) for plex, host in mappings))
+        self._check_unique(pairs, 0, "Préfixe Plex")
+        self._check_unique(pairs, 1, "Préfixe hôte")
+        self._forward = self._compile(pairs)
+        self._reverse = self._compile([(host, plex) for plex, host in pairs])
+        # to_host est appelé depuis les threads de vérification
+        self._count_lock = threading.Lock()
+        self.mapped_count = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._forward[1])
+
+    @staticmethod
+    def _normalize(prefix: str) -> str:
+        # '/' seul reste '/', sinon pas de séparateur final
+        return prefix.rstrip('/') or '/'
+
+    @staticmethod
+    def _check_unique(pairs: List[Tuple[str, str]], side: int, label: str):
+        seen: Dict[str, str] = {}
+        for pair in pairs:
+            key, other = pair[side], pair[1 - side]
+            if key in seen:
+                raise ValueError(f"{label} {key} associé à deux correspondances "
+                                 f"({seen[key]} et {other}): la réécriture ne serait pas réversible")
+            seen[key] = other
+
+    @staticmethod
+    def _compile(pairs: List[Tuple[str, str]]) -> Tuple[List[int], Dict[str, str]]:
+        index = {}
+        for source, target in pairs:
+            index[source] = target
+        # Longueurs décroissantes: le premier préfixe trouvé est le plus long
+        return sorted({len(source) for source in index}, reverse=True), index
+
+    @staticmethod
+    def _apply(compiled: Tuple[List[int], Dict[str, str]], path: Optional[str]) -> Optional[str]:
+        lengths, index = compiled
+        if not path or not index:
+            return path
+        path_length = len(path)
+        for length in lengths:
+            if length > path_length:
+                continue
+            target = index.get(path[:length])
+            if target is None:
+                continue
+            if length == path_length:
+                return target
+            if path[length] == '/':
+                return target + path[length:] if target != '/' else path[length:]
+            if path[length - 1] == '/':  # Préfixe racine '/'
+                return target.rstrip('/') + '/' + path[length:]
+        return path
+
+    def to_host(self, path: Optional[str]) -> Optional[str]:
+        """Chemin Plex -> chemin sur l'hôte"""
+        mapped = self._apply(self._forward, path)
+        if mapped is not path:
+            with self._count_lock:
+                self.mapped_count += 1
+        return mapped
+
+    def to_plex(self, path: Optional[str]) -> Optional[str]:
+        """Chemin hôte -> chemin tel qu'enregistré par Plex (nettoyage de la base)"""
+        return self._apply(self._reverse, path)
@@ -0,0 +1,123 @@
+"""
+Pipeline à étages reliés par des files bornées
+
+Chaque étage a ses propres threads et une file d'entrée de taille bornée:
+la source (lecture de la base Plex) produit pendant que les étages suivants
+(vérifications, lecture des tags, écriture) consomment. Un étage lent ne
+fait pas grossir la mémoire, il ralentit seulement ceux qui l'alimentent.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple
+
+# Éléments en attente par file entre deux étages
+DEFAULT_BUFFER_SIZE = 256
+
+# Délai des attentes sur les files: vérification régulière de l'arrêt
+POLL_INTERVAL = 0.2
+
+_END = object()
+
+class Stage(NamedTuple):
+    """Étage du pipeline: func(item) -> item, exécutée par `jobs` threads"""
+    name: str
+    func: Callable[[Any], Any]
+    jobs: int = 1
+
+class _Failure(NamedTuple):
+    error: BaseException
+
+def run_pipeline(source: Iterable[Any], stages: List[Stage],
+                 is_done: Callable[[Any], bool] = lambda item: False,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE) -> Iterator[Any]:
+    """Fait passer les éléments de source dans les étages; produit les éléments terminés
+
+    Un élément pour lequel is_done(item) est vrai après un étage saute les
+    étages restants. Les éléments sortent dans l'ordre d'achèvement. La
+    source est parcourue dans son propre thread. Une exception levée par la
+    source ou un étage arrête le pipeline et est relancée chez l'appelant;
+    un appelant qui abandonne le générateur arrête aussi les threads.
+    """
+    stop = threading.Event()
+    # Une file bornée en entrée de chaque étage; la sortie, vidée par l'appelant, ne l'est pas
+    queues = [queue.Queue(maxsize=buffer_size) for _ in stages] + [queue.Queue()]
+    output = queues[-1]
+
+    def put(target: queue.Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fail(error: BaseException):
+        # Signalé directement à l'appelant, même si les files sont pleines
+        stop.set()
+        output.put_nowait(_Failure(error))
+
+    def produce():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+            put(queues[0], _END)
+        except BaseException as e:
+            fail(e)
+
+    def make_worker(position: int, stage: Stage, remaining: List[int], lock: threading.Lock):
+        inbox = queues[position]
+
+        def forward(item: Any) -> bool:
+            # Élément terminé: directement vers la sortie, sinon étage suivant
+            return put(output if is_done(item) else queues[position + 1], item)
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        item = inbox.get(timeout=POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                    if item is _END:
+                        # Rendu pour les autres threads de l'étage; le dernier le transmet
+                        put(inbox, _END)
+                        with lock:
+                            remaining[0] -= 1
+                            last = remaining[0] == 0
+                        if last:
+                            put(queues[position + 1], _END)
+                        return
+                    if not forward(stage.func(item)):
+                        return
+            except BaseException as e:
+                fail(e)
+
+        return work
+
+    threads = [threading.Thread(target=produce, name='pipeline-source', daemon=True)]
+    for position, stage in enumerate(stages):
+        jobs = max(1, stage.jobs)
+        remaining, lock = [jobs], threading.Lock()
+        threads.extend(
+            threading.Thread(target=make_worker(position, stage, remaining, lock),
+                             name=f"pipeline-{stage.name}-{n}", daemon=True)
+            for n in range(jobs)
+        )
+
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = output.get()
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -10,6 +10,9 @@ AUDIO_LIBRARY="/mnt/mybook/itunes/Music"
 LOG_DIR="$HOME/logs/plex_daily"
 BACKUP_DIR="$HOME/plex_backup"
 SONGREC_QUEUE_DIR="$HOME/songrec_queue"
+# 1: sauvegardes dans un magasin dédupliqué par contenu au lieu des copies mensuelles
+USE_BACKUP_STORE="${PLEX_BACKUP_STORE:-0}"
+BACKUP_STORE="$BACKUP_DIR/store"
 
 # Couleurs pour les logs
 RED='\033[0;31m'
@@ -54,19 +57,20 @@ if [ ! -d "$AUDIO_LIBRARY" ]; then
     exit 1
 fi
 
-# Vérifier l'accès à la base Plex
-PLEX_DB=$(python3 "$SCRIPT_DIR/plex_ratings_sync.py" --auto-find-db --stats 2>/dev/null | head -1 || echo "")
-if [ -z "$PLEX_DB" ]; then
-    log "${RED}❌ ERREUR: Base de données Plex introuvable${NC}"
-    exit 1
-fi
-
 log "${GREEN}✅ Prérequis OK${NC}"
 
-# Créer un répertoire de sauvegarde mensuel
+# Créer un répertoire de sauvegarde mensuel (ou utiliser le magasin dédupliqué)
 MONTHLY_BACKUP="$BACKUP_DIR/monthly_$(date +%Y%m)"
-mkdir -p "$MONTHLY_BACKUP"
-log "💾 Sauvegarde mensuelle: $MONTHLY_BACKUP"
+if [ "$USE_BACKUP_STORE" = "1" ]; then
+    BACKUP_ARGS=(--backup "$BACKUP_STORE" --backup-store)
+    BACKUP_LOCATION="$BACKUP_STORE"
+    log "💾 Magasin de sauvegarde dédupliqué: $BACKUP_STORE"
+else
+    mkdir -p "$MONTHLY_BACKUP"
+    BACKUP_ARGS=(--backup "$MONTHLY_BACKUP/deleted_1_star")
+    BACKUP_LOCATION="$MONTHLY_BACKUP"
+    log "💾 Sauvegarde mensuelle: $MONTHLY_BACKUP"
+fi
 
 # ================================================================
 # ÉTAPE 1: ANALYSER LES RATINGS ACTUELS
@@ -75,160 +79,42 @@ log ""
 log "${BLUE}📊 ÉTAPE 1: Analyse des ratings actuels${NC}"
 log "========================================"
 
-# Obtenir les statistiques détaillées
-/home/paulceline/bin/audio/.venv/bin/python "$SCRIPT_DIR/plex_ratings_sync.py" --auto-find-db --stats >> "$LOG_FILE" 2>&1
-
-# Extraire les fichiers par rating pour traitement (albums ET pistes)
-log "🔍 Extraction des ratings d'albums et de pistes..."
+# Classification complète en une seule lecture de la base Plex:
+# statistiques (dans le log), fichiers 1⭐/2⭐/3-5⭐, albums/artistes et comptes
+log "🔍 Extraction des ratings d'albums, d'artistes et de pistes..."
 
 # Créer des listes temporaires
 TEMP_DIR="/tmp/plex_ratings_$$"
 mkdir -p "$TEMP_DIR"
+PLAN_FILE="$TEMP_DIR/ratings_plan.json"
 
-# NOUVELLE APPROCHE: Utiliser le gestionnaire d'albums pour une analyse complète
-log "📀 Analyse des albums avec ratings..."
-/home/paulceline/bin/audio/.venv/bin/python "$SCRIPT_DIR/../utils/album_ratings_manager.py" "$PLEX_DB" "$TEMP_DIR" >> "$LOG_FILE" 2>&1
+if ! /home/paulceline/bin/audio/.venv/bin/python "$SCRIPT_DIR/plex_ratings_sync.py" --auto-find-db --emit-plan "$PLAN_FILE" >> "$LOG_FILE" 2>&1; then
+    log "${RED}❌ ERREUR: Base de données Plex introuvable ou illisible${NC}"
+    rm -rf "$TEMP_DIR"
+    exit 1
+fi
 
-# Vérifier que l'analyse a réussi
-if [ ! -f "$TEMP_DIR/ratings_stats.json" ]; then
-    log "${YELLOW}⚠️ Fallback: Analyse classique des pistes uniquement${NC}"
-    
-    # Fallback vers l'ancienne méthode si le nouveau script échoue
-    /home/paulceline/bin/audio/.venv/bin/python -c "
-import sqlite3
-import json
-
-# Chemin direct vers la base Plex snap
-plex_db = '/var/snap/plexmediaserver/common/Library/Application Support/Plex Media Server/Plug-in Support/Databases/com.plexapp.plugins.library.db'
-
-try:
-    conn = sqlite3.connect(plex_db)
-    cursor = conn.cursor()
-
-    query = '''
-    SELECT 
-        mi.title as track_title,
-        mis.rating as user_rating,
-        mis.view_count as play_count,
-        mp.file as file_path,
-        parent_mi.title as album_title,
-        grandparent_mi.title as artist_name
-    FROM metadata_items mi
-    LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-    LEFT JOIN media_parts mp ON media.id = mp.media_item_id
-    LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
-    LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
-    LEFT JOIN metadata_item_settings mis ON mi.guid = mis.guid
-    WHERE mi.metadata_type = 10
-    AND mp.file IS NOT NULL
-    AND mis.rating IS NOT NULL
-    '''
-
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    files_1_star = []
-    files_2_star = []
-    files_sync_rating = []
-
-    for row in rows:
-        track_title, user_rating, play_count, file_path, album_title, artist_name = row
-        
-        final_rating = user_rating
-        if final_rating:
-            if final_rating > 5:
-                final_rating = final_rating / 2
-            
-            file_info = {
-                'file_path': file_path,
-                'rating': final_rating,
-                'play_count': play_count or 0,
-                'track_title': track_title or 'Unknown',
-                'album_title': album_title or 'Unknown Album',
-                'artist_name': artist_name or 'Unknown Artist'
-            }
-            
-            if final_rating == 1.0:
-                files_1_star.append(file_info)
-            elif final_rating == 2.0:
-                files_2_star.append(file_info)
-            elif final_rating in [3.0, 4.0, 5.0]:
-                files_sync_rating.append(file_info)
-
-    # Sauvegarder les listes
-    with open('$TEMP_DIR/files_1_star.json', 'w') as f:
-        json.dump(files_1_star, f, indent=2)
-        
-    with open('$TEMP_DIR/files_2_star.json', 'w') as f:
-        json.dump(files_2_star, f, indent=2)
+log "${GREEN}✅ Analyse albums + pistes terminée${NC}"
 
-    with open('$TEMP_DIR/files_sync_rating.json', 'w') as f:
-        json.dump(files_sync_rating, f, indent=2)
+# Tous les comptes du plan en une lecture (FILES_1_STAR_TOTAL, ALBUMS_1_STAR, ...)
+eval "$(jq -r '.counts | to_entries[] | "\(.key | ascii_upcase)=\(.value)"' "$PLAN_FILE")"
 
-    print(f'✅ Trouvé {len(files_1_star)} fichiers avec 1 étoile')
-    print(f'✅ Trouvé {len(files_2_star)} fichiers avec 2 étoiles')
-    print(f'✅ Trouvé {len(files_sync_rating)} fichiers avec 3-5 étoiles à synchroniser')
+COUNT_1_STAR=$FILES_1_STAR_TOTAL
+COUNT_2_STAR=$FILES_2_STAR_TOTAL
+COUNT_SYNC_RATING=$FILES_SYNC_RATING_TOTAL
 
-    conn.close()
-except Exception as e:
-    print(f'❌ Erreur: {e}')
-    exit(1)
-" >> "$LOG_FILE" 2>&1
-fi
+log "📊 Analyse détaillée:"
+log "   📀 Albums 1⭐: $ALBUMS_1_STAR ($FILES_FROM_ALBUMS_1_STAR fichiers)"
+log "   📀 Albums 2⭐: $ALBUMS_2_STAR ($FILES_FROM_ALBUMS_2_STAR fichiers)"
+log "   🎤 Artistes 1⭐: $ARTISTS_1_STAR ($FILES_FROM_ARTISTS_1_STAR fichiers)"
+log "   🎤 Artistes 2⭐: $ARTISTS_2_STAR ($FILES_FROM_ARTISTS_2_STAR fichiers)"
+log "   🎵 Pistes seules 1⭐: $FILES_FROM_TRACKS_1_STAR"
+log "   🎵 Pistes seules 2⭐: $FILES_FROM_TRACKS_2_STAR"
 
-# Lire les résultats (priorité aux nouveaux fichiers avec gestion d'albums)
-if [ -f "$TEMP_DIR/ratings_stats.json" ]; then
-    log "${GREEN}✅ Analyse albums + pistes terminée${NC}"
-    
-    # Lire les statistiques détaillées
-    ALBUMS_1_STAR=$(jq -r '.albums_1_star' "$TEMP_DIR/ratings_stats.json")
-    ALBUMS_2_STAR=$(jq -r '.albums_2_star' "$TEMP_DIR/ratings_stats.json")
-    FILES_FROM_ALBUMS_1_STAR=$(jq -r '.files_from_albums_1_star' "$TEMP_DIR/ratings_stats.json")
-    FILES_FROM_ALBUMS_2_STAR=$(jq -r '.files_from_albums_2_star' "$TEMP_DIR/ratings_stats.json")
-    FILES_FROM_TRACKS_1_STAR=$(jq -r '.files_from_tracks_1_star' "$TEMP_DIR/ratings_stats.json")
-    FILES_FROM_TRACKS_2_STAR=$(jq -r '.files_from_tracks_2_star' "$TEMP_DIR/ratings_stats.json")
-    
-    COUNT_1_STAR=$(jq -r '.files_1_star_total' "$TEMP_DIR/ratings_stats.json")
-    COUNT_2_STAR=$(jq -r '.files_2_star_total' "$TEMP_DIR/ratings_stats.json")
-    COUNT_SYNC_RATING=$(jq -r '.files_sync_rating_total' "$TEMP_DIR/ratings_stats.json")
-    
-    log "📊 Analyse détaillée:"
-    log "   📀 Albums 1⭐: $ALBUMS_1_STAR ($FILES_FROM_ALBUMS_1_STAR fichiers)"
-    log "   📀 Albums 2⭐: $ALBUMS_2_STAR ($FILES_FROM_ALBUMS_2_STAR fichiers)"
-    log "   🎵 Pistes seules 1⭐: $FILES_FROM_TRACKS_1_STAR"
-    log "   🎵 Pistes seules 2⭐: $FILES_FROM_TRACKS_2_STAR"
-    
-    # Notification de démarrage
-    "$SCRIPT_DIR/plex_notifications.sh" workflow_started \
-        "$COUNT_1_STAR" "$COUNT_2_STAR" "$COUNT_SYNC_RATING" \
-        "$ALBUMS_1_STAR" "$ALBUMS_2_STAR"
-    
-else
-    log "${YELLOW}⚠️ Utilisation de l'analyse classique (pistes uniquement)${NC}"
-    
-    # Lire les résultats de l'ancienne méthode
-    if [ -f "$TEMP_DIR/files_1_star.json" ]; then
-        COUNT_1_STAR=$(jq length "$TEMP_DIR/files_1_star.json")
-    else
-        COUNT_1_STAR=0
-    fi
-
-    if [ -f "$TEMP_DIR/files_2_star.json" ]; then
-        COUNT_2_STAR=$(jq length "$TEMP_DIR/files_2_star.json")
-    else
-        COUNT_2_STAR=0
-    fi
-    
-    # Valeurs par défaut pour compatibilité
-    ALBUMS_1_STAR=0
-    ALBUMS_2_STAR=0
-    
-    # Notification de démarrage (mode fallback)
-    "$SCRIPT_DIR/plex_notifications.sh" workflow_started \
-        "$COUNT_1_STAR" "$COUNT_2_STAR" "$COUNT_SYNC_RATING" \
-        "$ALBUMS_1_STAR" "$ALBUMS_2_STAR"
-
-fi
+# Notification de démarrage
+"$SCRIPT_DIR/plex_notifications.sh" workflow_started \
+    "$COUNT_1_STAR" "$COUNT_2_STAR" "$COUNT_SYNC_RATING" \
+    "$ALBUMS_1_STAR" "$ALBUMS_2_STAR"
 
 log "📊 Résumé de l'analyse:"
 log "   🗑️ Fichiers à supprimer (1 ⭐): $COUNT_1_STAR"
@@ -250,7 +136,7 @@ if [ "$COUNT_1_STAR" -gt 0 ]; then
         --auto-find-db \
         --rating 1 \
         --delete \
-        --backup "$MONTHLY_BACKUP/deleted_1_star" \
+        "${BACKUP_ARGS[@]}" \
         --verbose >> "$LOG_FILE" 2>&1
     
     if [ $? -eq 0 ]; then
@@ -368,11 +254,12 @@ EOF
 
     chmod +x "$SONGREC_SCRIPT"
     
-    # Créer la liste des fichiers à traiter
-    jq -r '.[].file_path' "$TEMP_DIR/files_2_star.json" > "$SESSION_QUEUE/files_to_scan.txt"
+    # Créer la liste des fichiers à traiter (pistes 2⭐ + fichiers des albums/artistes 2⭐)
+    jq -r '[.files_2_star[].file_path, .albums["2_star"][].files[].file_path, .artists["2_star"][].files[].file_path] | unique | .[]' \
+        "$PLAN_FILE" > "$SESSION_QUEUE/files_to_scan.txt"
     
     # Créer un rapport détaillé
-    jq '.' "$TEMP_DIR/files_2_star.json" > "$SESSION_QUEUE/files_details.json"
+    jq '{files: .files_2_star, albums: .albums["2_star"], artists: .artists["2_star"]}' "$PLAN_FILE" > "$SESSION_QUEUE/files_details.json"
     
     log "📝 Fichiers préparés pour songrec-rename:"
     log "   📁 Queue: $SESSION_QUEUE"
@@ -559,6 +446,9 @@ log "🧹 Anciens logs nettoyés (>6 mois)"
 
 # Nettoyage des anciennes sauvegardes (garder 3 mois)
 find "$BACKUP_DIR" -name "monthly_*" -type d -mtime +90 -exec rm -rf {} + 2>/dev/null || true
+if [ "$USE_BACKUP_STORE" = "1" ] && [ -d "$BACKUP_STORE" ]; then
+    python3 "$SCRIPT_DIR/plex_ratings_sync.py" --backup "$BACKUP_STORE" --prune-backup-store 90 >> "$LOG_FILE" 2>&1 || true
+fi
 log "🧹 Anciennes sauvegardes nettoyées (>3 mois)"
 
 # Optionnel: Déclencher un scan de bibliothèque Plex après modifications
@@ -575,7 +465,7 @@ log "============================="
 END_TIME=$(date '+%Y-%m-%d %H:%M:%S')
 log "🕒 Fin: $END_TIME"
 log "📁 Log complet: $LOG_FILE"
-log "💾 Sauvegardes: $MONTHLY_BACKUP"
+log "💾 Sauvegardes: $BACKUP_LOCATION"
 
 if [ "$COUNT_2_STAR" -gt 0 ]; then
     log "🔍 Queue songrec: $SESSION_QUEUE"
@@ -601,7 +491,7 @@ if [ -n "${NOTIFICATION_EMAIL:-}" ] && command -v mail &> /dev/null; then
         echo "• Fichiers scannés songrec (2⭐): $COUNT_2_STAR"
         echo
         echo "SAUVEGARDES:"
-        echo "• Répertoire: $MONTHLY_BACKUP"
+        echo "• Répertoire: $BACKUP_LOCATION"
         echo
         if [ "$COUNT_2_STAR" -gt 0 ] && [ -n "${SESSION_QUEUE:-}" ]; then
             echo "SONGREC-RENAME:"
@@ -632,7 +522,7 @@ cat > "$SUMMARY_FILE" << EOF
   "files_deleted_1_star": $COUNT_1_STAR,
   "files_processed_2_star": $COUNT_2_STAR,
   "ratings_sync_errors": ${SYNC_RATING_ERRORS:-0},
-  "backup_directory": "$MONTHLY_BACKUP",
+  "backup_directory": "$BACKUP_LOCATION",
   "log_file": "$LOG_FILE",
   "songrec_auto_processed": $([ -f "$SESSION_QUEUE/songrec_processing.log" ] && grep -c "✅ Succès:" "$SESSION_QUEUE/songrec_processing.log" 2>/dev/null || echo "0"),
   "songrec_auto_errors": $([ -f "$SESSION_QUEUE/songrec_processing.log" ] && grep -c "❌ Échec:" "$SESSION_QUEUE/songrec_processing.log" 2>/dev/null || echo "0"),
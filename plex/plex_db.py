@@ -0,0 +1,159 @@
+"""
+Accès partagé à la base de la bibliothèque Plex
+
+Plex Media Server tourne pendant nos synchronisations: les lectures passent
+par une seule connexion en lecture seule (URI mode=ro, query_only) réutilisée
+pendant toute l'exécution; seul le nettoyage ouvre une connexion d'écriture,
+fermée dès la transaction terminée.
+
+Mode copie: la base est d'abord copiée (API de backup en ligne SQLite, copie
+cohérente) vers un tmpfs; toutes les lectures se font ensuite sur la copie et
+la base vivante n'est plus touchée que par le nettoyage.
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Cache de pages de la connexion de lecture (KiB) et taille du mmap (octets)
+DEFAULT_CACHE_SIZE_KIB = 64 * 1024
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+# Attente maximale si Plex tient un verrou (ms)
+BUSY_TIMEOUT_MS = 5000
+
+def settings_join(cursor: sqlite3.Cursor, alias: str = 'mis', item_alias: str = 'mi',
+                  schema: str = '') -> str:
+    """Condition de jointure metadata_items -> un seul metadata_item_settings par élément
+
+    Plex garde une ligne de settings par compte: une jointure sur le seul
+    guid renvoie une ligne par compte et duplique pistes et fichiers. On
+    retient la ligne notée du plus petit account_id (1 = compte
+    propriétaire), à défaut la première ligne non notée. schema préfixe la
+    table d'une base attachée ('plex.').
+    """
+    cursor.execute(f"PRAGMA {schema}table_info(metadata_item_settings)")
+    columns = {row[1] for row in cursor.fetchall()}
+    order = 's.account_id, s.id' if 'account_id' in columns else 's.id'
+    return f"""{alias}.guid = {item_alias}.guid AND {alias}.id = (
+        SELECT s.id FROM {schema}metadata_item_settings s
+        WHERE s.guid = {item_alias}.guid
+        ORDER BY COALESCE(s.rating, 0) = 0, {order}
+        LIMIT 1
+    )"""
+
+def default_snapshot_dir() -> str:
+    """Répertoire des copies: /dev/shm (tmpfs) si disponible, sinon le temp système"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+class PlexDatabase:
+    """Gestionnaire de connexions à la base Plex (une lecture réutilisée, écritures ponctuelles)"""
+
+    def __init__(self, db_path: str, cache_size_kib: int = DEFAULT_CACHE_SIZE_KIB,
+                 mmap_size: int = DEFAULT_MMAP_SIZE):
+        self.db_path = Path(db_path)
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self._reader: Optional[sqlite3.Connection] = None
+        self.snapshot_path: Optional[Path] = None
+
+    def read_uri(self) -> str:
+        """URI SQLite en lecture seule de la source des lectures (copie si présente)
+
+        La copie n'est modifiée par personne: immutable=1 évite tout verrouillage.
+        """
+        if self.snapshot_path is not None:
+            return f"{self.snapshot_path.as_uri()}?mode=ro&immutable=1"
+        return f"{self.db_path.resolve().as_uri()}?mode=ro"
+
+    def take_snapshot(self, target_dir: Optional[str] = None) -> float:
+        """Copie cohérente de la base vivante (API de backup) et bascule des lectures dessus
+
+        Retourne la durée de la copie en secondes.
+        """
+        self.drop_snapshot()
+        fd, path = tempfile.mkstemp(prefix='plex_snapshot_', suffix='.db',
+                                    dir=target_dir or default_snapshot_dir())
+        os.close(fd)
+
+        start = time.perf_counter()
+        source = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        target = sqlite3.connect(path)
+        try:
+            source.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            # Une seule étape: la copie correspond à un seul état de la base
+            source.backup(target)
+        except Exception:
+            target.close()
+            os.unlink(path)
+            raise
+        finally:
+            source.close()
+        target.close()
+
+        self.snapshot_path = Path(path)
+        return time.perf_counter() - start
+
+    def drop_snapshot(self):
+        """Supprime la copie; les lectures suivantes repartent sur la base vivante"""
+        self._close_reader()
+        if self.snapshot_path is not None:
+            try:
+                self.snapshot_path.unlink()
+            except FileNotFoundError:
+                pass
+            self.snapshot_path = None
+
+    def reader(self) -> sqlite3.Connection:
+        """Connexion de lecture, ouverte au premier appel puis réutilisée
+
+        En autocommit (isolation_level=None): aucune transaction n'est gardée
+        ouverte entre deux requêtes, les checkpoints WAL de Plex ne sont pas bloqués.
+        Un seul thread l'utilise à la fois, pas forcément celui qui l'a ouverte
+        (lecture dans le thread source du pipeline, fermeture par l'appelant).
+        """
+        if self._reader is None:
+            conn = sqlite3.connect(self.read_uri(), uri=True, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            conn.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+            conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._reader = conn
+        return self._reader
+
+    @contextmanager
+    def read_transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Curseur dans une transaction de lecture: un état cohérent pour plusieurs requêtes"""
+        cursor = self.reader().cursor()
+        cursor.execute("BEGIN")
+        try:
+            yield cursor
+        finally:
+            # Lecture seule: rien à valider, on relâche juste l'instantané
+            cursor.execute("ROLLBACK")
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Connexion d'écriture de courte durée (autocommit, transaction explicite)"""
+        conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+        try:
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """Ferme la connexion de lecture et supprime la copie éventuelle"""
+        self.drop_snapshot()
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
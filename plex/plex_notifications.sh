@@ -177,6 +177,66 @@ notify_songrec_file_error() {
     fi
 }
 
+# Notification groupée des résultats songrec d'une étape (un seul envoi)
+notify_songrec_batch() {
+    local identified="$1"
+    local not_identified="$2"
+    local errors="$3"
+    local details="$4"
+    
+    local title_notif="🎵 Identification songrec"
+    local message="$identified identifié(s), $not_identified non identifié(s), $errors erreur(s)"
+    local urgency="low"
+    local icon="audio-card"
+    
+    if [ "$errors" -gt 0 ]; then
+        urgency="normal"
+        icon="dialog-warning"
+    fi
+    
+    send_desktop_notification "$title_notif" "$message" "$urgency" "$icon"
+    
+    # Pas d'email: le résumé songrec_completed s'en charge
+    if [ "$ENABLE_CONSOLE_NOTIFICATIONS" = "true" ]; then
+        echo -e "${BLUE}🎵 $message${NC}"
+        if [ -n "$details" ]; then
+            echo -e "$details"
+        fi
+    fi
+}
+
+# Notification de fin d'étape songrec
+notify_songrec_completed() {
+    local processed="$1"
+    local errors="$2"
+    local album_count="$3"
+    local track_count="$4"
+
+    local title="🎧 Songrec terminé"
+    local message="$processed fichier(s) 2⭐ traités"
+    local urgency="normal"
+
+    if [ "$errors" -gt 0 ]; then
+        title="⚠️ Songrec avec erreurs"
+        message="$processed traités, $errors erreurs"
+    fi
+
+    send_desktop_notification "$title" "$message" "$urgency" "audio-card"
+
+    if [ "$ENABLE_EMAIL_NOTIFICATIONS" = "true" ]; then
+        local body="Identification songrec des fichiers 2 étoiles terminée:
+
+💿 Albums concernés: $album_count
+🎵 Pistes: $track_count
+✅ Traités: $processed
+❌ Erreurs: $errors"
+
+        send_email_notification "Songrec terminé" "$body"
+    fi
+
+    echo -e "${GREEN}🔔 Notification envoyée: Songrec ($processed traités)${NC}"
+}
+
 # Notification pour synchronisation des ratings
 notify_rating_sync_completed() {
     local synced="$1"
@@ -581,9 +641,15 @@ main() {
         "songrec_file_error")
             notify_songrec_file_error "$2" "$3"
             ;;
+        "songrec_batch")
+            notify_songrec_batch "$2" "$3" "$4" "$5"
+            ;;
         "songrec_completed")
             notify_songrec_completed "$2" "$3" "$4" "$5"
             ;;
+        "files_deleted")
+            notify_files_deleted "$2" "$3"
+            ;;
         "rating_sync_completed")
             notify_rating_sync_completed "$2" "$3" "$4"
             ;;
@@ -620,6 +686,7 @@ main() {
             echo "  songrec_file_identified file_name artist title"
             echo "  songrec_file_not_identified file_name reason"
             echo "  songrec_file_error file_name error_type"
+            echo "  songrec_batch identified not_identified errors details"
             echo "  songrec_completed processed errors album_count track_count"
             echo "  rating_sync_completed synced errors file_count"
             echo "  workflow_completed deleted songrec_proc songrec_err ratings_sync ratings_err albums_1 albums_2 duration"
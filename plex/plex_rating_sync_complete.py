@@ -1,7 +1,7 @@
 #!/home/paulceline/bin/audio/.venv/bin/python
 """
 Script complet pour synchroniser les ratings Plex vers les métadonnées des fichiers audio
-Lit les ratings depuis Plex et les écrit directement dans les tags ID3/FLAC/MP4
+Lit les ratings depuis Plex et les écrit directement dans les tags ID3/FLAC/MP4/Ogg/WMA/WAV
 """
 
 import json
@@ -9,28 +9,103 @@ import sys
 import argparse
 import sqlite3
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from datetime import datetime
 import logging
+import threading
+
+from file_catalog import DEFAULT_SCAN_JOBS, FileCatalog
+from path_mapping import PathMapper, parse_path_mapping
+from pipeline import Stage, run_pipeline
+from plex_db import PlexDatabase, settings_join
+from rating_stats import collect_rating_stats
+from sync_state import SyncStateStore, plex_change_expression
+
+# Clé du consommateur dans le magasin d'état local
+STATE_CONSUMER = 'tag_sync'
+
+# Pistes lues par requête lors du parcours de la base Plex
+PLEX_BATCH_SIZE = 500
+
+# Pistes terminées entre deux enregistrements du point de reprise (un commit)
+CHECKPOINT_INTERVAL = 200
+
+# Extensions exportées en JSON Lines sans --jsonl
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+
+# Résultats d'écriture des tags
+STATUS_WRITTEN = 'written'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+STATUS_UP_TO_DATE = 'up_to_date'  # Mode incrémental: déjà écrit lors d'un run précédent
+
+# Threads de l'étage de vérification (existence, empreinte) du pipeline
+DEFAULT_CHECK_JOBS = 2
 
 try:
-    from mutagen.id3 import ID3
-    from mutagen.id3._frames import POPM
-    from mutagen.mp3 import MP3
-    from mutagen.mp4 import MP4
-    from mutagen.flac import FLAC
-    from mutagen.oggopus import OggOpus
-    from mutagen._file import File
+    from tag_writers import benchmark_writers, writer_for
 except ImportError:
     print("❌ Erreur: Module 'mutagen' requis. Installez avec: pip3 install mutagen")
     sys.exit(1)
 
+class RatedTrack(NamedTuple):
+    """Piste ratée lue dans Plex (enregistrement compact, champs inconnus à None)"""
+    file_path: str
+    rating: float
+    play_count: int
+    title: Optional[str]
+    album: Optional[str]
+    artist: Optional[str]
+    duration: Optional[int]
+    year: Optional[int]
+    plex_rating: float
+    guid: Optional[str]
+    changed_at: int
+    item_id: int = 0  # metadata_items.id (ordre de parcours, point de reprise)
+
+    def to_dict(self) -> Dict:
+        """Format historique de l'export JSON (libellés par défaut pour les champs vides)"""
+        data = self._asdict()
+        del data['item_id']
+        data['title'] = self.title or 'Unknown'
+        data['album'] = self.album or 'Unknown Album'
+        data['artist'] = self.artist or 'Unknown Artist'
+        return data
+
+class PendingWrite(NamedTuple):
+    """Tags lus et modifiés en mémoire, en attente d'écriture sur disque"""
+    kind: str  # Libellé du format pour les logs (TagWriter.kind)
+    save: Callable[[], None]
+
+class TrackJob:
+    """Piste en cours dans le pipeline de synchronisation (statut fixé une fois terminée)"""
+    __slots__ = ('index', 'track', 'status', 'pending')
+
+    def __init__(self, index: int, track: RatedTrack):
+        self.index = index
+        self.track = track
+        self.status: Optional[str] = None
+        self.pending: Optional[PendingWrite] = None
+
 class PlexRatingSync:
-    def __init__(self, plex_db_path: str, verbose: bool = False):
+    def __init__(self, plex_db_path: str, verbose: bool = False, force_write: bool = False,
+                 scan_jobs: int = DEFAULT_SCAN_JOBS, path_mappings: Iterable[Tuple[str, str]] = ()):
         self.plex_db_path = Path(plex_db_path)
+        self.plex_db = PlexDatabase(plex_db_path)
         self.verbose = verbose
+        # Réécrire les tags même s'ils contiennent déjà le rating et le play count cibles
+        self.force_write = force_write
+        # Existence des fichiers: un listage par répertoire au lieu d'un stat par fichier
+        self.file_catalog = FileCatalog(scan_jobs)
+        # Chemins Plex (conteneur...) réécrits en chemins locaux à la lecture
+        self.path_mapper = PathMapper(path_mappings)
         self.setup_logging()
-        self.processed_files = []
+        # Compteurs pour les succès, listes seulement pour les fichiers à signaler
+        self.processed_count = 0
+        self.unchanged_count = 0
+        self.up_to_date_count = 0
+        self.duplicate_count = 0
         self.failed_files = []
         self.skipped_files = []
 
@@ -44,250 +119,289 @@ class PlexRatingSync:
         )
         self.logger = logging.getLogger(__name__)
 
-    def get_plex_ratings(self) -> List[Dict]:
-        """Récupère tous les ratings depuis la base Plex"""
+    def iter_plex_ratings(self, changed_since: Optional[int] = None,
+                          batch_size: int = PLEX_BATCH_SIZE, after_id: int = -1) -> Iterator[RatedTrack]:
+        """Parcourt les pistes ratées de Plex par lots, sans tout charger en mémoire
+
+        Pagination par id de piste: chaque lot est une requête courte, aucune
+        transaction de lecture n'est gardée ouverte entre deux lots (les
+        écritures de tags peuvent s'intercaler). Avec changed_since, seules les
+        pistes dont les settings Plex (updated_at/last_rated_at) ont changé
+        depuis cet horodatage sont lues. after_id reprend le parcours après
+        cet id de piste (point de reprise).
+        """
         if not self.plex_db_path.exists():
             raise FileNotFoundError(f"Base Plex introuvable: {self.plex_db_path}")
 
-        ratings = []
         try:
-            conn = sqlite3.connect(str(self.plex_db_path))
-            cursor = conn.cursor()
-
-            # Requête pour récupérer les ratings des pistes audio
-            query = """
-            SELECT
-                mi.title as track_title,
-                mis.rating as user_rating,
-                mis.view_count as play_count,
-                mp.file as file_path,
-                mi.duration,
-                mi.year,
-                parent_mi.title as album_title,
-                grandparent_mi.title as artist_name
-            FROM metadata_items mi
-            LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-            LEFT JOIN media_parts mp ON media.id = mp.media_item_id
-            LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
-            LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
-            LEFT JOIN metadata_item_settings mis ON mi.guid = mis.guid
-            WHERE mi.metadata_type = 10  -- Type 10 = Track/Audio
-            AND mp.file IS NOT NULL
-            AND mis.rating IS NOT NULL
-            ORDER BY mis.rating DESC, grandparent_mi.title, parent_mi.title, mi.title
-            """
-
-            cursor.execute(query)
-            rows = cursor.fetchall()
-
-            for row in rows:
-                track_title, user_rating, play_count, file_path, duration, year, album_title, artist_name = row
-
-                # Convertir le rating Plex (0-10 ou 0-5) vers étoiles (1-5)
-                stars_rating = user_rating
-                if stars_rating:
-                    # Normaliser sur une échelle de 1-5 étoiles
-                    if stars_rating > 5:
-                        stars_rating = stars_rating / 2.0  # Conversion 10 -> 5
-
-                    if 1 <= stars_rating <= 5:
-                        ratings.append({
-                            'file_path': file_path,
-                            'rating': stars_rating,
-                            'play_count': play_count or 0,
-                            'title': track_title or 'Unknown',
-                            'album': album_title or 'Unknown Album',
-                            'artist': artist_name or 'Unknown Artist',
-                            'duration': duration,
-                            'year': year,
-                            'plex_rating': user_rating  # Garder l'original pour référence
-                        })
-
-            conn.close()
+            # Connexion en lecture seule: Plex Media Server peut tourner
+            cursor = self.plex_db.reader().cursor()
+
+            change_expression = plex_change_expression(cursor)
+            if change_expression is None:
+                if changed_since is not None:
+                    self.logger.warning("⚠️ Colonnes updated_at/last_rated_at absentes: lecture complète")
+                change_expression = '0'
+            # Une ligne de settings par piste, même avec plusieurs comptes Plex
+            settings_on = settings_join(cursor)
+            change_filter = ''
+            change_params: Tuple = ()
+            if changed_since is not None:
+                change_filter = f"AND {change_expression} >= ?"
+                change_params = (changed_since,)
+
+            last_id = after_id
+            while True:
+                # Lot suivant de pistes ratées (parcours de la clé primaire)
+                cursor.execute(f"""
+                SELECT DISTINCT mi.id
+                FROM metadata_items mi
+                JOIN metadata_item_settings mis ON {settings_on}
+                WHERE mi.metadata_type = 10
+                AND mis.rating IS NOT NULL
+                AND mi.id > ?
+                {change_filter}
+                ORDER BY mi.id
+                LIMIT ?
+                """, (last_id,) + change_params + (batch_size,))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                last_id = ids[-1]
+
+                # Détails des pistes du lot
+                placeholders = ','.join('?' * len(ids))
+                cursor.execute(f"""
+                SELECT
+                    mi.id,
+                    mi.title as track_title,
+                    mis.rating as user_rating,
+                    mis.view_count as play_count,
+                    mp.file as file_path,
+                    mi.duration,
+                    mi.year,
+                    parent_mi.title as album_title,
+                    grandparent_mi.title as artist_name,
+                    mi.guid,
+                    {change_expression} as changed_at
+                FROM metadata_items mi
+                LEFT JOIN media_items media ON mi.id = media.metadata_item_id
+                LEFT JOIN media_parts mp ON media.id = mp.media_item_id
+                LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
+                LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
+                LEFT JOIN metadata_item_settings mis ON {settings_on}
+                WHERE mi.id IN ({placeholders})
+                AND mp.file IS NOT NULL
+                AND mis.rating IS NOT NULL
+                {change_filter}
+                ORDER BY mi.id
+                """, tuple(ids) + change_params)
+
+                for (item_id, track_title, user_rating, play_count, file_path, duration, year,
+                     album_title, artist_name, guid, changed_at) in cursor.fetchall():
+
+                    # Convertir le rating Plex (0-10 ou 0-5) vers étoiles (1-5)
+                    stars_rating = user_rating
+                    if stars_rating:
+                        # Normaliser sur une échelle de 1-5 étoiles
+                        if stars_rating > 5:
+                            stars_rating = stars_rating / 2.0  # Conversion 10 -> 5
+
+                        if 1 <= stars_rating <= 5:
+                            yield RatedTrack(self.path_mapper.to_host(file_path), stars_rating, play_count or 0, track_title,
+                                             album_title, artist_name, duration, year,
+                                             user_rating,  # Garder l'original pour référence
+                                             guid, changed_at, item_id)
 
         except sqlite3.Error as e:
             self.logger.error(f"❌ Erreur base de données Plex: {e}")
             raise
 
+    def get_plex_ratings(self, changed_since: Optional[int] = None) -> List[Dict]:
+        """Récupère les ratings depuis la base Plex (liste complète, format d'export)"""
+        ratings = [track.to_dict() for track in self.iter_plex_ratings(changed_since)]
         self.logger.info(f"📊 {len(ratings)} fichiers avec ratings trouvés dans Plex")
         return ratings
 
-    def rating_to_stars_255(self, rating: float) -> int:
-        """Convertit rating 1-5 étoiles vers valeur 0-255 pour POPM"""
-        mapping = {
-            1.0: 1,
-            2.0: 64,
-            3.0: 128,
-            4.0: 196,
-            5.0: 255
-        }
-        return mapping.get(rating, 128)
-
-    def set_mp3_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier MP3"""
-        try:
-            audio = MP3(file_path, ID3=ID3)
-
-            if audio.tags is None:
-                audio.add_tags()
-
-            if audio.tags is not None:
-                rating_255 = self.rating_to_stars_255(rating)
-                if play_count is not None:
-                    audio.tags.add(POPM(email="no@email", rating=rating_255, count=play_count))
-                else:
-                    audio.tags.add(POPM(email="no@email", rating=rating_255, count=1))
-
-                audio.save()
-
-                log_msg = f"✅ MP3 rating {rating}⭐"
-                if play_count is not None:
-                    log_msg += f" + {play_count} lectures"
-                log_msg += f" écrit: {file_path.name}"
-                self.logger.info(log_msg)
-                return True
-            else:
-                self.logger.error(f"❌ Impossible de créer tags ID3: {file_path.name}")
-                return False
-
-        except Exception as e:
-            self.logger.error(f"❌ Erreur MP3 {file_path.name}: {e}")
-            return False
+    def _log_written(self, kind: str, file_path: Path, rating: float, play_count: Optional[int]):
+        log_msg = f"✅ {kind} rating {rating}⭐"
+        if play_count is not None:
+            log_msg += f" + {play_count} lectures"
+        log_msg += f" écrit: {file_path.name}"
+        self.logger.info(log_msg)
+
+    def _log_unchanged(self, kind: str, file_path: Path, rating: float):
+        self.logger.debug(f"⏸️ {kind} rating {rating}⭐ déjà présent, inchangé: {file_path.name}")
+
+    def check_file(self, track: RatedTrack) -> Optional[str]:
+        """Étape vérification: STATUS_SKIPPED si le fichier est introuvable, sinon None"""
+        if not self.file_catalog.exists(track.file_path):
+            self.logger.warning(f"❌ Fichier introuvable: {track.file_path}")
+            return STATUS_SKIPPED
+        return None
+
+    def compare_tags(self, track: RatedTrack) -> Tuple[Optional[str], Optional[PendingWrite]]:
+        """Étape lecture-comparaison: (statut, None) si rien à écrire, (None, écriture) sinon"""
+        file_path = Path(track.file_path)
+        rating = float(track.rating)
+        play_count = track.play_count
+
+        writer = writer_for(file_path)
+        if writer is None:
+            self.logger.warning(f"⚠️ Format non supporté: {file_path.suffix.lower()} - {file_path.name}")
+            return STATUS_SKIPPED, None
+        kind = writer.kind
 
-    def set_mp4_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier MP4/M4A"""
         try:
-            audio = MP4(file_path)
-
-            rating_100 = int(rating * 20)  # 1⭐=20, 5⭐=100
-            # Utiliser le bon format pour mutagen
-            audio["rtng"] = [rating_100]  # Rating iTunes (0-100)
-
-            if play_count is not None:
-                audio["plct"] = [str(play_count)]  # Play count iTunes
-
-            audio.save()
-
-            log_msg = f"✅ MP4 rating {rating}⭐"
-            if play_count is not None:
-                log_msg += f" + {play_count} lectures"
-            log_msg += f" écrit: {file_path.name}"
-            self.logger.info(log_msg)
-            return True
-
+            save = writer.prepare(file_path, rating, play_count, force=self.force_write)
         except Exception as e:
-            self.logger.error(f"❌ Erreur MP4 {file_path.name}: {e}")
-            return False
-
-    def set_flac_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier FLAC"""
-        try:
-            audio = FLAC(file_path)
-
-            rating_100 = str(int(rating * 20))
-            audio["RATING"] = rating_100
-            rating_decimal = str(rating / 5.0)
-            audio["FMPS_RATING"] = rating_decimal
-
-            if play_count is not None:
-                audio["PLAYCOUNT"] = str(play_count)
-
-            audio.save()
-
-            log_msg = f"✅ FLAC rating {rating}⭐"
-            if play_count is not None:
-                log_msg += f" + {play_count} lectures"
-            log_msg += f" écrit: {file_path.name}"
-            self.logger.info(log_msg)
-            return True
+            self.logger.error(f"❌ Erreur {kind} {file_path.name}: {e}")
+            return STATUS_FAILED, None
 
-        except Exception as e:
-            self.logger.error(f"❌ Erreur FLAC {file_path.name}: {e}")
-            return False
+        if save is None:
+            self._log_unchanged(kind, file_path, rating)
+            return STATUS_UNCHANGED, None
+        return None, PendingWrite(kind, save)
 
-    def set_opus_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier OPUS"""
+    def write_tags(self, track: RatedTrack, pending: PendingWrite) -> str:
+        """Étape écriture: enregistre les tags préparés par compare_tags"""
+        file_path = Path(track.file_path)
         try:
-            audio = OggOpus(file_path)
-
-            rating_100 = str(int(rating * 20))
-            audio["RATING"] = rating_100
-            rating_decimal = str(rating / 5.0)
-            audio["FMPS_RATING"] = rating_decimal
-
-            if play_count is not None:
-                audio["PLAYCOUNT"] = str(play_count)
-
-            audio.save()
-
-            log_msg = f"✅ OPUS rating {rating}⭐"
-            if play_count is not None:
-                log_msg += f" + {play_count} lectures"
-            log_msg += f" écrit: {file_path.name}"
-            self.logger.info(log_msg)
-            return True
-
+            pending.save()
         except Exception as e:
-            self.logger.error(f"❌ Erreur OPUS {file_path.name}: {e}")
+            self.logger.error(f"❌ Erreur {pending.kind} {file_path.name}: {e}")
+            return STATUS_FAILED
+
+        self._log_written(pending.kind, file_path, float(track.rating), track.play_count)
+        return STATUS_WRITTEN
+
+    def rate_file(self, track: RatedTrack) -> str:
+        """Écrit le rating d'un fichier et retourne le statut (sans état partagé, utilisable en parallèle)"""
+        status = self.check_file(track)
+        if status is not None:
+            return status
+
+        status, pending = self.compare_tags(track)
+        if pending is None:
+            return status
+        return self.write_tags(track, pending)
+
+    def record_result(self, track: RatedTrack, status: str) -> bool:
+        """Compte le résultat d'un fichier (échecs et fichiers ignorés gardés pour le rapport)"""
+        if status == STATUS_SKIPPED:
+            self.skipped_files.append(track)
+            return False
+        if status == STATUS_FAILED:
+            self.failed_files.append(track)
             return False
 
-    def sync_file_rating(self, file_info: Dict) -> bool:
+        self.processed_count += 1
+        if status == STATUS_UNCHANGED:
+            self.unchanged_count += 1
+        return True
+
+    def sync_file_rating(self, track: RatedTrack) -> bool:
         """Synchronise le rating d'un fichier vers ses métadonnées"""
-        file_path = Path(file_info['file_path'])
-        rating = float(file_info['rating'])
-        play_count = file_info.get('play_count')
+        return self.record_result(track, self.rate_file(track))
 
-        if not file_path.exists():
-            self.logger.warning(f"❌ Fichier introuvable: {file_path}")
-            self.skipped_files.append(file_info)
-            return False
+    def save_ratings_json(self, ratings: Iterable[RatedTrack], output_file: Path, compact: bool = False) -> int:
+        """Sauvegarde les ratings dans un fichier JSON, écrit au fil du parcours
 
-        suffix = file_path.suffix.lower()
-
-        success = False
-        if suffix in ['.mp3']:
-            success = self.set_mp3_rating(file_path, rating, play_count)
-        elif suffix in ['.mp4', '.m4a', '.aac']:
-            success = self.set_mp4_rating(file_path, rating, play_count)
-        elif suffix in ['.flac']:
-            success = self.set_flac_rating(file_path, rating, play_count)
-        elif suffix in ['.opus']:
-            success = self.set_opus_rating(file_path, rating, play_count)
-        else:
-            self.logger.warning(f"⚠️ Format non supporté: {suffix} - {file_path.name}")
-            self.skipped_files.append(file_info)
-            return False
+        Même structure qu'auparavant; total_ratings vient après la liste
+        puisqu'il n'est connu qu'à la fin. compact: sans indentation.
+        """
+        total = 0
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if compact:
+                f.write(f'{{"export_date":{json.dumps(datetime.now().isoformat())},"ratings":[')
+                for track in ratings:
+                    f.write(',' if total else '')
+                    f.write(json.dumps(track.to_dict(), ensure_ascii=False, separators=(',', ':')))
+                    total += 1
+                f.write(f'],"total_ratings":{total}}}\n')
+            else:
+                f.write('{\n')
+                f.write(f'  "export_date": {json.dumps(datetime.now().isoformat())},\n')
+                f.write('  "ratings": [')
+                for track in ratings:
+                    item = json.dumps(track.to_dict(), indent=2, ensure_ascii=False)
+                    f.write(',\n    ' if total else '\n    ')
+                    f.write(item.replace('\n', '\n    '))
+                    total += 1
+                f.write('\n  ],\n' if total else '],\n')
+                f.write(f'  "total_ratings": {total}\n')
+                f.write('}\n')
+
+        self.logger.info(f"💾 {total} ratings sauvegardés: {output_file}")
+        return total
+
+    def save_ratings_jsonl(self, ratings: Iterable[RatedTrack], output_file: Path, compact: bool = False) -> int:
+        """Sauvegarde les ratings en JSON Lines (un objet par ligne), écrit au fil du parcours
+
+        Lisible ligne à ligne par sync_ratings_to_id3.py (reprise possible à
+        un offset). compact: seulement file_path, rating et play_count.
+        """
+        total = 0
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for track in ratings:
+                if compact:
+                    record = {'file_path': track.file_path, 'rating': track.rating, 'play_count': track.play_count}
+                else:
+                    record = track.to_dict()
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+                total += 1
 
-        if success:
-            self.processed_files.append(file_info)
-        else:
-            self.failed_files.append(file_info)
+        self.logger.info(f"💾 {total} ratings sauvegardés (JSON Lines): {output_file}")
+        return total
 
-        return success
+    @staticmethod
+    def count_ratings(ratings: Iterable[RatedTrack]) -> Dict[float, int]:
+        """Nombre de fichiers par rating, en un seul passage"""
+        rating_counts = {}
+        for track in ratings:
+            rating_counts[track.rating] = rating_counts.get(track.rating, 0) + 1
+        return rating_counts
 
-    def save_ratings_json(self, ratings: List[Dict], output_file: Path):
-        """Sauvegarde les ratings dans un fichier JSON"""
-        data = {
-            'export_date': datetime.now().isoformat(),
-            'total_ratings': len(ratings),
-            'ratings': ratings
-        }
+    def show_statistics(self, ratings: Iterable[RatedTrack]) -> int:
+        """Affiche les statistiques des ratings (parcours unique) et retourne le total"""
+        return self.print_statistics(self.count_ratings(ratings))
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def show_plex_statistics(self, breakdown: Optional[str] = None) -> int:
+        """Affiche les statistiques calculées dans SQLite (GROUP BY rating) et retourne le total
 
-        self.logger.info(f"💾 Ratings sauvegardés: {output_file}")
+        Seuls les comptes sont lus, pas les pistes. breakdown ('album' ou
+        'artist') ajoute la ventilation des pistes par album ou par artiste.
+        """
+        if not self.plex_db_path.exists():
+            raise FileNotFoundError(f"Base Plex introuvable: {self.plex_db_path}")
 
-    def show_statistics(self, ratings: List[Dict]):
-        """Affiche les statistiques des ratings"""
-        if not ratings:
-            self.logger.warning("Aucun rating trouvé")
-            return
+        try:
+            stats = collect_rating_stats(self.plex_db.reader().cursor(), breakdown)
+        except sqlite3.Error as e:
+            self.logger.error(f"❌ Erreur base de données Plex: {e}")
+            raise
 
-        rating_counts = {}
-        for item in ratings:
-            rating = item['rating']
-            rating_counts[rating] = rating_counts.get(rating, 0) + 1
+        # Même filtre que iter_plex_ratings: seuls les ratings 1-5 étoiles sont synchronisés
+        total = self.print_statistics({rating: count for rating, count in stats['tracks'].items()
+                                       if 1 <= rating <= 5})
+
+        if breakdown is not None:
+            label = 'ALBUM' if breakdown == 'album' else 'ARTISTE'
+            print(f"\n📂 PISTES PAR {label}:")
+            for title in sorted(stats['breakdown'], key=str.lower):
+                counts = stats['breakdown'][title]
+                details = ', '.join(f"{rating}⭐ {counts[rating]}" for rating in sorted(counts) if 1 <= rating <= 5)
+                if details:
+                    print(f"  {title} : {details}")
+        return total
+
+    def print_statistics(self, rating_counts: Dict[float, int]) -> int:
+        """Affiche les statistiques à partir des comptes par rating"""
+        total = sum(rating_counts.values())
+        if not total:
+            self.logger.warning("Aucun rating trouvé")
+            return 0
 
         print("\n📊 STATISTIQUES DES RATINGS PLEX:")
         print("=" * 50)
@@ -295,48 +409,227 @@ class PlexRatingSync:
             stars = "⭐" * int(rating)
             print(f"{stars} ({rating}) : {rating_counts[rating]} fichiers")
 
-        print(f"\nTotal: {len(ratings)} fichiers avec ratings")
-
-    def sync_all_ratings(self, dry_run: bool = False) -> Dict:
-        """Synchronise tous les ratings de Plex vers les fichiers"""
+        print(f"\nTotal: {total} fichiers avec ratings")
+        return total
+
+    def sync_all_ratings(self, dry_run: bool = False, incremental: bool = False,
+                         state_db: Optional[str] = None, jobs: int = 1, resume: bool = False,
+                         read_jobs: Optional[int] = None, check_jobs: int = DEFAULT_CHECK_JOBS) -> Dict:
+        """Synchronise tous les ratings de Plex vers les fichiers
+
+        Les pistes traversent un pipeline à étages reliés par des files bornées:
+        lecture Plex par lots (et listage des répertoires) -> vérification
+        d'existence et d'empreinte (check_jobs threads) -> lecture et
+        comparaison des tags (read_jobs, défaut: jobs) -> écriture (jobs).
+        Les premières écritures commencent pendant que la base est encore lue,
+        et la mémoire ne dépend de la taille de la bibliothèque que par
+        l'ensemble des chemins déjà lus: un fichier partagé par plusieurs
+        pistes Plex n'entre qu'une fois dans le pipeline (la piste d'id le
+        plus petit l'emporte), il n'a donc jamais deux écrivains. En mode
+        incrémental, seules les pistes modifiées dans Plex depuis la dernière
+        exécution sont lues, et celles dont le rating, le play count et le
+        fichier n'ont pas bougé depuis la dernière écriture sont ignorées; le
+        filigrane n'avance pas au-delà d'une piste ignorée (fichier absent,
+        disque démonté...) ou en échec, qui est relue au run suivant.
+
+        Un run réel enregistre son avancement dans le magasin d'état (dernier
+        id de piste dont toutes les précédentes sont terminées, un commit toutes
+        les CHECKPOINT_INTERVAL pistes). Avec resume, le run reprend après ce
+        point, sur le même périmètre que le run interrompu.
+        """
+        state = None
+        journal = None
         try:
-            # Récupérer les ratings depuis Plex
-            ratings = self.get_plex_ratings()
-
-            if not ratings:
-                return {'success': False, 'error': 'Aucun rating trouvé dans Plex'}
-
-            # Statistiques
-            self.show_statistics(ratings)
+            changed_since = None
+            if incremental:
+                state = SyncStateStore(state_db)
+                changed_since = state.get_watermark(STATE_CONSUMER)
+                self.logger.info(f"🔁 Mode incrémental (état: {state.db_path}, depuis: {changed_since})")
+
+            after_id = -1
+            max_changed_at = 0
+            # Pistes ignorées/en échec: le filigrane reste à leur horodatage pour les retenter
+            retry_changed_at = None
+            started_at = datetime.now().isoformat()
+            if not dry_run:
+                journal = state or SyncStateStore(state_db)
+                checkpoint = journal.get_checkpoint(STATE_CONSUMER)
+                if checkpoint is not None and resume:
+                    after_id = checkpoint['last_item_id']
+                    changed_since = checkpoint['changed_since']
+                    max_changed_at = checkpoint['max_changed_at']
+                    retry_changed_at = checkpoint['retry_changed_at']
+                    started_at = checkpoint['started_at']
+                    self.logger.info(f"⏩ Reprise du run du {started_at} après la piste {after_id} "
+                                     f"(dernier point: {checkpoint['updated_at']})")
+                elif checkpoint is not None:
+                    self.logger.info(f"ℹ️ Run interrompu du {checkpoint['started_at']} ignoré "
+                                     f"(utilisez --resume pour le reprendre)")
+                elif resume:
+                    self.logger.info("ℹ️ Aucun run interrompu: synchronisation depuis le début")
+
+            tracks = self.iter_plex_ratings(changed_since=changed_since, after_id=after_id)
+            if not dry_run:
+                # Répertoires de chaque paquet listés en parallèle avant écriture
+                tracks = self.file_catalog.prefetch(tracks, key=lambda track: track.file_path)
 
             if dry_run:
+                total = self.show_statistics(tracks)
+                if not total and not incremental:
+                    return {'success': False, 'error': 'Aucun rating trouvé dans Plex'}
                 self.logger.info("🔍 Mode simulation - aucun fichier ne sera modifié")
                 return {
                     'success': True,
                     'dry_run': True,
-                    'total_ratings': len(ratings)
+                    'total_ratings': total
                 }
 
-            # Synchroniser chaque fichier
-            self.logger.info(f"🎵 Synchronisation ratings pour {len(ratings)} fichiers...")
+            # Synchroniser chaque fichier au fil de la lecture
+            read_jobs = read_jobs or jobs
+            self.logger.info("🎵 Synchronisation des ratings Plex...")
+            self.logger.info(f"⚙️ Pipeline: vérification {check_jobs}, lecture des tags {read_jobs}, "
+                             f"écriture {jobs} thread(s)")
+
+            rating_counts = {}
+            # Ids des pistes lues et pas encore derrière le point de reprise (numéro d'ordre -> id)
+            item_ids = {}
+            ids_lock = threading.Lock()
+            last_read_id = after_id + 1
+            seen_paths = set()
+
+            def read_tracks() -> Iterator[TrackJob]:
+                # Étage source (thread dédié): lecture Plex par lots + listage des répertoires
+                nonlocal max_changed_at, last_read_id
+                index = 0
+                for track in tracks:
+                    max_changed_at = max(max_changed_at, track.changed_at or 0)
+                    if track.file_path in seen_paths:
+                        # Fichier déjà confié à une piste d'id inférieur (traitée avant elle
+                        # dans l'ordre du point de reprise)
+                        self.duplicate_count += 1
+                        self.logger.debug(f"🔁 Doublon ignoré (piste {track.item_id}): {track.file_path}")
+                        continue
+                    seen_paths.add(track.file_path)
+                    rating_counts[track.rating] = rating_counts.get(track.rating, 0) + 1
+                    with ids_lock:
+                        item_ids[index] = track.item_id
+                        last_read_id = track.item_id
+                    yield TrackJob(index, track)
+                    index += 1
+
+            def check(job: TrackJob) -> TrackJob:
+                job.status = self.check_file(job.track)
+                track = job.track
+                if job.status is None and state is not None and state.is_unchanged(
+                        STATE_CONSUMER, track.guid, track.rating, track.play_count, track.file_path,
+                        fingerprint=self.file_catalog.stat):
+                    self.logger.debug(f"⏭️ Déjà à jour: {track.file_path}")
+                    job.status = STATUS_UP_TO_DATE
+                return job
+
+            def read_tags(job: TrackJob) -> TrackJob:
+                job.status, job.pending = self.compare_tags(job.track)
+                return job
+
+            def write(job: TrackJob) -> TrackJob:
+                job.status = self.write_tags(job.track, job.pending)
+                job.pending = None
+                return job
+
+            pipeline = run_pipeline(read_tracks(), [
+                Stage('check', check, check_jobs),
+                Stage('read', read_tags, read_jobs),
+                Stage('write', write, jobs),
+            ], is_done=lambda job: job.status is not None)
+
+            finished = set()
+            next_index = 0
+            done_count = 0
+
+            def checkpoint_id() -> int:
+                # Toutes les pistes d'id inférieur à la première non terminée sont traitées;
+                # la dernière lue peut avoir d'autres fichiers (parts) pas encore lus
+                with ids_lock:
+                    return (item_ids[next_index] if next_index in item_ids else last_read_id) - 1
+
+            try:
+                # Les étages ne touchent pas aux compteurs: résultats comptés ici
+                for job in pipeline:
+                    track, status = job.track, job.status
+                    if status == STATUS_UP_TO_DATE:
+                        self.up_to_date_count += 1
+                    else:
+                        if not self.record_result(track, status):
+                            changed_at = track.changed_at or 0
+                            retry_changed_at = changed_at if retry_changed_at is None else min(retry_changed_at, changed_at)
+                        if state is not None and status in (STATUS_WRITTEN, STATUS_UNCHANGED):
+                            state.record_track(STATE_CONSUMER, track.guid, track.rating,
+                                               track.play_count, track.file_path)
+
+                    finished.add(job.index)
+                    with ids_lock:
+                        while next_index in finished:
+                            finished.discard(next_index)
+                            del item_ids[next_index]
+                            next_index += 1
+                    done_count += 1
+                    if done_count % CHECKPOINT_INTERVAL == 0:
+                        journal.save_checkpoint(STATE_CONSUMER, checkpoint_id(), changed_since,
+                                                max_changed_at, started_at, retry_changed_at)
+                        journal.commit()
+            except BaseException:
+                # Interruption ou erreur (disque démonté...): étages arrêtés, avancement
+                # sauvegardé avant de remonter
+                pipeline.close()
+                journal.save_checkpoint(STATE_CONSUMER, checkpoint_id(), changed_since,
+                                        max_changed_at, started_at, retry_changed_at)
+                journal.commit()
+                self.logger.warning(f"⏹️ Interrompu après la piste {checkpoint_id()}: relancez avec --resume")
+                raise
+
+            journal.clear_checkpoint(STATE_CONSUMER)
+            journal.commit()
+
+            total = self.print_statistics(rating_counts)
+            if not total:
+                if incremental or after_id >= 0:
+                    return {'success': True, 'total_ratings': 0, 'processed': 0, 'failed': 0,
+                            'skipped': 0, 'up_to_date': 0}
+                return {'success': False, 'error': 'Aucun rating trouvé dans Plex'}
 
-            for file_info in ratings:
-                self.sync_file_rating(file_info)
+            if state is not None:
+                # Filigrane inclusif (>=): plafonné, les pistes ignorées ou en échec sont relues
+                watermark = max_changed_at if retry_changed_at is None else min(max_changed_at, retry_changed_at)
+                if watermark < max_changed_at:
+                    self.logger.info(f"🔁 Filigrane retenu à {watermark}: "
+                                     f"{len(self.skipped_files) + len(self.failed_files)} piste(s) à retenter")
+                state.set_watermark(STATE_CONSUMER, watermark)
+                state.commit()
 
             # Résultats
             stats = {
                 'success': True,
-                'total_ratings': len(ratings),
-                'processed': len(self.processed_files),
+                'total_ratings': total,
+                'processed': self.processed_count,
+                'written': self.processed_count - self.unchanged_count,
+                'unchanged': self.unchanged_count,
                 'failed': len(self.failed_files),
-                'skipped': len(self.skipped_files)
+                'skipped': len(self.skipped_files),
+                'up_to_date': self.up_to_date_count,
+                'duplicates': self.duplicate_count
             }
 
             self.logger.info("✅ Synchronisation terminée:")
             self.logger.info(f"   📊 Total ratings: {stats['total_ratings']}")
             self.logger.info(f"   ✅ Traités: {stats['processed']}")
+            self.logger.info(f"      ✏️ Écrits: {stats['written']}")
+            self.logger.info(f"      ⏸️ Inchangés (tags déjà à jour): {stats['unchanged']}")
             self.logger.info(f"   ❌ Échecs: {stats['failed']}")
             self.logger.info(f"   ⚠️ Ignorés: {stats['skipped']}")
+            if incremental:
+                self.logger.info(f"   ⏭️ Déjà à jour: {stats['up_to_date']}")
+            if stats['duplicates']:
+                self.logger.info(f"   🔁 Doublons ignorés (fichier partagé): {stats['duplicates']}")
 
             return stats
 
@@ -344,6 +637,13 @@ class PlexRatingSync:
             self.logger.error(f"❌ Erreur synchronisation: {e}")
             return {'success': False, 'error': str(e)}
 
+        finally:
+            self.plex_db.close()
+            if journal is not None and journal is not state:
+                journal.close()
+            if state is not None:
+                state.close()
+
 def find_plex_database():
     """Trouve automatiquement la base de données Plex"""
     possible_paths = [
@@ -360,6 +660,20 @@ def find_plex_database():
 
     return None
 
+def print_tag_benchmark(paths: List[str], rounds: int = 5):
+    """Affiche le micro-benchmark des écrivains de tags (médianes sur `rounds` passes)"""
+    results = benchmark_writers(paths, rounds=rounds)
+    if not results:
+        print("⚠️ Aucun fichier d'un format pris en charge")
+        return
+
+    print(f"⏱️ Écrivains de tags, médiane sur {rounds} passes (ms)")
+    print(f"{'Format':<12} {'Taille':>10} {'Minimal':>9} {'Complet':>9} {'Écriture':>9}  Fichier")
+    for container, timing in sorted(results.items()):
+        measures = [f"{timing[key]:>9.3f}" if timing[key] is not None else f"{'échec':>9}"
+                    for key in ('minimal', 'full', 'write')]
+        print(f"{container:<12} {timing['size']:>10} {' '.join(measures)}  {Path(timing['file']).name}")
+
 def main():
     parser = argparse.ArgumentParser(
         description='Synchronise les ratings Plex vers les métadonnées des fichiers audio',
@@ -378,8 +692,26 @@ Exemples:
     # Sauvegarder les ratings dans un JSON sans synchroniser
     python3 plex_rating_sync_complete.py --plex-db /path/to/plex.db --export-only ratings.json
 
+    # Export JSON Lines compact, relu en flux par sync_ratings_to_id3.py
+    python3 plex_rating_sync_complete.py --plex-db /path/to/plex.db --export-only ratings.jsonl --compact
+
     # Statistiques seulement
     python3 plex_rating_sync_complete.py --plex-db /path/to/plex.db --stats
+
+    # Statistiques ventilées par album
+    python3 plex_rating_sync_complete.py --plex-db /path/to/plex.db --stats --stats-by album
+
+    # Synchronisation incrémentale (seulement les ratings modifiés depuis la dernière fois)
+    python3 plex_rating_sync_complete.py --auto-find-db --incremental
+
+    # Resynchronisation complète sur 8 workers
+    python3 plex_rating_sync_complete.py --auto-find-db --jobs 8
+
+    # Reprendre une synchronisation interrompue (Ctrl+C, redémarrage...)
+    python3 plex_rating_sync_complete.py --auto-find-db --jobs 8 --resume
+
+    # Micro-benchmark des écrivains de tags (un fichier par format, copies temporaires)
+    python3 plex_rating_sync_complete.py --benchmark-tags a.mp3 b.flac c.m4a d.ogg
         """
     )
 
@@ -407,12 +739,101 @@ Exemples:
         help='Affiche les statistiques et quitte'
     )
 
+    parser.add_argument(
+        '--stats-by',
+        choices=['album', 'artist'],
+        help='Avec --stats: ventile aussi les pistes ratées par album ou par artiste'
+    )
+
     parser.add_argument(
         '--export-only',
         type=str,
         help='Exporte les ratings vers JSON sans synchroniser'
     )
 
+    parser.add_argument(
+        '--jsonl',
+        action='store_true',
+        help='Export au format JSON Lines (un objet par ligne; automatique pour .jsonl/.ndjson)'
+    )
+
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Export compact (JSON sans indentation; JSON Lines réduit à file_path, rating, play_count)'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Nombre de fichiers traités en parallèle (défaut: 1)'
+    )
+
+    parser.add_argument(
+        '--read-jobs',
+        type=int,
+        metavar='N',
+        help='Threads de lecture/comparaison des tags (défaut: --jobs)'
+    )
+
+    parser.add_argument(
+        '--check-jobs',
+        type=int,
+        default=DEFAULT_CHECK_JOBS,
+        metavar='N',
+        help=f'Threads de vérification (existence, empreinte) avant lecture des tags (défaut: {DEFAULT_CHECK_JOBS})'
+    )
+
+    parser.add_argument(
+        '--path-map',
+        type=parse_path_mapping,
+        action='append',
+        default=[],
+        metavar='PLEX=HÔTE',
+        help='Réécrit le préfixe de chemin Plex en préfixe local (répétable, le plus long l\'emporte)'
+    )
+
+    parser.add_argument(
+        '--scan-jobs',
+        type=int,
+        default=DEFAULT_SCAN_JOBS,
+        metavar='N',
+        help=f'Répertoires listés en parallèle pour vérifier l\'existence des fichiers (défaut: {DEFAULT_SCAN_JOBS})'
+    )
+
+    parser.add_argument(
+        '--force-write',
+        action='store_true',
+        help='Réécrit les tags même s\'ils contiennent déjà le rating et le play count cibles'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Ne traite que les ratings modifiés depuis la dernière synchronisation'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reprend le dernier run interrompu là où il s\'est arrêté'
+    )
+
+    parser.add_argument(
+        '--state-db',
+        type=str,
+        help='Base d\'état locale (mode incrémental, points de reprise; défaut: ~/.cache/plex_ratings_sync/state.db)'
+    )
+
+    parser.add_argument(
+        '--benchmark-tags',
+        nargs='+',
+        metavar='FICHIER',
+        help='Mesure lecture minimale, lecture complète et écriture des tags par format, puis quitte'
+    )
+
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
@@ -421,6 +842,18 @@ Exemples:
 
     args = parser.parse_args()
 
+    # Micro-benchmark: ne nécessite pas la base Plex
+    if args.benchmark_tags:
+        print_tag_benchmark(args.benchmark_tags)
+        return
+
+    # Correspondances de chemins: refusées d'emblée si elles ne sont pas réversibles
+    try:
+        PathMapper(args.path_map)
+    except ValueError as e:
+        print(f"❌ --path-map: {e}")
+        sys.exit(1)
+
     # Déterminer le chemin de la base Plex
     plex_db_path = args.plex_db
 
@@ -436,22 +869,36 @@ Exemples:
 
     # Initialiser le synchroniseur
     try:
-        syncer = PlexRatingSync(plex_db_path, verbose=args.verbose)
+        syncer = PlexRatingSync(plex_db_path, verbose=args.verbose, force_write=args.force_write,
+                                scan_jobs=args.scan_jobs, path_mappings=args.path_map)
 
         # Mode export seulement
         if args.export_only:
-            ratings = syncer.get_plex_ratings()
-            syncer.save_ratings_json(ratings, Path(args.export_only))
+            output_file = Path(args.export_only)
+            if args.jsonl or output_file.suffix.lower() in JSONL_SUFFIXES:
+                syncer.save_ratings_jsonl(syncer.iter_plex_ratings(), output_file, compact=args.compact)
+            else:
+                syncer.save_ratings_json(syncer.iter_plex_ratings(), output_file, compact=args.compact)
             return
 
         # Mode statistiques
         if args.stats:
-            ratings = syncer.get_plex_ratings()
-            syncer.show_statistics(ratings)
+            try:
+                syncer.show_plex_statistics(args.stats_by)
+            finally:
+                syncer.plex_db.close()
             return
 
         # Synchronisation
-        result = syncer.sync_all_ratings(dry_run=args.dry_run)
+        result = syncer.sync_all_ratings(
+            dry_run=args.dry_run,
+            incremental=args.incremental,
+            state_db=args.state_db,
+            jobs=args.jobs,
+            resume=args.resume,
+            read_jobs=args.read_jobs,
+            check_jobs=args.check_jobs
+        )
 
         if not result['success']:
             print(f"❌ Erreur: {result.get('error', 'Erreur inconnue')}")
@@ -19,23 +19,283 @@ Usage:
 
 import os
 import sys
-import sqlite3
-import shutil
 import logging
 import argparse
 import subprocess
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
 from datetime import datetime, timedelta
 import json
+import time
+from array import array
+
+from sync_state import SongrecCache, SyncStateStore, content_fingerprint, plex_change_expression
+from notification_dispatcher import NotificationDispatcher
+from backup_store import ContentBackupStore
+from deletion_journal import DeletionJournal
+from file_backup import DEFAULT_BACKUP_JOBS, BackupStrategy
+from file_catalog import DEFAULT_SCAN_JOBS, FileCatalog
+from path_mapping import PathMapper, parse_path_mapping
+from plex_db import PlexDatabase, settings_join
+from rating_index import RatingIndex
+from rating_stats import collect_rating_stats, normalize_rating
+from worker_pool import run_bounded
+
+# Clé du consommateur dans le magasin d'état local
+STATE_CONSUMER = 'ratings_sync'
+
+# Nombre maximum de paramètres par liste IN (...) (limite SQLite historique: 999)
+SQL_IN_CHUNK_SIZE = 500
+
+# Valeur sentinelle des colonnes entières de l'instantané pour un champ NULL
+MISSING = -1
+
+class RatingsSnapshot:
+    """Instantané en mémoire des ratings Plex
+
+    Les pistes sont stockées en colonnes compactes (array) partageant la même
+    position; albums et artistes sont référencés par id. Pistes, albums et
+    artistes sont partitionnés une fois par rating: filtres et histogrammes
+    ne parcourent plus la liste complète.
+    """
+
+    def __init__(self, map_path: Optional[Callable[[str], str]] = None):
+        # Réécriture des chemins Plex -> hôte, appliquée à l'ajout de chaque piste
+        self.map_path = map_path
+        # Colonnes des pistes (None stocké comme MISSING dans les colonnes entières)
+        self.album_ids = array('q')
+        self.indexes = array('q')
+        self.durations = array('q')
+        self.years = array('q')
+        self.ratings = array('d')  # Rating Plex brut, 0 si non raté
+        self.play_counts = array('q')
+        self.titles = []
+        self.file_paths = []
+        self.guids = []
+        self.changed_ats = array('q')  # Dernier changement Plex de chaque piste
+        # Albums/artistes: id -> {'parent_id', 'title', 'rating'}
+        self.albums = {}
+        self.artists = {}
+        self.files_by_album = {}
+        self.files_by_artist = {}
+        # Partitions par rating (étoiles): positions de pistes triées, ids d'albums/artistes triés
+        self.tracks_by_rating = {}
+        self.albums_by_rating = {}
+        self.artists_by_rating = {}
+        # True quand toutes les pistes (ratées ou non) sont chargées
+        self.complete = False
+        # Dernier horodatage de changement Plex vu (filigrane incrémental)
+        self.max_changed_at = 0
+
+    def add_entity(self, item_id: int, metadata_type: int, parent_id: Optional[int],
+                   title: Optional[str], user_rating: Optional[float]):
+        """Ajoute un album (type 2) ou un artiste (type 3)"""
+        entities = self.albums if metadata_type == 2 else self.artists
+        entity = entities.get(item_id)
+        if entity is None:
+            entities[item_id] = {'parent_id': parent_id, 'title': title, 'rating': user_rating}
+        elif entity['rating'] is None:
+            # Plusieurs comptes: garder le premier rating renseigné
+            entity['rating'] = user_rating
+
+    def add_track(self, album_id: Optional[int], track_title: Optional[str], index: Optional[int],
+                  duration: Optional[int], year: Optional[int], user_rating: Optional[float],
+                  play_count: Optional[int], file_path: str, guid: Optional[str] = None,
+                  changed_at: Optional[int] = None):
+        """Ajoute une piste avec son fichier (album_id = parent_id Plex)"""
+        self.album_ids.append(MISSING if album_id is None else album_id)
+        self.indexes.append(MISSING if index is None else index)
+        self.durations.append(MISSING if duration is None else duration)
+        self.years.append(MISSING if year is None else year)
+        self.ratings.append(user_rating or 0)
+        self.play_counts.append(play_count or 0)
+        self.titles.append(track_title)
+        self.file_paths.append(self.map_path(file_path) if self.map_path else file_path)
+        self.guids.append(guid)
+        self.changed_ats.append(changed_at or 0)
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def build_indexes(self):
+        """Construit les index album/artiste -> pistes et les partitions par rating"""
+        ratings = self.ratings
+        rated_positions = []
+        for position, album_id in enumerate(self.album_ids):
+            self.files_by_album.setdefault(album_id, []).append(position)
+            album = self.albums.get(album_id)
+            if album is not None:
+                self.files_by_artist.setdefault(album['parent_id'], []).append(position)
+            if ratings[position]:
+                rated_positions.append(position)
+
+        def track_order(position):
+            index = self.indexes[position]
+            return (index == MISSING, max(index, 0))
+
+        for positions in self.files_by_album.values():
+            positions.sort(key=track_order)
+        for positions in self.files_by_artist.values():
+            positions.sort(key=lambda position: (self._album_title(self.album_ids[position]) or '',) + track_order(position))
+
+        # Ordre historique des vues: rating, artiste, album, titre
+        rated_positions.sort(key=self._rated_track_rank)
+        for position in rated_positions:
+            stars = normalize_rating(ratings[position])
+            self.tracks_by_rating.setdefault(stars, array('q')).append(position)
+
+        rated_albums = [album_id for album_id, album in self.albums.items() if album['rating']]
+        rated_albums.sort(key=lambda album_id: (
+            self.albums[album_id]['rating'], self._artist_title(self.albums[album_id]['parent_id']) or '',
+            self.albums[album_id]['title'] or ''))
+        for album_id in rated_albums:
+            self.albums_by_rating.setdefault(normalize_rating(self.albums[album_id]['rating']), []).append(album_id)
+
+        rated_artists = [artist_id for artist_id, artist in self.artists.items() if artist['rating']]
+        rated_artists.sort(key=lambda artist_id: (self.artists[artist_id]['rating'], self.artists[artist_id]['title'] or ''))
+        for artist_id in rated_artists:
+            self.artists_by_rating.setdefault(normalize_rating(self.artists[artist_id]['rating']), []).append(artist_id)
+
+    def _album_title(self, album_id: Optional[int]) -> Optional[str]:
+        album = self.albums.get(album_id)
+        return album['title'] if album else None
+
+    def _artist_title(self, artist_id: Optional[int]) -> Optional[str]:
+        artist = self.artists.get(artist_id)
+        return artist['title'] if artist else None
+
+    def _artist_name(self, album_id: Optional[int]) -> Optional[str]:
+        album = self.albums.get(album_id)
+        return self._artist_title(album['parent_id']) if album else None
+
+    def _file_info(self, position: int) -> Dict:
+        album_id = self.album_ids[position]
+        user_rating = self.ratings[position]
+        duration = self.durations[position]
+        year = self.years[position]
+        return {
+            'file_path': self.file_paths[position],
+            'rating': normalize_rating(user_rating) if user_rating else None,
+            'play_count': self.play_counts[position],
+            'track_title': self.titles[position] or 'Unknown',
+            'album_title': self._album_title(album_id) or 'Unknown Album',
+            'artist_name': self._artist_name(album_id) or 'Unknown Artist',
+            'duration': None if duration == MISSING else duration,
+            'year': None if year == MISSING else year,
+            'guid': self.guids[position],
+            'changed_at': self.changed_ats[position]
+        }
+
+    def iter_rated_tracks(self, target_rating: Optional[float] = None) -> Iterator[Dict]:
+        """Pistes avec rating (éventuellement un seul), triées par rating, artiste, album, titre
+
+        Les dicts sont construits au fil de l'itération, un par piste consommée.
+        """
+        if target_rating is not None:
+            positions = self.tracks_by_rating.get(target_rating, ())
+        else:
+            positions = sorted(
+                (position for partition in self.tracks_by_rating.values() for position in partition),
+                key=self._rated_track_rank)
+        for position in positions:
+            yield self._file_info(position)
+
+    def _rated_track_rank(self, position: int) -> Tuple:
+        album_id = self.album_ids[position]
+        return (self.ratings[position], self._artist_name(album_id) or '',
+                self._album_title(album_id) or '', self.titles[position] or '')
+
+    def rated_tracks(self) -> List[Dict]:
+        """Pistes avec rating, triées par rating, artiste, album, titre"""
+        return list(self.iter_rated_tracks())
+
+    def track_rating_counts(self) -> Dict[float, int]:
+        """Histogramme des pistes par rating (étoiles), lu sur les partitions"""
+        return {rating: len(positions) for rating, positions in self.tracks_by_rating.items()}
+
+    def album_rating_counts(self) -> Dict[float, int]:
+        """Histogramme des albums par rating (étoiles)"""
+        return {rating: len(ids) for rating, ids in self.albums_by_rating.items()}
+
+    def artist_rating_counts(self) -> Dict[float, int]:
+        """Histogramme des artistes par rating (étoiles)"""
+        return {rating: len(ids) for rating, ids in self.artists_by_rating.items()}
+
+    def rating_statistics(self) -> Dict[str, Dict[float, int]]:
+        """Histogrammes pistes/albums/artistes (même forme que rating_stats.collect_rating_stats)"""
+        return {
+            'tracks': self.track_rating_counts(),
+            'albums': self.album_rating_counts(),
+            'artists': self.artist_rating_counts(),
+        }
+
+    def rated_albums(self, target_rating: Optional[float] = None) -> List[Dict]:
+        """Albums avec rating (éventuellement un seul), triés par rating, artiste, titre"""
+        if target_rating is not None:
+            album_ids = self.albums_by_rating.get(target_rating, [])
+        else:
+            album_ids = sorted(
+                (album_id for ids in self.albums_by_rating.values() for album_id in ids),
+                key=lambda album_id: (self.albums[album_id]['rating'],
+                                      self._artist_title(self.albums[album_id]['parent_id']) or '',
+                                      self.albums[album_id]['title'] or ''))
+        return [{
+            'album_title': self.albums[album_id]['title'] or 'Unknown Album',
+            'artist_name': self._artist_title(self.albums[album_id]['parent_id']) or 'Unknown Artist',
+            'rating': normalize_rating(self.albums[album_id]['rating']),
+            'album_id': album_id
+        } for album_id in album_ids]
+
+    def rated_artists(self, target_rating: Optional[float] = None) -> List[Dict]:
+        """Artistes avec rating (éventuellement un seul), triés par rating, nom"""
+        if target_rating is not None:
+            artist_ids = self.artists_by_rating.get(target_rating, [])
+        else:
+            artist_ids = sorted(
+                (artist_id for ids in self.artists_by_rating.values() for artist_id in ids),
+                key=lambda artist_id: (self.artists[artist_id]['rating'], self.artists[artist_id]['title'] or ''))
+        return [{
+            'artist_name': self.artists[artist_id]['title'] or 'Unknown Artist',
+            'rating': normalize_rating(self.artists[artist_id]['rating']),
+            'artist_id': artist_id
+        } for artist_id in artist_ids]
+
+    def _expand(self, positions: List[int]) -> List[Dict]:
+        files = []
+        for position in positions:
+            file_info = self._file_info(position)
+            del file_info['play_count'], file_info['duration'], file_info['year'], file_info['guid']
+            del file_info['changed_at']
+            file_info['rating'] = 1.0  # Pour cohérence avec les autres
+            files.append(file_info)
+        return files
+
+    def album_files(self, album_id: int) -> List[Dict]:
+        """Fichiers d'un album (lookup en mémoire)"""
+        return self._expand(self.files_by_album.get(album_id, []))
+
+    def artist_files(self, artist_id: int) -> List[Dict]:
+        """Fichiers d'un artiste (lookup en mémoire)"""
+        return self._expand(self.files_by_artist.get(artist_id, []))
 
 class PlexRatingsSync:
     def __init__(self, plex_db_path: str, config: Optional[Dict] = None):
         self.plex_db_path = Path(plex_db_path)
+        # Lecture seule réutilisée pendant l'exécution, écriture pour le nettoyage seulement
+        self.plex_db = PlexDatabase(plex_db_path)
         self.deleted_files = []
         self.processed_files = 0
         self.errors = []
         self.skipped_files = []
+        self._snapshot = None
+        # Mode incrémental: magasin d'état local et filigrane Plex
+        self.state_store = None
+        self.changed_since = None
+        self.songrec_cache = None
+        self.rating_index = None
+        self.backup_strategy = None
+        self.backup_store = None
+        self.deletion_journal = None
         
         # Configuration par défaut
         default_config = {
@@ -44,11 +304,31 @@ class PlexRatingsSync:
             'audio_extensions': ('.mp3', '.flac', '.m4a', '.ogg', '.wma', '.aac', '.wav'),
             'log_level': 'INFO',
             'verify_file_exists': True,
-            'dry_run': True
+            'dry_run': True,
+            'songrec_bin': 'songrec',  # Exécutable songrec (résolu via PATH)
+            'songrec_jobs': 1,  # Identifications songrec simultanées
+            'songrec_timeout': 30,  # Timeout par fichier (secondes)
+            'songrec_deadline': None,  # Durée maximale de l'étape songrec (secondes)
+            'songrec_cache': True,  # Cache des identifications par empreinte de contenu
+            'songrec_cache_db': None,  # Défaut: ~/.cache/plex_ratings_sync/songrec_cache.db
+            'songrec_negative_ttl_days': 7,  # Durée de vie des échecs en cache
+            'snapshot_db': False,  # Lire une copie de la base (backup en ligne) plutôt que la base vivante
+            'snapshot_dir': None,  # Défaut: /dev/shm si disponible
+            'rating_index': False,  # Lectures via l'index local des ratings (base annexe indexée)
+            'rating_index_db': None,  # Défaut: ~/.cache/plex_ratings_sync/rating_index.db
+            'scan_jobs': DEFAULT_SCAN_JOBS,  # Répertoires listés en parallèle pour les vérifications d'existence
+            'path_mappings': [],  # [(préfixe Plex, préfixe hôte)]: chemins Plex réécrits à l'extraction
+            'backup_jobs': DEFAULT_BACKUP_JOBS,  # Sauvegardes/suppressions simultanées lors des purges
+            'backup_store': False,  # backup_dir est un magasin dédupliqué par contenu (blobs + index)
+            'deletion_journal': None  # Défaut: ~/.cache/plex_ratings_sync/deletion_journal.jsonl
         }
         
         self.config = {**default_config, **(config or {})}
+        # Existence des fichiers: un listage par répertoire au lieu d'un stat par fichier
+        self.file_catalog = FileCatalog(self.config['scan_jobs'])
+        self.path_mapper = PathMapper(self.config['path_mappings'])
         self.setup_logging()
+        self.notifier = NotificationDispatcher(logger=self.logger)
         
     def setup_logging(self):
         """Configure le système de logs"""
@@ -73,272 +353,331 @@ class PlexRatingsSync:
             return False
             
         try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                # Vérifier les tables nécessaires
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('metadata_items', 'media_items', 'media_parts')")
-                tables = [row[0] for row in cursor.fetchall()]
-                
-                required_tables = ['metadata_items', 'media_items', 'media_parts']
-                missing_tables = [table for table in required_tables if table not in tables]
+            cursor = self.plex_db.reader().cursor()
+            # Vérifier les tables nécessaires
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('metadata_items', 'media_items', 'media_parts')")
+            tables = [row[0] for row in cursor.fetchall()]
+            
+            required_tables = ['metadata_items', 'media_items', 'media_parts']
+            missing_tables = [table for table in required_tables if table not in tables]
+            
+            if missing_tables:
+                self.logger.error(f"Tables manquantes dans la DB Plex: {missing_tables}")
+                return False
                 
-                if missing_tables:
-                    self.logger.error(f"Tables manquantes dans la DB Plex: {missing_tables}")
-                    return False
-                    
-                self.logger.info(f"✅ Base de données Plex vérifiée: {self.plex_db_path}")
-                return True
+            self.logger.info(f"✅ Base de données Plex vérifiée: {self.plex_db_path}")
+            return True
                 
         except Exception as e:
             self.logger.error(f"Erreur lors de la vérification de la DB Plex: {e}")
             return False
     
-    def get_rated_audio_files(self) -> List[Dict]:
-        """Extrait les fichiers audio avec leur rating depuis la base Plex"""
-        rated_files = []
-        
+    def load_ratings_snapshot(self, refresh: bool = False) -> 'RatingsSnapshot':
+        """Charge (une seule fois) l'instantané des ratings depuis la base Plex
+
+        Pistes, albums, artistes et hiérarchie sont lus dans une seule
+        transaction de lecture; les vues sont ensuite servies depuis la mémoire.
+        En mode incrémental, seuls les ratings modifiés depuis le filigrane sont
+        retenus et l'instantané ne contient pas toutes les pistes.
+        """
+        if self._snapshot is not None and not refresh:
+            return self._snapshot
+
+        if self.config['snapshot_db'] and self.plex_db.snapshot_path is None:
+            try:
+                duration = self.plex_db.take_snapshot(self.config['snapshot_dir'])
+                size_mb = self.plex_db.snapshot_path.stat().st_size / (1024 * 1024)
+                self.logger.info(f"📸 Copie de la base Plex en {duration:.2f} s ({size_mb:.1f} Mo): {self.plex_db.snapshot_path}")
+            except Exception as e:
+                self.logger.warning(f"⚠️ Copie de la base Plex impossible, lecture directe: {e}")
+
+        if self.config['rating_index']:
+            return self._load_snapshot_from_index()
+
+        snapshot = RatingsSnapshot(self.path_mapper.to_host if self.path_mapper else None)
+        start = time.perf_counter()
+
         try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                
-                # Requête pour obtenir les fichiers audio avec ratings utilisateur et play counts
-                query = """
+            # Transaction de lecture: les deux requêtes voient le même état
+            with self.plex_db.read_transaction() as cursor:
+                change_expression = plex_change_expression(cursor)
+                if change_expression is None:
+                    if self.changed_since is not None:
+                        self.logger.warning("⚠️ Colonnes updated_at/last_rated_at absentes: lecture complète")
+                    change_expression = '0'
+                changed_since = self.changed_since or 0
+                # Une ligne de settings par élément, même avec plusieurs comptes Plex
+                settings_on = settings_join(cursor)
+
+                # Albums et artistes (titres, hiérarchie et ratings)
+                cursor.execute(f"""
                 SELECT 
-                    mi.title as track_title,
-                    mis.rating as user_rating,
-                    mis.view_count as play_count,
-                    mp.file as file_path,
+                    mi.id,
+                    mi.metadata_type,
+                    mi.parent_id,
+                    mi.title,
+                    mis.rating,
+                    {change_expression} as changed_at
+                FROM metadata_items mi
+                LEFT JOIN metadata_item_settings mis ON {settings_on}
+                WHERE mi.metadata_type IN (2, 3)  -- Type 2 = Album, Type 3 = Artist
+                """)
+                for item_id, metadata_type, parent_id, title, user_rating, changed_at in cursor:
+                    if user_rating is not None:
+                        snapshot.max_changed_at = max(snapshot.max_changed_at, changed_at)
+                        if changed_at < changed_since:
+                            user_rating = None  # Rating inchangé depuis la dernière exécution
+                    snapshot.add_entity(item_id, metadata_type, parent_id, title, user_rating)
+
+                # Mode complet: toutes les pistes avec fichier, ratées ou non (pour l'expansion
+                # albums/artistes). Mode incrémental: seulement les ratings modifiés.
+                incremental_filter = ''
+                params = ()
+                if self.changed_since is not None:
+                    incremental_filter = f"AND mis.rating IS NOT NULL AND {change_expression} >= ?"
+                    params = (self.changed_since,)
+
+                cursor.execute(f"""
+                SELECT 
+                    mi.parent_id,
+                    mi.title,
+                    mi."index",
                     mi.duration,
                     mi.year,
-                    parent_mi.title as album_title,
-                    grandparent_mi.title as artist_name
+                    mis.rating,
+                    mis.view_count,
+                    mp.file,
+                    mi.guid,
+                    {change_expression} as changed_at
                 FROM metadata_items mi
-                LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-                LEFT JOIN media_parts mp ON media.id = mp.media_item_id
-                LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
-                LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
-                LEFT JOIN metadata_item_settings mis ON mi.guid = mis.guid
+                JOIN media_items media ON mi.id = media.metadata_item_id
+                JOIN media_parts mp ON media.id = mp.media_item_id
+                LEFT JOIN metadata_item_settings mis ON {settings_on}
                 WHERE mi.metadata_type = 10  -- Type 10 = Track/Audio
                 AND mp.file IS NOT NULL
-                AND mis.rating IS NOT NULL
-                ORDER BY mis.rating, grandparent_mi.title, parent_mi.title, mi.title
-                """
-                
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    track_title, user_rating, play_count, file_path, duration, year, album_title, artist_name = row
-                    
-                    # Convertir le rating (Plex stocke parfois sur 10, parfois sur 5)
-                    final_rating = user_rating
-                    if final_rating:
-                        # Normaliser sur une échelle de 1-5 étoiles
-                        if final_rating > 5:
-                            final_rating = final_rating / 2  # Conversion 10 -> 5
-                        
-                        rated_files.append({
-                            'file_path': file_path,
-                            'rating': final_rating,
-                            'play_count': play_count or 0,
-                            'track_title': track_title or 'Unknown',
-                            'album_title': album_title or 'Unknown Album',
-                            'artist_name': artist_name or 'Unknown Artist',
-                            'duration': duration,
-                            'year': year
-                        })
-                
-                self.logger.info(f"📊 Trouvé {len(rated_files)} fichiers avec ratings dans Plex")
-                return rated_files
-                
+                {incremental_filter}
+                """, params)
+                for row in cursor:
+                    if row[5] is not None:
+                        snapshot.max_changed_at = max(snapshot.max_changed_at, row[-1])
+                    snapshot.add_track(*row)
+
         except Exception as e:
             self.logger.error(f"Erreur lors de la lecture des ratings Plex: {e}")
-            return []
+            self.errors.append(f"Lecture des ratings Plex échouée: {e}")
+            return snapshot
+
+        snapshot.build_indexes()
+        snapshot.complete = self.changed_since is None
+        self._snapshot = snapshot
+        if self.path_mapper:
+            self.logger.info(f"🔀 {self.path_mapper.mapped_count} chemin(s) Plex réécrit(s) vers l'hôte")
+        source = 'copie' if self.plex_db.snapshot_path is not None else 'base vivante'
+        self.logger.debug(f"⏱️ Extraction des ratings en {time.perf_counter() - start:.2f} s ({source})")
+        return snapshot
+
+    def _load_snapshot_from_index(self) -> 'RatingsSnapshot':
+        """Instantané servi par l'index local, rafraîchi au préalable depuis Plex
+
+        Seules les pistes ratées sont chargées (index items_rated); l'expansion
+        album/artiste passe ensuite par les index hiérarchiques de la base annexe.
+        """
+        snapshot = RatingsSnapshot(self.path_mapper.to_host if self.path_mapper else None)
+        start = time.perf_counter()
+
+        try:
+            if self.rating_index is None:
+                self.rating_index = RatingIndex(self.config['rating_index_db'])
+            refreshed, removed = self.rating_index.refresh(self.plex_db.read_uri())
+            self.logger.info(f"🗂️ Index des ratings à jour ({self.rating_index.db_path}): "
+                             f"{refreshed} ligne(s) relue(s), {removed} supprimée(s)")
+
+            changed_since = self.changed_since or 0
+            for item_id, metadata_type, parent_id, title, user_rating, changed_at in self.rating_index.entities():
+                if user_rating is not None:
+                    snapshot.max_changed_at = max(snapshot.max_changed_at, changed_at)
+                    if changed_at < changed_since:
+                        user_rating = None  # Rating inchangé depuis la dernière exécution
+                snapshot.add_entity(item_id, metadata_type, parent_id, title, user_rating)
+
+            for row in self.rating_index.rated_tracks(self.changed_since):
+                snapshot.max_changed_at = max(snapshot.max_changed_at, row[-1])
+                snapshot.add_track(*row)
+
+        except Exception as e:
+            self.logger.error(f"Erreur lors de la lecture de l'index des ratings: {e}")
+            self.errors.append(f"Lecture de l'index des ratings échouée: {e}")
+            return snapshot
+
+        snapshot.build_indexes()
+        # Pistes non ratées absentes: l'expansion interroge l'index
+        snapshot.complete = False
+        self._snapshot = snapshot
+        if self.path_mapper:
+            self.logger.info(f"🔀 {self.path_mapper.mapped_count} chemin(s) Plex réécrit(s) vers l'hôte")
+        self.logger.debug(f"⏱️ Extraction des ratings en {time.perf_counter() - start:.2f} s (index local)")
+        return snapshot
+
+    def benchmark_read_modes(self, rounds: int = 3) -> Dict:
+        """Compare l'extraction directe sur la base vivante et via une copie (backup + lecture)
+
+        Retourne les durées médianes en secondes pour choisir le mode le plus rapide.
+        """
+        timings = {'direct': [], 'backup': [], 'snapshot_read': []}
+        # Copies prises explicitement ci-dessous, pas par load_ratings_snapshot
+        self.config['snapshot_db'] = False
+
+        for _ in range(max(1, rounds)):
+            self.plex_db.close()
+            start = time.perf_counter()
+            self.load_ratings_snapshot(refresh=True)
+            timings['direct'].append(time.perf_counter() - start)
+
+            timings['backup'].append(self.plex_db.take_snapshot(self.config['snapshot_dir']))
+            start = time.perf_counter()
+            self.load_ratings_snapshot(refresh=True)
+            timings['snapshot_read'].append(time.perf_counter() - start)
+            self.plex_db.close()
+
+        medians = {mode: sorted(values)[len(values) // 2] for mode, values in timings.items()}
+        medians['snapshot_total'] = medians['backup'] + medians['snapshot_read']
+        medians['recommended'] = 'snapshot' if medians['snapshot_total'] < medians['direct'] else 'direct'
+        return medians
+
+    def enable_incremental(self, state_db: Optional[str] = None):
+        """Active le mode incrémental à partir du magasin d'état local"""
+        self.state_store = SyncStateStore(state_db)
+        self.changed_since = self.state_store.get_watermark(STATE_CONSUMER)
+        self._snapshot = None
+        self.logger.info(f"🔁 Mode incrémental (état: {self.state_store.db_path}, depuis: {self.changed_since})")
+
+    def get_rated_audio_files(self) -> List[Dict]:
+        """Extrait les fichiers audio avec leur rating depuis la base Plex"""
+        rated_files = self.load_ratings_snapshot().rated_tracks()
+        self.logger.info(f"📊 Trouvé {len(rated_files)} fichiers avec ratings dans Plex")
+        return rated_files
+    
+    def iter_rated_audio_files(self, target_rating: Optional[float] = None) -> Iterator[Dict]:
+        """Itère sur les fichiers avec rating (ou avec target_rating étoiles) sans liste complète"""
+        return self.load_ratings_snapshot().iter_rated_tracks(target_rating)
     
     def get_rated_albums(self) -> List[Dict]:
         """Extrait les albums avec leur rating depuis la base Plex"""
-        rated_albums = []
-        
-        try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                
-                # Requête pour obtenir les albums avec ratings utilisateur
-                query = """
-                SELECT 
-                    mi.title as album_title,
-                    mis.rating as user_rating,
-                    parent_mi.title as artist_name,
-                    mi.id as album_id
-                FROM metadata_items mi
-                LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
-                LEFT JOIN metadata_item_settings mis ON mi.guid = mis.guid
-                WHERE mi.metadata_type = 2  -- Type 2 = Album
-                AND mis.rating IS NOT NULL
-                ORDER BY mis.rating, parent_mi.title, mi.title
-                """
-                
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    album_title, user_rating, artist_name, album_id = row
-                    
-                    # Convertir le rating
-                    final_rating = user_rating
-                    if final_rating:
-                        if final_rating > 5:
-                            final_rating = final_rating / 2
-                        
-                        rated_albums.append({
-                            'album_title': album_title or 'Unknown Album',
-                            'artist_name': artist_name or 'Unknown Artist',
-                            'rating': final_rating,
-                            'album_id': album_id
-                        })
-                
-                self.logger.info(f"💿 Trouvé {len(rated_albums)} albums avec ratings dans Plex")
-                return rated_albums
-                
-        except Exception as e:
-            self.logger.error(f"Erreur lors de la lecture des ratings albums Plex: {e}")
-            return []
+        rated_albums = self.load_ratings_snapshot().rated_albums()
+        self.logger.info(f"💿 Trouvé {len(rated_albums)} albums avec ratings dans Plex")
+        return rated_albums
     
     def get_rated_artists(self) -> List[Dict]:
         """Extrait les artistes avec leur rating depuis la base Plex"""
-        rated_artists = []
-        
-        try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                
-                # Requête pour obtenir les artistes avec ratings utilisateur
-                query = """
-                SELECT 
-                    mi.title as artist_name,
-                    mis.rating as user_rating,
-                    mi.id as artist_id
-                FROM metadata_items mi
-                LEFT JOIN metadata_item_settings mis ON mi.guid = mis.guid
-                WHERE mi.metadata_type = 3  -- Type 3 = Artist
-                AND mis.rating IS NOT NULL
-                ORDER BY mis.rating, mi.title
-                """
-                
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    artist_name, user_rating, artist_id = row
-                    
-                    # Convertir le rating
-                    final_rating = user_rating
-                    if final_rating:
-                        if final_rating > 5:
-                            final_rating = final_rating / 2
-                        
-                        rated_artists.append({
-                            'artist_name': artist_name or 'Unknown Artist',
-                            'rating': final_rating,
-                            'artist_id': artist_id
-                        })
-                
-                self.logger.info(f"🎤 Trouvé {len(rated_artists)} artistes avec ratings dans Plex")
-                return rated_artists
-                
-        except Exception as e:
-            self.logger.error(f"Erreur lors de la lecture des ratings artistes Plex: {e}")
-            return []
+        rated_artists = self.load_ratings_snapshot().rated_artists()
+        self.logger.info(f"🎤 Trouvé {len(rated_artists)} artistes avec ratings dans Plex")
+        return rated_artists
     
-    def get_album_files(self, album_id: int) -> List[Dict]:
-        """Récupère tous les fichiers d'un album"""
-        files = []
-        
+    def get_files_for_albums(self, album_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+        """Récupère en une passe les fichiers de plusieurs albums, groupés par album"""
+        return self._get_files_for_parents(album_ids, 'album')
+
+    def get_files_for_artists(self, artist_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+        """Récupère en une passe les fichiers de plusieurs artistes, groupés par artiste"""
+        return self._get_files_for_parents(artist_ids, 'artist')
+
+    def _get_files_for_parents(self, parent_ids: Iterable[int], level: str) -> Dict[int, List[Dict]]:
+        """Expansion album/artiste -> fichiers pour un ensemble d'ids
+
+        Servie par l'instantané s'il contient toutes les pistes, sinon par une
+        seule requête (listes IN découpées en lots).
+        """
+        ids = sorted(set(parent_ids))
+        if not ids:
+            return {}
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.complete:
+            expand = snapshot.album_files if level == 'album' else snapshot.artist_files
+            return {parent_id: expand(parent_id) for parent_id in ids}
+
+        files_by_parent = {parent_id: [] for parent_id in ids}
+
+        if self.rating_index is not None:
+            for parent_id, track_title, file_path, album_title, artist_name in \
+                    self.rating_index.files_for_parents(ids, level):
+                files_by_parent[parent_id].append({
+                    'file_path': self.path_mapper.to_host(file_path),
+                    'track_title': track_title or 'Unknown',
+                    'album_title': album_title or 'Unknown Album',
+                    'artist_name': artist_name or 'Unknown Artist',
+                    'rating': 1.0  # Pour cohérence avec les autres
+                })
+            return files_by_parent
+
+        parent_column = 'parent_mi.id' if level == 'album' else 'parent_mi.parent_id'
+        order = 'mi."index"' if level == 'album' else 'parent_mi.title, mi."index"'
+
         try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                
-                query = """
+            cursor = self.plex_db.reader().cursor()
+
+            for start in range(0, len(ids), SQL_IN_CHUNK_SIZE):
+                chunk = ids[start:start + SQL_IN_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"""
                 SELECT 
+                    {parent_column} as parent_id,
                     mi.title as track_title,
                     mp.file as file_path,
                     parent_mi.title as album_title,
                     grandparent_mi.title as artist_name
                 FROM metadata_items mi
-                LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-                LEFT JOIN media_parts mp ON media.id = mp.media_item_id
-                LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
+                JOIN media_items media ON mi.id = media.metadata_item_id
+                JOIN media_parts mp ON media.id = mp.media_item_id
+                JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
                 LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
                 WHERE mi.metadata_type = 10  -- Tracks
-                AND parent_mi.id = ?
+                AND {parent_column} IN ({placeholders})
                 AND mp.file IS NOT NULL
-                ORDER BY mi.index
-                """
-                
-                cursor.execute(query, (album_id,))
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    track_title, file_path, album_title, artist_name = row
-                    files.append({
-                        'file_path': file_path,
+                ORDER BY {order}
+                """, chunk)
+
+                for parent_id, track_title, file_path, album_title, artist_name in cursor:
+                    files_by_parent[parent_id].append({
+                        'file_path': self.path_mapper.to_host(file_path),
                         'track_title': track_title or 'Unknown',
                         'album_title': album_title or 'Unknown Album',
                         'artist_name': artist_name or 'Unknown Artist',
                         'rating': 1.0  # Pour cohérence avec les autres
                     })
-                
-                return files
-                
+
         except Exception as e:
-            self.logger.error(f"Erreur lors de la récupération des fichiers de l'album {album_id}: {e}")
-            return []
+            self.logger.error(f"Erreur lors de la récupération des fichiers ({level}s {ids[:5]}...): {e}")
+
+        return files_by_parent
+
+    def get_album_files(self, album_id: int) -> List[Dict]:
+        """Récupère tous les fichiers d'un album"""
+        return self.get_files_for_albums([album_id])[album_id]
     
     def get_artist_files(self, artist_id: int) -> List[Dict]:
         """Récupère tous les fichiers d'un artiste"""
-        files = []
-        
-        try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
-                cursor = conn.cursor()
-                
-                query = """
-                SELECT 
-                    mi.title as track_title,
-                    mp.file as file_path,
-                    parent_mi.title as album_title,
-                    grandparent_mi.title as artist_name
-                FROM metadata_items mi
-                LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-                LEFT JOIN media_parts mp ON media.id = mp.media_item_id
-                LEFT JOIN metadata_items parent_mi ON mi.parent_id = parent_mi.id
-                LEFT JOIN metadata_items grandparent_mi ON parent_mi.parent_id = grandparent_mi.id
-                WHERE mi.metadata_type = 10  -- Tracks
-                AND grandparent_mi.id = ?
-                AND mp.file IS NOT NULL
-                ORDER BY parent_mi.title, mi.index
-                """
-                
-                cursor.execute(query, (artist_id,))
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    track_title, file_path, album_title, artist_name = row
-                    files.append({
-                        'file_path': file_path,
-                        'track_title': track_title or 'Unknown',
-                        'album_title': album_title or 'Unknown Album',
-                        'artist_name': artist_name or 'Unknown Artist',
-                        'rating': 1.0
-                    })
-                
-                return files
-                
-        except Exception as e:
-            self.logger.error(f"Erreur lors de la récupération des fichiers de l'artiste {artist_id}: {e}")
-            return []
+        return self.get_files_for_artists([artist_id])[artist_id]
     
-    def filter_files_by_rating(self, rated_files: List[Dict], target_rating: float) -> List[Dict]:
+    def get_files_with_rating(self, target_rating: float) -> List[Dict]:
+        """Fichiers avec target_rating étoiles, lus sur la partition de l'instantané"""
+        files = list(self.load_ratings_snapshot().iter_rated_tracks(target_rating))
+        self.logger.info(f"🎯 Trouvé {len(files)} fichiers avec {target_rating} étoile(s)")
+        return files
+
+    def get_albums_with_rating(self, target_rating: float) -> List[Dict]:
+        """Albums avec target_rating étoiles, lus sur la partition de l'instantané"""
+        albums = self.load_ratings_snapshot().rated_albums(target_rating)
+        self.logger.info(f"💿 Trouvé {len(albums)} albums avec {target_rating} étoile(s)")
+        return albums
+
+    def get_artists_with_rating(self, target_rating: float) -> List[Dict]:
+        """Artistes avec target_rating étoiles, lus sur la partition de l'instantané"""
+        artists = self.load_ratings_snapshot().rated_artists(target_rating)
+        self.logger.info(f"🎤 Trouvé {len(artists)} artistes avec {target_rating} étoile(s)")
+        return artists
+
+    def filter_files_by_rating(self, rated_files: Iterable[Dict], target_rating: float) -> List[Dict]:
         """Filtre les fichiers selon le rating cible"""
         filtered = [f for f in rated_files if f['rating'] == target_rating]
         self.logger.info(f"🎯 Trouvé {len(filtered)} fichiers avec {target_rating} étoile(s)")
@@ -356,10 +695,16 @@ class PlexRatingsSync:
         self.logger.info(f"🎤 Trouvé {len(filtered)} artistes avec {target_rating} étoile(s)")
         return filtered
     
+    def prefetch_files(self, files: Iterable[Dict]):
+        """Liste en une passe parallèle les répertoires des fichiers à traiter"""
+        start = time.perf_counter()
+        listed = self.file_catalog.scan(f['file_path'] for f in files)
+        if listed:
+            self.logger.debug(f"📂 {listed} répertoire(s) listé(s) en {time.perf_counter() - start:.2f} s")
+    
     def verify_file_exists(self, file_path: str) -> bool:
-        """Vérifie que le fichier existe sur le système"""
-        path = Path(file_path)
-        exists = path.exists()
+        """Vérifie que le fichier existe sur le système (carte des répertoires listés)"""
+        exists = self.file_catalog.exists(file_path)
         
         if not exists:
             self.logger.warning(f"❌ Fichier introuvable: {file_path}")
@@ -370,27 +715,39 @@ class PlexRatingsSync:
         
         return exists
     
-    def backup_file(self, file_path: Path, backup_dir: Path) -> bool:
-        """Sauvegarde un fichier avant suppression"""
+    def backup_file(self, file_path: Path, backup_dir: Path, move: bool = False) -> Optional[str]:
+        """Sauvegarde un fichier avant suppression
+        
+        Retourne la méthode utilisée ('rename', 'hardlink', 'reflink', 'copy'
+        ou 'dedup' si le magasin contient déjà ce contenu), None en cas
+        d'échec. Avec move=True, le fichier peut être déplacé dans la
+        sauvegarde ('rename'): il n'est alors plus à supprimer.
+        """
+        if self.backup_store is not None:
+            try:
+                method, digest = self.backup_store.put(file_path, move)
+                self.logger.info(f"💾 Sauvegardé ({method}): {file_path} -> blob {digest[:12]}")
+                return method
+            except Exception as e:
+                self.logger.error(f"Erreur sauvegarde {file_path}: {e}")
+                return None
+        
+        if self.backup_strategy is None or self.backup_strategy.backup_dir != backup_dir:
+            self.backup_strategy = BackupStrategy(backup_dir)
         try:
-            # Créer la structure de répertoire dans le backup
-            relative_path = file_path.relative_to(file_path.anchor)
-            backup_path = backup_dir / relative_path
-            backup_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            shutil.copy2(file_path, backup_path)
-            self.logger.info(f"💾 Sauvegardé: {file_path} -> {backup_path}")
-            return True
+            method, backup_path = self.backup_strategy.place(file_path, move)
+            self.logger.info(f"💾 Sauvegardé ({method}): {file_path} -> {backup_path}")
+            return method
             
         except Exception as e:
             self.logger.error(f"Erreur sauvegarde {file_path}: {e}")
-            return False
+            return None
     
     def delete_file_safely(self, file_info: Dict, dry_run: bool = True, backup_dir: Optional[Path] = None) -> bool:
         """Supprime un fichier de manière sécurisée"""
         file_path = Path(file_info['file_path'])
         
-        if not file_path.exists():
+        if not self.file_catalog.exists(str(file_path)):
             self.logger.warning(f"❌ Fichier déjà supprimé ou introuvable: {file_path}")
             return False
         
@@ -402,25 +759,25 @@ class PlexRatingsSync:
             return True
         
         try:
-            # Sauvegarde optionnelle
+            # Sauvegarde optionnelle (un déplacement en quarantaine vaut suppression)
+            backup_method = None
             if backup_dir:
-                if not self.backup_file(file_path, backup_dir):
+                backup_method = self.backup_file(file_path, backup_dir, move=True)
+                if backup_method is None:
                     self.logger.warning(f"⚠️ Sauvegarde échouée pour {file_path}, suppression annulée")
                     return False
             
             # Suppression définitive
-            file_path.unlink()
+            if backup_method != 'rename':
+                file_path.unlink()
+            self.file_catalog.forget(str(file_path))
             self.logger.info(f"🗑️ Supprimé: {file_path}")
             self.logger.info(f"    📝 {file_info['artist_name']} - {file_info['track_title']}")
             
-            self.deleted_files.append({
-                'file_path': str(file_path),
-                'artist': file_info['artist_name'],
-                'title': file_info['track_title'],
-                'album': file_info['album_title'],
-                'rating': file_info['rating'],
-                'deleted_at': datetime.now().isoformat()
-            })
+            record = self.deletion_record(file_info)
+            self.deleted_files.append(record)
+            if self.deletion_journal is not None:
+                self.deletion_journal.record_deleted(record)
             
             return True
             
@@ -429,211 +786,306 @@ class PlexRatingsSync:
             self.errors.append(f"Suppression échouée: {file_path} - {e}")
             return False
     
+    def identify_file(self, file_info: Dict) -> Dict:
+        """Identifie un fichier avec songrec et retourne le détail (sans état partagé)"""
+        file_path = Path(file_info['file_path'])
+        
+        detail = {
+            'file_path': str(file_path),
+            'file_name': file_path.name,
+            'status': 'unknown',
+            'identified': False,
+            'error': None,
+            'songrec_result': None
+        }
+        
+        if not self.file_catalog.exists(str(file_path)):
+            self.logger.warning(f"❌ Fichier introuvable: {file_path}")
+            detail['status'] = 'file_not_found'
+            detail['error'] = 'File not found'
+            return detail
+        
+        # Contenu déjà identifié (ou en échec récent): pas de nouveau sous-processus
+        fingerprint = None
+        if self.songrec_cache is not None:
+            fingerprint = content_fingerprint(str(file_path))
+            cached = self.songrec_cache.get(fingerprint) if fingerprint else None
+            if cached is not None:
+                self.logger.info(f"💾 Résultat songrec en cache ({cached['status']}): {file_path.name}")
+                detail.update(cached)
+                detail['cached'] = True
+                return detail
+        
+        detail = self.run_songrec(file_path, detail)
+        
+        if fingerprint:
+            self.songrec_cache.put(fingerprint, detail)
+        
+        return detail
+    
+    def run_songrec(self, file_path: Path, detail: Dict) -> Dict:
+        """Lance songrec sur un fichier et complète le détail"""
+        try:
+            self.logger.info(f"🎧 Identification avec songrec: {file_path.name}")
+            
+            # Utiliser songrec pour identifier le fichier
+            result = subprocess.run(
+                [self.config['songrec_bin'], 'audio-file-to-recognized-song', str(file_path)],
+                capture_output=True,
+                text=True,
+                timeout=self.config['songrec_timeout']
+            )
+            
+            if result.returncode == 0:
+                # Parser le résultat JSON
+                try:
+                    song_data = json.loads(result.stdout)
+                    if 'track' in song_data:
+                        track = song_data['track']
+                        title = track.get('title', 'Unknown')
+                        artist = track.get('subtitle', 'Unknown Artist')
+                        
+                        self.logger.info(f"✅ Identifié: {artist} - {title}")
+                        
+                        detail['status'] = 'identified'
+                        detail['identified'] = True
+                        detail['songrec_result'] = {
+                            'title': title,
+                            'artist': artist,
+                            'full_data': song_data
+                        }
+                        
+                        # Ici on pourrait ajouter une logique pour renommer ou marquer le fichier
+                        # Pour l'instant, on se contente de l'identifier
+                    else:
+                        self.logger.warning(f"⚠️ Pas de résultat pour: {file_path.name}")
+                        detail['status'] = 'no_result'
+                        detail['error'] = 'No songrec result'
+                        
+                except json.JSONDecodeError:
+                    self.logger.warning(f"⚠️ Erreur parsing JSON pour: {file_path.name}")
+                    detail['status'] = 'json_parse_error'
+                    detail['error'] = 'JSON parse error'
+                    
+            else:
+                self.logger.warning(f"❌ Échec songrec pour: {file_path.name} - {result.stderr.strip()}")
+                detail['status'] = 'songrec_error'
+                detail['error'] = result.stderr.strip()
+                
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"⏰ Timeout songrec pour: {file_path.name}")
+            detail['status'] = 'timeout'
+            detail['error'] = 'Songrec timeout'
+            
+        except Exception as e:
+            self.logger.error(f"❌ Erreur inattendue avec songrec: {e}")
+            detail['status'] = 'unexpected_error'
+            detail['error'] = str(e)
+        
+        return detail
+    
+    def queue_songrec_event(self, detail: Dict):
+        """Ajoute le résultat songrec d'un fichier à la notification groupée de l'étape"""
+        status = detail['status']
+        if status == 'identified':
+            kind = 'identified'
+            text = f"✅ {detail['file_name']} → {detail['songrec_result']['artist']} - {detail['songrec_result']['title']}"
+        elif status == 'no_result':
+            kind = 'not_identified'
+            text = f"⚠️ {detail['file_name']} - Non identifié"
+        elif status in ('json_parse_error', 'timeout', 'unexpected_error', 'songrec_error'):
+            kind = 'error'
+            error_type = 'songrec_command_failed' if status == 'songrec_error' else status
+            text = f"❌ {detail['file_name']} - Erreur ({error_type})"
+        else:
+            return
+        
+        self.notifier.add_event('songrec', kind, text)
+    
     def process_two_star_files(self, two_star_files: List[Dict]) -> Dict:
-        """Traite les fichiers 2 étoiles avec songrec pour identification"""
+        """Traite les fichiers 2 étoiles avec songrec pour identification
+        
+        Jusqu'à songrec_jobs identifications tournent en parallèle; au-delà de
+        songrec_deadline secondes, plus aucune nouvelle identification n'est lancée.
+        """
         if not two_star_files:
-            return {'processed': 0, 'identified': 0, 'errors': 0, 'file_details': []}
+            return {'processed': 0, 'identified': 0, 'errors': 0, 'cached': 0, 'deadline_skipped': 0, 'file_details': []}
         
         processed = 0
         identified = 0
         errors = 0
+        cached = 0
         file_details = []
         
-        self.logger.info(f"🎵 Traitement de {len(two_star_files)} fichiers 2⭐ avec songrec...")
+        if self.config['songrec_cache'] and self.songrec_cache is None:
+            try:
+                self.songrec_cache = SongrecCache(self.config['songrec_cache_db'],
+                                                  self.config['songrec_negative_ttl_days'])
+            except Exception as e:
+                self.logger.warning(f"⚠️ Cache songrec indisponible: {e}")
         
-        for file_info in two_star_files:
-            file_path = Path(file_info['file_path'])
+        jobs = max(1, self.config['songrec_jobs'])
+        deadline = None
+        if self.config['songrec_deadline']:
+            deadline = time.monotonic() + self.config['songrec_deadline']
+        
+        self.logger.info(f"🎵 Traitement de {len(two_star_files)} fichiers 2⭐ avec songrec ({jobs} en parallèle)...")
+        
+        # Les détails sont collectés au fil des résultats (ordre d'achèvement)
+        started = set()
+        # max_pending = jobs: aucune tâche en file d'attente ne démarre après l'échéance
+        for index, _file_info, detail in run_bounded(self.identify_file, two_star_files, jobs,
+                                                     max_pending=jobs, deadline=deadline):
+            started.add(index)
             processed += 1
-            
-            detail = {
+            if detail.get('cached'):
+                cached += 1
+            if detail['identified']:
+                identified += 1
+            elif detail['status'] != 'no_result':
+                errors += 1
+            file_details.append(detail)
+            self.queue_songrec_event(detail)
+        
+        # Fichiers non lancés avant l'échéance globale
+        deadline_skipped = 0
+        for index, file_info in enumerate(two_star_files):
+            if index in started:
+                continue
+            deadline_skipped += 1
+            file_path = Path(file_info['file_path'])
+            file_details.append({
                 'file_path': str(file_path),
                 'file_name': file_path.name,
-                'status': 'unknown',
+                'status': 'deadline_exceeded',
                 'identified': False,
-                'error': None,
+                'error': 'Songrec deadline exceeded',
                 'songrec_result': None
-            }
-            
-            if not file_path.exists():
-                self.logger.warning(f"❌ Fichier introuvable: {file_path}")
-                errors += 1
-                detail['status'] = 'file_not_found'
-                detail['error'] = 'File not found'
-                file_details.append(detail)
-                continue
-            
-            try:
-                self.logger.info(f"🎧 Identification avec songrec: {file_path.name}")
-                
-                # Utiliser songrec pour identifier le fichier
-                result = subprocess.run(
-                    ['songrec', 'audio-file-to-recognized-song', str(file_path)],
-                    capture_output=True,
-                    text=True,
-                    timeout=30  # Timeout de 30 secondes par fichier
-                )
-                
-                if result.returncode == 0:
-                    # Parser le résultat JSON
-                    try:
-                        song_data = json.loads(result.stdout)
-                        if 'track' in song_data:
-                            track = song_data['track']
-                            title = track.get('title', 'Unknown')
-                            artist = track.get('subtitle', 'Unknown Artist')
-                            
-                            self.logger.info(f"✅ Identifié: {artist} - {title}")
-                            identified += 1
-                            
-                            detail['status'] = 'identified'
-                            detail['identified'] = True
-                            detail['songrec_result'] = {
-                                'title': title,
-                                'artist': artist,
-                                'full_data': song_data
-                            }
-                            
-                            # Envoyer une notification individuelle pour ce fichier
-                            try:
-                                script_dir = Path(__file__).parent
-                                notifications_script = script_dir / 'plex_notifications.sh'
-                                
-                                if notifications_script.exists():
-                                    subprocess.run([
-                                        str(notifications_script), 
-                                        'songrec_file_identified',
-                                        file_path.name,
-                                        artist,
-                                        title
-                                    ], capture_output=True, text=True, timeout=5)
-                                    
-                                    self.logger.debug(f"🔔 Notification individuelle envoyée pour: {file_path.name}")
-                                else:
-                                    self.logger.debug(f"Script de notifications introuvable pour notification individuelle")
-                                    
-                            except Exception as e:
-                                self.logger.debug(f"Erreur lors de la notification individuelle pour {file_path.name}: {e}")
-                            
-                            # Ici on pourrait ajouter une logique pour renommer ou marquer le fichier
-                            # Pour l'instant, on se contente de l'identifier
-                        else:
-                            self.logger.warning(f"⚠️ Pas de résultat pour: {file_path.name}")
-                            detail['status'] = 'no_result'
-                            detail['error'] = 'No songrec result'
-                            
-                            # Notification pour fichier non identifié
-                            try:
-                                script_dir = Path(__file__).parent
-                                notifications_script = script_dir / 'plex_notifications.sh'
-                                
-                                if notifications_script.exists():
-                                    subprocess.run([
-                                        str(notifications_script), 
-                                        'songrec_file_not_identified',
-                                        file_path.name,
-                                        'no_result'
-                                    ], capture_output=True, text=True, timeout=5)
-                                    
-                            except Exception as e:
-                                self.logger.debug(f"Erreur lors de la notification d'échec pour {file_path.name}: {e}")
-                                
-                    except json.JSONDecodeError:
-                        self.logger.warning(f"⚠️ Erreur parsing JSON pour: {file_path.name}")
-                        errors += 1
-                        detail['status'] = 'json_parse_error'
-                        detail['error'] = 'JSON parse error'
-                        
-                        # Notification d'erreur
-                        try:
-                            script_dir = Path(__file__).parent
-                            notifications_script = script_dir / 'plex_notifications.sh'
-                            
-                            if notifications_script.exists():
-                                subprocess.run([
-                                    str(notifications_script), 
-                                    'songrec_file_error',
-                                    file_path.name,
-                                    'json_parse_error'
-                                ], capture_output=True, text=True, timeout=5)
-                                
-                        except Exception as e:
-                            self.logger.debug(f"Erreur lors de la notification d'erreur pour {file_path.name}: {e}")
-                            
-                else:
-                    self.logger.warning(f"❌ Échec songrec pour: {file_path.name} - {result.stderr.strip()}")
-                    errors += 1
-                    detail['status'] = 'songrec_error'
-                    detail['error'] = result.stderr.strip()
-                    
-                    # Notification d'erreur
-                    try:
-                        script_dir = Path(__file__).parent
-                        notifications_script = script_dir / 'plex_notifications.sh'
-                        
-                        if notifications_script.exists():
-                            subprocess.run([
-                                str(notifications_script), 
-                                'songrec_file_error',
-                                file_path.name,
-                                'songrec_command_failed'
-                            ], capture_output=True, text=True, timeout=5)
-                            
-                    except Exception as e:
-                        self.logger.debug(f"Erreur lors de la notification d'erreur pour {file_path.name}: {e}")
-                        
-            except subprocess.TimeoutExpired:
-                self.logger.warning(f"⏰ Timeout songrec pour: {file_path.name}")
-                errors += 1
-                detail['status'] = 'timeout'
-                detail['error'] = 'Songrec timeout'
-                
-                # Notification d'erreur
-                try:
-                    script_dir = Path(__file__).parent
-                    notifications_script = script_dir / 'plex_notifications.sh'
-                    
-                    if notifications_script.exists():
-                        subprocess.run([
-                            str(notifications_script), 
-                            'songrec_file_error',
-                            file_path.name,
-                            'timeout'
-                        ], capture_output=True, text=True, timeout=5)
-                        
-                except Exception as e:
-                    self.logger.debug(f"Erreur lors de la notification d'erreur pour {file_path.name}: {e}")
-                    
-            except Exception as e:
-                self.logger.error(f"❌ Erreur inattendue avec songrec: {e}")
-                errors += 1
-                detail['status'] = 'unexpected_error'
-                detail['error'] = str(e)
-                
-                # Notification d'erreur
-                try:
-                    script_dir = Path(__file__).parent
-                    notifications_script = script_dir / 'plex_notifications.sh'
-                    
-                    if notifications_script.exists():
-                        subprocess.run([
-                            str(notifications_script), 
-                            'songrec_file_error',
-                            file_path.name,
-                            'unexpected_error'
-                        ], capture_output=True, text=True, timeout=5)
-                        
-                except Exception as e:
-                    self.logger.debug(f"Erreur lors de la notification d'erreur pour {file_path.name}: {e}")
-            
-            file_details.append(detail)
+            })
+        if deadline_skipped:
+            self.logger.warning(f"⏰ Échéance songrec atteinte: {deadline_skipped} fichier(s) non traités")
+        if cached:
+            self.logger.info(f"💾 {cached} résultat(s) songrec servis depuis le cache")
+        
+        # Une seule notification pour tous les fichiers de l'étape
+        self.notifier.flush('songrec', 'songrec_batch', ('identified', 'not_identified', 'error'))
         
         return {
             'processed': processed,
             'identified': identified,
             'errors': errors,
+            'cached': cached,
+            'deadline_skipped': deadline_skipped,
             'file_details': file_details
         }
     
+    def deletion_record(self, file_info: Dict) -> Dict:
+        """Entrée du rapport (et du journal) pour un fichier supprimé"""
+        return {
+            'file_path': str(file_info['file_path']),
+            'artist': file_info['artist_name'],
+            'title': file_info['track_title'],
+            'album': file_info['album_title'],
+            'rating': file_info['rating'],
+            'deleted_at': datetime.now().isoformat()
+        }
+    
+    def setup_backup(self, backup_dir: Optional[str], use_store: bool) -> Optional[Path]:
+        """Prépare la sauvegarde (arborescence miroir ou magasin dédupliqué)"""
+        if not backup_dir:
+            return None
+        backup_path = Path(backup_dir)
+        backup_path.mkdir(parents=True, exist_ok=True)
+        if self.backup_store is not None:
+            self.backup_store.close()
+            self.backup_store = None
+        if use_store:
+            self.backup_store = ContentBackupStore(backup_path)
+            self.backup_strategy = self.backup_store.strategy
+            completed, cancelled = self.backup_store.recovered
+            if completed or cancelled:
+                self.logger.warning(f"♻️ Magasin de sauvegarde repris: {completed} blob(s) terminé(s), "
+                                    f"{cancelled} entrée(s) annulée(s)")
+        else:
+            self.backup_strategy = BackupStrategy(backup_path)
+        self.logger.info(f"💾 Répertoire de sauvegarde: {backup_path}")
+        return backup_path
+    
+    def delete_files(self, files: List[Dict], dry_run: bool, backup_dir: Optional[Path]) -> int:
+        """Sauvegarde et supprime une liste de fichiers planifiés; retourne le nombre supprimé
+        
+        Hors dry-run, jusqu'à backup_jobs fichiers sont traités simultanément:
+        les sauvegardes par copie d'un album entier ne s'enchaînent plus.
+        """
+        jobs = 1 if dry_run else max(1, self.config['backup_jobs'])
+        deleted = 0
+        for _index, _file_info, was_deleted in run_bounded(
+                lambda file_info: self.delete_file_safely(file_info, dry_run, backup_dir), files, jobs):
+            if was_deleted:
+                deleted += 1
+        return deleted
+    
+    def finish_deletions(self) -> int:
+        """Phase finale d'une purge journalisée: nettoyage Plex unique, rapport, fin du journal
+        
+        Si le nettoyage de la base échoue (Plex verrouille la base...), le
+        journal est conservé et la purge sera reprise à la prochaine exécution.
+        Retourne le nombre d'entrées Plex nettoyées.
+        """
+        journal = self.deletion_journal
+        journal.sync()
+        # Base déjà nettoyée avant l'interruption: le compte vient du journal
+        cleaned_plex_entries = journal.cleaned_entries
+        if self.deleted_files and not journal.db_cleaned:
+            self.logger.info("🗃️ Nettoyage de la base de données Plex...")
+            errors_before = len(self.errors)
+            cleaned_plex_entries = self.cleanup_plex_database(self.deleted_files)
+            if len(self.errors) > errors_before:
+                self.logger.warning(f"⚠️ Journal de suppression conservé pour reprise: {journal.path}")
+                journal.close()
+                return cleaned_plex_entries
+            journal.mark_db_cleaned(cleaned_plex_entries)
+        
+        self.cleaned_plex_entries = cleaned_plex_entries  # Stocker pour le rapport
+        self.save_deletion_report()
+        journal.finish()
+        return cleaned_plex_entries
+    
+    def replay_deletion_journal(self) -> Tuple[int, int]:
+        """Mène à terme une purge interrompue
+        
+        Retourne (fichiers supprimés, entrées Plex nettoyées).
+        Les fichiers planifiés encore présents sont supprimés (avec la même
+        sauvegarde), ceux déjà absents sont comptés comme supprimés.
+        """
+        journal = self.deletion_journal
+        header = journal.header
+        self.logger.warning(f"♻️ Purge interrompue ({header['started_at']}): reprise du journal {journal.path}")
+        backup_path = self.setup_backup(header.get('backup_dir'), header.get('backup_store', False))
+        journal.resume()
+        
+        remaining = [f for path, f in journal.planned.items() if path not in journal.deleted]
+        self.prefetch_files(remaining)
+        present = []
+        for file_info in remaining:
+            if self.file_catalog.exists(file_info['file_path']):
+                present.append(file_info)
+            else:
+                journal.record_deleted(self.deletion_record(file_info))
+        self.delete_files(present, False, backup_path)
+        
+        self.deleted_files = list(journal.deleted.values())
+        replayed = len(self.deleted_files)
+        cleaned_plex_entries = self.finish_deletions()
+        self.logger.info(f"♻️ Purge reprise: {replayed} fichier(s) supprimé(s), {len(present)} restant(s) traité(s), "
+                         f"{cleaned_plex_entries} entrée(s) Plex nettoyée(s)")
+        
+        # La purge du jour repart d'un état propre
+        self.deleted_files = []
+        self.cleaned_plex_entries = 0
+        return replayed, cleaned_plex_entries
+    
+    
     def sync_ratings(self, dry_run: bool = True, backup_dir: Optional[str] = None, delete_albums: bool = False, delete_artists: bool = False) -> Dict:
         """Synchronise les ratings Plex avec le système de fichiers
         
@@ -648,58 +1100,69 @@ class PlexRatingsSync:
         if not self.verify_plex_database():
             return {'success': False, 'error': 'Base de données Plex inaccessible'}
         
-        # Extraire les fichiers avec ratings
-        all_rated_files = self.get_rated_audio_files()
-        if not all_rated_files:
+        # Purge précédente interrompue: la terminer avant d'en planifier une nouvelle
+        replayed_files = replayed_plex_entries = 0
+        if not dry_run:
+            self.deletion_journal = DeletionJournal(self.config['deletion_journal'])
+            if self.deletion_journal.pending:
+                replayed_files, replayed_plex_entries = self.replay_deletion_journal()
+                if self.deletion_journal.pending:
+                    self.logger.warning("⚠️ Purge précédente non terminée: aucune nouvelle suppression cette fois")
+        elif DeletionJournal(self.config['deletion_journal']).pending:
+            self.logger.warning("♻️ Une purge interrompue sera reprise à la prochaine exécution réelle")
+        
+        # Compter les fichiers avec ratings (sans matérialiser la liste complète)
+        rated_count = sum(self.load_ratings_snapshot().track_rating_counts().values())
+        self.logger.info(f"📊 Trouvé {rated_count} fichiers avec ratings dans Plex")
+        if not rated_count and self.state_store is None:
             self.logger.warning("Aucun fichier avec rating trouvé dans Plex")
-            return {'success': True, 'deleted_files': 0, 'message': 'Aucun fichier à traiter'}
+            return {'success': True, 'deleted_files': 0, 'message': 'Aucun fichier à traiter',
+                    'replayed_files': replayed_files, 'cleaned_plex_entries': replayed_plex_entries}
+        
+        # Séparer les fichiers par rating: seuls les 1⭐ et 2⭐ sont construits
+        one_star_files = self.get_files_with_rating(1.0)
+        two_star_files = self.get_files_with_rating(2.0)
+        
+        # Mode incrémental: ne pas réidentifier les fichiers 2⭐ déjà traités et inchangés
+        if self.state_store is not None:
+            two_star_files = [
+                f for f in two_star_files
+                if not self.state_store.is_unchanged(STATE_CONSUMER, f['guid'], f['rating'], f['play_count'], f['file_path'])
+            ]
+            self.logger.info(f"🔁 {len(two_star_files)} fichiers 2⭐ nouveaux ou modifiés à identifier")
         
-        # Séparer les fichiers par rating
-        one_star_files = self.filter_files_by_rating(all_rated_files, 1.0)
-        two_star_files = self.filter_files_by_rating(all_rated_files, 2.0)
+        # Existence des fichiers 1⭐ et 2⭐: répertoires listés une fois, en parallèle
+        self.prefetch_files(one_star_files + two_star_files)
         
         # Traiter les fichiers 2 étoiles avec songrec (toujours, pas de suppression)
-        songrec_results = {'processed': 0, 'identified': 0, 'errors': 0, 'file_details': []}
+        songrec_results = {'processed': 0, 'identified': 0, 'errors': 0, 'cached': 0, 'deadline_skipped': 0, 'file_details': []}
         if two_star_files:
             songrec_results = self.process_two_star_files(two_star_files)
             
+            if self.state_store is not None and not dry_run:
+                self.record_two_star_state(two_star_files, songrec_results['file_details'])
+            
             # Envoyer une notification pour le traitement songrec
             if songrec_results['processed'] > 0:
-                try:
-                    script_dir = Path(__file__).parent
-                    notifications_script = script_dir / 'plex_notifications.sh'
-                    
-                    if notifications_script.exists():
-                        # Calculer le nombre d'albums traités (approximation)
-                        album_count = len(set(f['album_title'] for f in two_star_files))
-                        
-                        subprocess.run([
-                            str(notifications_script), 
-                            'songrec_completed',
-                            str(songrec_results['processed']),
-                            str(songrec_results['errors']),
-                            str(album_count),
-                            str(songrec_results['processed'])  # track_count ≈ processed pour l'instant
-                        ], capture_output=True, text=True, timeout=10)
-                        
-                        self.logger.info(f"🔔 Notification globale songrec envoyée: {songrec_results['processed']} traités, {songrec_results['errors']} erreurs")
-                    else:
-                        self.logger.warning(f"Script de notifications introuvable: {notifications_script}")
-                        
-                except Exception as e:
-                    self.logger.warning(f"Erreur lors de l'envoi de la notification globale songrec: {e}")
+                # Calculer le nombre d'albums traités (approximation)
+                album_count = len(set(f['album_title'] for f in two_star_files))
+                
+                self.notifier.send(
+                    'songrec_completed',
+                    songrec_results['processed'],
+                    songrec_results['errors'],
+                    album_count,
+                    songrec_results['processed']  # track_count ≈ processed pour l'instant
+                )
+                self.logger.info(f"🔔 Notification globale songrec en file: {songrec_results['processed']} traités, {songrec_results['errors']} erreurs")
         
         # Traiter les fichiers 1 étoile (suppression)
-        deleted_count = 0
-        backup_path = None
-        if backup_dir and not dry_run:
-            backup_path = Path(backup_dir)
-            backup_path.mkdir(parents=True, exist_ok=True)
-            self.logger.info(f"💾 Répertoire de sauvegarde: {backup_path}")
-        
-        if one_star_files:
-            # Supprimer les fichiers 1 étoile
-            for file_info in one_star_files:
+        # Phase 1 (plan): fichiers 1⭐, albums et artistes ciblés, vérifiés et dédupliqués
+        planned_files = []
+        planned_paths = set()
+        
+        def plan_deletions(files: List[Dict]):
+            for file_info in files:
                 self.processed_files += 1
                 
                 # Vérifier l'existence si configuré
@@ -707,92 +1170,90 @@ class PlexRatingsSync:
                     if not self.verify_file_exists(file_info['file_path']):
                         continue
                 
-                # Supprimer le fichier
-                if self.delete_file_safely(file_info, dry_run, backup_path):
-                    deleted_count += 1
+                if file_info['file_path'] not in planned_paths:
+                    planned_paths.add(file_info['file_path'])
+                    planned_files.append(file_info)
+        
+        plan_deletions(one_star_files)
         
         # Traiter les albums 1 étoile si demandé
         deleted_albums = 0
         if delete_albums:
-            all_rated_albums = self.get_rated_albums()
-            target_albums = self.filter_albums_by_rating(all_rated_albums, self.config['target_rating'])
+            target_albums = self.get_albums_with_rating(self.config['target_rating'])
             
             self.logger.info(f"💿 Trouvé {len(target_albums)} albums {self.config['target_rating']}⭐ à supprimer")
             
+            files_by_album = self.get_files_for_albums(a['album_id'] for a in target_albums)
+            self.prefetch_files(f for files in files_by_album.values() for f in files)
+            
             for album_info in target_albums:
-                album_files = self.get_album_files(album_info['album_id'])
+                album_files = files_by_album[album_info['album_id']]
                 self.logger.info(f"💿 Suppression de l'album '{album_info['album_title']}' - {len(album_files)} fichiers")
-                
-                for file_info in album_files:
-                    self.processed_files += 1
-                    
-                    if self.config['verify_file_exists']:
-                        if not self.verify_file_exists(file_info['file_path']):
-                            continue
-                    
-                    if self.delete_file_safely(file_info, dry_run, backup_path):
-                        deleted_count += 1
-                
+                plan_deletions(album_files)
                 deleted_albums += 1
         
         # Traiter les artistes 1 étoile si demandé
         deleted_artists = 0
         if delete_artists:
-            all_rated_artists = self.get_rated_artists()
-            target_artists = self.filter_artists_by_rating(all_rated_artists, self.config['target_rating'])
+            target_artists = self.get_artists_with_rating(self.config['target_rating'])
             
             self.logger.info(f"🎤 Trouvé {len(target_artists)} artistes {self.config['target_rating']}⭐ à supprimer")
             
+            files_by_artist = self.get_files_for_artists(a['artist_id'] for a in target_artists)
+            self.prefetch_files(f for files in files_by_artist.values() for f in files)
+            
             for artist_info in target_artists:
-                artist_files = self.get_artist_files(artist_info['artist_id'])
+                artist_files = files_by_artist[artist_info['artist_id']]
                 self.logger.info(f"🎤 Suppression de l'artiste '{artist_info['artist_name']}' - {len(artist_files)} fichiers")
-                
-                for file_info in artist_files:
-                    self.processed_files += 1
-                    
-                    if self.config['verify_file_exists']:
-                        if not self.verify_file_exists(file_info['file_path']):
-                            continue
-                    
-                    if self.delete_file_safely(file_info, dry_run, backup_path):
-                        deleted_count += 1
-                
+                plan_deletions(artist_files)
                 deleted_artists += 1
         
-        # Envoyer une notification pour les fichiers supprimés
-        if not dry_run and (deleted_count > 0 or deleted_albums > 0 or deleted_artists > 0):
+        # Phases 2 et 3: plan journalisé, sauvegarde + suppression par lots
+        deleted_count = 0
+        purge_started = False
+        if dry_run:
+            deleted_count = self.delete_files(planned_files, dry_run, None)
+        elif planned_files and not self.deletion_journal.pending:
+            purge_started = True
+            backup_path = self.setup_backup(backup_dir, self.config['backup_store'])
+            self.deletion_journal.begin(planned_files,
+                                        backup_dir=str(backup_path) if backup_path else None,
+                                        backup_store=self.config['backup_store'])
             try:
-                script_dir = Path(__file__).parent
-                notifications_script = script_dir / 'plex_notifications.sh'
-                
-                if notifications_script.exists():
-                    # Créer un résumé des suppressions
-                    details = f"{deleted_count} fichier(s) 1⭐ supprimé(s)"
-                    if deleted_albums > 0:
-                        details += f", {deleted_albums} album(s)"
-                    if deleted_artists > 0:
-                        details += f", {deleted_artists} artiste(s)"
-                    
-                    subprocess.run([
-                        str(notifications_script), 
-                        'files_deleted',
-                        str(deleted_count + deleted_albums + deleted_artists),  # Total des éléments supprimés
-                        details
-                    ], capture_output=True, text=True, timeout=10)
-                    
-                    self.logger.info(f"🔔 Notification suppression envoyée: {deleted_count + deleted_albums + deleted_artists} élément(s) supprimé(s)")
-                else:
-                    self.logger.warning(f"Script de notifications introuvable: {notifications_script}")
-                    
-            except Exception as e:
-                self.logger.warning(f"Erreur lors de l'envoi de la notification suppression: {e}")
+                deleted_count = self.delete_files(planned_files, dry_run, backup_path)
+            except BaseException:
+                # Interruption: suppressions déjà faites conservées au journal pour reprise
+                self.deletion_journal.close()
+                raise
         
-        # Nettoyer la base de données Plex
-        cleaned_plex_entries = 0
-        if not dry_run and deleted_count > 0:
-            self.logger.info("🗃️ Nettoyage de la base de données Plex...")
-            cleaned_plex_entries = self.cleanup_plex_database(self.deleted_files)
-            self.cleaned_plex_entries = cleaned_plex_entries  # Stocker pour le rapport
+        # Envoyer une notification pour les fichiers supprimés
+        if not dry_run and (deleted_count > 0 or deleted_albums > 0 or deleted_artists > 0):
+            # Créer un résumé des suppressions
+            details = f"{deleted_count} fichier(s) 1⭐ supprimé(s)"
+            if deleted_albums > 0:
+                details += f", {deleted_albums} album(s)"
+            if deleted_artists > 0:
+                details += f", {deleted_artists} artiste(s)"
+            
+            self.notifier.send(
+                'files_deleted',
+                deleted_count + deleted_albums + deleted_artists,  # Total des éléments supprimés
+                details
+            )
+            self.logger.info(f"🔔 Notification suppression en file: {deleted_count + deleted_albums + deleted_artists} élément(s) supprimé(s)")
+        
+        # Phase 4: nettoyage de la base Plex en une transaction, rapport, fin du journal
+        cleaned_plex_entries = replayed_plex_entries
+        if purge_started:
+            cleaned_plex_entries += self.finish_deletions()
+        
+        # Mode incrémental: avancer le filigrane seulement si tout s'est bien passé
+        # (instantané non chargé: lecture échouée, filigrane laissé en place)
+        if self.state_store is not None and not dry_run:
+            if not self.errors and self._snapshot is not None:
+                self.state_store.set_watermark(STATE_CONSUMER, self.two_star_watermark(
+                    two_star_files, songrec_results['file_details'], self._snapshot.max_changed_at))
+            self.state_store.commit()
         
         # Résumé
         result = {
@@ -804,8 +1265,11 @@ class PlexRatingsSync:
             'songrec_processed': songrec_results['processed'],
             'songrec_identified': songrec_results['identified'],
             'songrec_errors': songrec_results['errors'],
+            'songrec_deadline_skipped': songrec_results['deadline_skipped'],
+            'songrec_cached': songrec_results['cached'],
             'cleaned_dirs': 0,
             'cleaned_plex_entries': cleaned_plex_entries,
+            'replayed_files': replayed_files,
             'skipped_files': len(self.skipped_files),
             'errors': len(self.errors),
             'dry_run': dry_run
@@ -822,54 +1286,99 @@ class PlexRatingsSync:
         self.logger.info(f"    ✅ Fichiers 2⭐ identifiés: {songrec_results['identified']}")
         if songrec_results['errors'] > 0:
             self.logger.info(f"    ❌ Erreurs songrec: {songrec_results['errors']}")
+        if songrec_results['deadline_skipped'] > 0:
+            self.logger.info(f"    ⏰ Fichiers 2⭐ reportés (échéance): {songrec_results['deadline_skipped']}")
         if cleaned_plex_entries > 0:
             self.logger.info(f"    🗃️ Entrées Plex nettoyées: {cleaned_plex_entries}")
+        if replayed_files > 0:
+            self.logger.info(f"    ♻️ Fichiers d'une purge interrompue traités: {replayed_files}")
+        if self.backup_strategy is not None:
+            methods = ', '.join(f"{method}: {count}" for method, count in self.backup_strategy.counts.items() if count)
+            if methods:
+                self.logger.info(f"    💾 Sauvegardes par méthode: {methods}")
         self.logger.info(f"    ⏭️ Fichiers ignorés: {len(self.skipped_files)}")
         self.logger.info(f"    ❌ Erreurs: {len(self.errors)}")
         
+        # Laisser partir les notifications en file avant de rendre la main
+        self.notifier.close()
+        self.plex_db.close()
+        if self.backup_store is not None:
+            self.backup_store.close()
+            self.backup_store = None
+        if self.rating_index is not None:
+            self.rating_index.close()
+            self.rating_index = None
+        
         return result
     
-    def show_rating_statistics(self):
-        """Affiche les statistiques des ratings dans Plex"""
+    def record_two_star_state(self, two_star_files: List[Dict], file_details: List[Dict]):
+        """Mémorise les fichiers 2⭐ dont l'identification a abouti (identifié ou sans résultat)"""
+        files_by_path = {f['file_path']: f for f in two_star_files}
+        for detail in file_details:
+            if detail['status'] not in ('identified', 'no_result'):
+                continue
+            file_info = files_by_path.get(detail['file_path'])
+            if file_info is not None:
+                self.state_store.record_track(STATE_CONSUMER, file_info['guid'], file_info['rating'],
+                                              file_info['play_count'], file_info['file_path'])
+    
+    def two_star_watermark(self, two_star_files: List[Dict], file_details: List[Dict],
+                           max_changed_at: int) -> int:
+        """Filigrane à enregistrer: plafonné au plus ancien fichier 2⭐ non abouti
+
+        Fichiers introuvables, erreurs et timeouts songrec, fichiers reportés
+        par l'échéance: le filigrane étant inclusif (>=), ils seront relus à
+        la prochaine exécution incrémentale.
+        """
+        files_by_path = {f['file_path']: f for f in two_star_files}
+        retry = [files_by_path[detail['file_path']]['changed_at'] for detail in file_details
+                 if detail['status'] not in ('identified', 'no_result') and detail['file_path'] in files_by_path]
+        if not retry:
+            return max_changed_at
+        self.logger.info(f"🔁 Filigrane retenu: {len(retry)} fichier(s) 2⭐ à retraiter")
+        return min(max_changed_at, min(retry))
+    
+    def show_rating_statistics(self, breakdown: Optional[str] = None):
+        """Affiche les statistiques des ratings dans Plex
+
+        Histogrammes calculés par des agrégats SQL (GROUP BY rating): seuls les
+        comptes sont lus. breakdown ('album' ou 'artist') ajoute la ventilation
+        des pistes par album ou par artiste.
+        """
         self.logger.info("📊 Analyse des ratings dans Plex...")
+        start = time.perf_counter()
         
-        # Statistiques des pistes
-        rated_files = self.get_rated_audio_files()
-        rating_counts = {}
-        if rated_files:
-            # Compter par rating pour les pistes
-            for file_info in rated_files:
-                rating = file_info['rating']
-                rating_counts[rating] = rating_counts.get(rating, 0) + 1
-        
-        # Statistiques des albums
-        rated_albums = self.get_rated_albums()
-        album_rating_counts = {}
-        if rated_albums:
-            for album_info in rated_albums:
-                rating = album_info['rating']
-                album_rating_counts[rating] = album_rating_counts.get(rating, 0) + 1
-        
-        # Statistiques des artistes
-        rated_artists = self.get_rated_artists()
-        artist_rating_counts = {}
-        if rated_artists:
-            for artist_info in rated_artists:
-                rating = artist_info['rating']
-                artist_rating_counts[rating] = artist_rating_counts.get(rating, 0) + 1
+        try:
+            stats = collect_rating_stats(self.plex_db.reader().cursor(), breakdown)
+        except Exception as e:
+            self.logger.error(f"Erreur lors du calcul des statistiques Plex: {e}")
+            return
+        
+        self.logger.debug(f"⏱️ Statistiques calculées en {(time.perf_counter() - start) * 1000:.1f} ms")
+        self.print_rating_statistics(stats, breakdown)
+    
+    def print_rating_statistics(self, stats: Dict, breakdown: Optional[str] = None):
+        """Affiche les histogrammes pistes/albums/artistes (et la ventilation éventuelle)"""
+        rating_counts = stats['tracks']
+        album_rating_counts = stats['albums']
+        artist_rating_counts = stats['artists']
+        track_count = sum(rating_counts.values())
+        album_count = sum(album_rating_counts.values())
+        artist_count = sum(artist_rating_counts.values())
+        self.logger.info(f"📊 Trouvé {track_count} fichiers avec ratings dans Plex")
         
         print("\n📊 STATISTIQUES DES RATINGS:")
         print("=" * 50)
         
         # Afficher les pistes
-        if rated_files:
+        if track_count:
             print("🎵 PISTES:")
             for rating in sorted(rating_counts.keys()):
                 stars = "⭐" * int(rating)
                 print(f"  {stars} ({rating}) : {rating_counts[rating]} fichiers")
         
         # Afficher les albums
-        if rated_albums:
+        if album_count:
             print("\n💿 ALBUMS:")
             for rating in sorted(album_rating_counts.keys()):
                 stars = "⭐" * int(rating)
@@ -878,7 +1387,7 @@ class PlexRatingsSync:
             print("\n💿 ALBUMS: Aucun album avec rating")
         
         # Afficher les artistes
-        if rated_artists:
+        if artist_count:
             print("\n🎤 ARTISTES:")
             for rating in sorted(artist_rating_counts.keys()):
                 stars = "⭐" * int(rating)
@@ -886,8 +1395,95 @@ class PlexRatingsSync:
         else:
             print("\n🎤 ARTISTES: Aucun artiste avec rating")
         
-        total_items = len(rated_files) + len(rated_albums) + len(rated_artists)
-        print(f"\nTotal: {total_items} éléments avec ratings ({len(rated_files)} pistes, {len(rated_albums)} albums, {len(rated_artists)} artistes)")
+        total_items = track_count + album_count + artist_count
+        print(f"\nTotal: {total_items} éléments avec ratings ({track_count} pistes, {album_count} albums, {artist_count} artistes)")
+        
+        if breakdown is not None:
+            label = 'ALBUM' if breakdown == 'album' else 'ARTISTE'
+            print(f"\n📂 PISTES PAR {label}:")
+            for title in sorted(stats['breakdown'], key=str.lower):
+                counts = stats['breakdown'][title]
+                details = ', '.join(f"{rating}⭐ {counts[rating]}" for rating in sorted(counts))
+                print(f"  {title} : {details}")
+    
+    def build_plan(self) -> Dict:
+        """Classification complète des ratings en un seul document
+
+        Une seule lecture de l'instantané: fichiers 1⭐ (suppression), 2⭐
+        (songrec) et 3-5⭐ (synchronisation des tags), albums et artistes 1⭐/2⭐
+        avec leurs fichiers, histogrammes et comptes prêts pour les scripts shell.
+        """
+        snapshot = self.load_ratings_snapshot()
+
+        files_1_star = list(snapshot.iter_rated_tracks(1.0))
+        files_2_star = list(snapshot.iter_rated_tracks(2.0))
+        files_sync_rating = [file_info for rating in (3.0, 4.0, 5.0)
+                             for file_info in snapshot.iter_rated_tracks(rating)]
+
+        albums = {}
+        artists = {}
+        for rating in (1.0, 2.0):
+            key = f"{int(rating)}_star"
+            rated_albums = snapshot.rated_albums(rating)
+            files_by_album = self.get_files_for_albums(a['album_id'] for a in rated_albums)
+            albums[key] = [{**album, 'files': files_by_album[album['album_id']]} for album in rated_albums]
+            rated_artists = snapshot.rated_artists(rating)
+            files_by_artist = self.get_files_for_artists(a['artist_id'] for a in rated_artists)
+            artists[key] = [{**artist, 'files': files_by_artist[artist['artist_id']]} for artist in rated_artists]
+
+        def expanded_paths(key: str) -> set:
+            return {f['file_path'] for entry in albums[key] + artists[key] for f in entry['files']}
+
+        def distinct_total(tracks: List[Dict], key: str) -> int:
+            return len({f['file_path'] for f in tracks} | expanded_paths(key))
+
+        counts = {
+            'files_1_star_total': distinct_total(files_1_star, '1_star'),
+            'files_2_star_total': distinct_total(files_2_star, '2_star'),
+            'files_sync_rating_total': len(files_sync_rating),
+            'files_from_tracks_1_star': len(files_1_star),
+            'files_from_tracks_2_star': len(files_2_star),
+            'albums_1_star': len(albums['1_star']),
+            'albums_2_star': len(albums['2_star']),
+            'files_from_albums_1_star': sum(len(a['files']) for a in albums['1_star']),
+            'files_from_albums_2_star': sum(len(a['files']) for a in albums['2_star']),
+            'artists_1_star': len(artists['1_star']),
+            'artists_2_star': len(artists['2_star']),
+            'files_from_artists_1_star': sum(len(a['files']) for a in artists['1_star']),
+            'files_from_artists_2_star': sum(len(a['files']) for a in artists['2_star']),
+        }
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'plex_db': str(self.plex_db_path),
+            'counts': counts,
+            # Clés JSON: ratings en texte ("1.0")
+            'statistics': {level: {str(rating): count for rating, count in sorted(histogram.items())}
+                           for level, histogram in snapshot.rating_statistics().items()},
+            'files_1_star': files_1_star,
+            'files_2_star': files_2_star,
+            'files_sync_rating': files_sync_rating,
+            'albums': albums,
+            'artists': artists,
+        }
+
+    def emit_plan(self, output_file: str) -> Dict:
+        """Écrit le plan (build_plan) en JSON et affiche les statistiques; retourne les comptes"""
+        plan = self.build_plan()
+        self.print_rating_statistics(self.load_ratings_snapshot().rating_statistics())
+
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Écriture atomique: le workflow ne lit jamais un plan à moitié écrit
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+
+        self.logger.info(f"🗺️ Plan écrit: {output_path} ({plan['counts']['files_1_star_total']} fichiers 1⭐, "
+                         f"{plan['counts']['files_2_star_total']} fichiers 2⭐, "
+                         f"{plan['counts']['files_sync_rating_total']} fichiers 3-5⭐)")
+        return plan['counts']
     
     def save_deletion_report(self):
         """Sauvegarde un rapport des suppressions"""
@@ -910,63 +1506,89 @@ class PlexRatingsSync:
         self.logger.info(f"📋 Rapport sauvegardé: {report_path}")
     
     def cleanup_plex_database(self, deleted_files: List[Dict]) -> int:
-        """Nettoie la base de données Plex des fichiers supprimés"""
+        """Nettoie la base de données Plex des fichiers supprimés
+        
+        Traitement ensembliste en une seule transaction: les chemins supprimés
+        sont chargés dans une table temporaire, les pistes devenues orphelines
+        sont trouvées par jointure puis supprimées en quelques requêtes.
+        """
         if not deleted_files:
             return 0
         
-        cleaned_entries = 0
-        
         try:
-            with sqlite3.connect(str(self.plex_db_path)) as conn:
+            # Seule écriture de l'exécution: connexion dédiée, fermée aussitôt
+            with self.plex_db.writer() as conn:
                 cursor = conn.cursor()
-                
-                for file_info in deleted_files:
-                    file_path = file_info['file_path']
+                # Verrou d'écriture pris d'emblée, relâché au COMMIT
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor.execute("CREATE TEMP TABLE deleted_paths (file TEXT PRIMARY KEY)")
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO deleted_paths (file) VALUES (?)",
+                        # Chemins tels que Plex les a enregistrés
+                        ((self.path_mapper.to_plex(file_info['file_path']),) for file_info in deleted_files)
+                    )
                     
-                    # Supprimer l'entrée media_parts (fichier physique)
+                    # Pistes concernées, relevées avant la suppression des media_parts
                     cursor.execute("""
-                        DELETE FROM media_parts 
-                        WHERE file = ?
-                    """, (file_path,))
+                        CREATE TEMP TABLE affected_items AS
+                        SELECT DISTINCT media.metadata_item_id AS id
+                        FROM media_parts mp
+                        JOIN deleted_paths dp ON dp.file = mp.file
+                        JOIN media_items media ON media.id = mp.media_item_id
+                    """)
+                    
+                    # Supprimer les entrées media_parts (fichiers physiques)
+                    cursor.execute("DELETE FROM media_parts WHERE file IN (SELECT file FROM deleted_paths)")
+                    parts_deleted = cursor.rowcount
                     
-                    # Si media_parts supprimé, vérifier si media_item est orphelin
-                    # et supprimer metadata_item si nécessaire
+                    # Pistes qui n'ont plus aucun fichier
                     cursor.execute("""
-                        SELECT mi.id, mi.title
+                        CREATE TEMP TABLE orphan_items AS
+                        SELECT mi.id, mi.guid, mi.title
                         FROM metadata_items mi
-                        LEFT JOIN media_items media ON mi.id = media.metadata_item_id
-                        LEFT JOIN media_parts mp ON media.id = mp.media_item_id
+                        JOIN affected_items ai ON ai.id = mi.id
                         WHERE mi.metadata_type = 10
-                        AND mp.file IS NULL
-                        AND mi.id = (
-                            SELECT mi2.id FROM metadata_items mi2
-                            JOIN media_items media2 ON mi2.id = media2.metadata_item_id
-                            JOIN media_parts mp2 ON media2.id = mp2.media_item_id
-                            WHERE mp2.file = ?
+                        AND NOT EXISTS (
+                            SELECT 1 FROM media_items media
+                            JOIN media_parts mp ON mp.media_item_id = media.id
+                            WHERE media.metadata_item_id = mi.id
                         )
-                    """, (file_path,))
+                    """)
                     
-                    orphaned_items = cursor.fetchall()
+                    # Supprimer settings utilisateur, media_items puis metadata_items; les
+                    # settings d'un guid encore porté par un élément conservé restent en place
+                    cursor.execute("""
+                        DELETE FROM metadata_item_settings
+                        WHERE guid IN (SELECT guid FROM orphan_items WHERE guid IS NOT NULL)
+                        AND guid NOT IN (
+                            SELECT guid FROM metadata_items
+                            WHERE id NOT IN (SELECT id FROM orphan_items)
+                            AND guid IS NOT NULL
+                        )
+                    """)
+                    settings_deleted = cursor.rowcount
+                    cursor.execute("DELETE FROM media_items WHERE metadata_item_id IN (SELECT id FROM orphan_items)")
+                    media_deleted = cursor.rowcount
+                    cursor.execute("DELETE FROM metadata_items WHERE id IN (SELECT id FROM orphan_items)")
+                    cleaned_entries = cursor.rowcount
                     
-                    for item_id, title in orphaned_items:
-                        # Supprimer les settings utilisateur
-                        cursor.execute("DELETE FROM metadata_item_settings WHERE guid IN (SELECT guid FROM metadata_items WHERE id = ?)", (item_id,))
-                        
-                        # Supprimer media_items
-                        cursor.execute("DELETE FROM media_items WHERE metadata_item_id = ?", (item_id,))
-                        
-                        # Supprimer metadata_item
-                        cursor.execute("DELETE FROM metadata_items WHERE id = ?", (item_id,))
-                        
-                        cleaned_entries += 1
-                        self.logger.info(f"🗃️ Entrée Plex nettoyée: {title}")
-                
-                conn.commit()
-                
+                    for (title,) in cursor.execute("SELECT title FROM orphan_items"):
+                        self.logger.debug(f"🗃️ Entrée Plex nettoyée: {title}")
+                    
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            
         except Exception as e:
             self.logger.error(f"Erreur lors du nettoyage de la base Plex: {e}")
+            self.errors.append(f"Nettoyage Plex échoué: {e}")
             return 0
         
+        self.logger.info(f"🗃️ Base Plex nettoyée: {parts_deleted} media_parts, {media_deleted} media_items, "
+                         f"{cleaned_entries} metadata_items, {settings_deleted} metadata_item_settings supprimés")
+        
         return cleaned_entries
 
     def cleanup_old_logs(self, days_to_keep: int) -> Dict:
@@ -1114,6 +1736,15 @@ Exemples:
 
     # Voir les statistiques des ratings
     python3 plex_ratings_sync.py --auto-find-db --stats
+
+    # Statistiques ventilées par artiste
+    python3 plex_ratings_sync.py --auto-find-db --stats --stats-by artist
+
+    # Classification complète en JSON pour les scripts (une seule lecture de la base)
+    python3 plex_ratings_sync.py --auto-find-db --emit-plan /tmp/ratings_plan.json
+
+    # Exécution quotidienne incrémentale (seulement les ratings modifiés)
+    python3 plex_ratings_sync.py --auto-find-db --delete --incremental
         """
     )
     
@@ -1142,12 +1773,53 @@ Exemples:
         help='Répertoire de sauvegarde avant suppression'
     )
     
+    parser.add_argument(
+        '--backup-store',
+        action='store_true',
+        help='Avec --backup: magasin dédupliqué par contenu (blobs SHA-256 + index des chemins) au lieu d\'une arborescence miroir'
+    )
+    
+    parser.add_argument(
+        '--restore',
+        action='append',
+        default=[],
+        metavar='CHEMIN',
+        help='Restaure un fichier supprimé à son chemin d\'origine depuis le magasin --backup (répétable) et quitte'
+    )
+    
+    parser.add_argument(
+        '--prune-backup-store',
+        type=float,
+        metavar='JOURS',
+        help='Oublie les sauvegardes du magasin --backup plus anciennes que JOURS, supprime les blobs orphelins et quitte'
+    )
+    
+    parser.add_argument(
+        '--deletion-journal',
+        type=str,
+        metavar='FICHIER',
+        help='Journal des suppressions en cours, rejoué après une interruption (défaut: ~/.cache/plex_ratings_sync/deletion_journal.jsonl)'
+    )
+    
     parser.add_argument(
         '--stats', '--statistics',
         action='store_true',
         help='Affiche les statistiques des ratings et quitte'
     )
     
+    parser.add_argument(
+        '--emit-plan',
+        type=str,
+        metavar='FILE',
+        help='Écrit en JSON la classification complète (1⭐, 2⭐, 3-5⭐, albums/artistes, comptes) et quitte'
+    )
+    
+    parser.add_argument(
+        '--stats-by',
+        choices=['album', 'artist'],
+        help='Avec --stats: ventile aussi les pistes ratées par album ou par artiste'
+    )
+    
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
@@ -1172,6 +1844,118 @@ Exemples:
         help='Supprime également les artistes avec le rating cible'
     )
     
+    parser.add_argument(
+        '--songrec-jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Nombre d\'identifications songrec simultanées (défaut: 1)'
+    )
+    
+    parser.add_argument(
+        '--songrec-timeout',
+        type=int,
+        default=30,
+        metavar='SECONDS',
+        help='Timeout songrec par fichier (défaut: 30 s)'
+    )
+    
+    parser.add_argument(
+        '--songrec-deadline',
+        type=int,
+        metavar='SECONDS',
+        help='Durée maximale de l\'étape songrec; les fichiers restants sont reportés'
+    )
+    
+    parser.add_argument(
+        '--songrec-cache',
+        type=str,
+        metavar='PATH',
+        help='Cache des identifications songrec (défaut: ~/.cache/plex_ratings_sync/songrec_cache.db)'
+    )
+    
+    parser.add_argument(
+        '--no-songrec-cache',
+        action='store_true',
+        help='Désactive le cache songrec (réidentifie tous les fichiers 2⭐)'
+    )
+    
+    parser.add_argument(
+        '--songrec-negative-ttl',
+        type=float,
+        default=7,
+        metavar='DAYS',
+        help='Durée de vie en cache des échecs d\'identification (défaut: 7 jours)'
+    )
+    
+    parser.add_argument(
+        '--path-map',
+        type=parse_path_mapping,
+        action='append',
+        default=[],
+        metavar='PLEX=HÔTE',
+        help='Réécrit le préfixe de chemin Plex en préfixe local (répétable, le plus long l\'emporte)'
+    )
+    
+    parser.add_argument(
+        '--scan-jobs',
+        type=int,
+        default=DEFAULT_SCAN_JOBS,
+        metavar='N',
+        help=f'Répertoires listés en parallèle pour vérifier l\'existence des fichiers (défaut: {DEFAULT_SCAN_JOBS})'
+    )
+    
+    parser.add_argument(
+        '--backup-jobs',
+        type=int,
+        default=DEFAULT_BACKUP_JOBS,
+        metavar='N',
+        help=f'Fichiers sauvegardés/supprimés simultanément lors des purges (défaut: {DEFAULT_BACKUP_JOBS})'
+    )
+    
+    parser.add_argument(
+        '--snapshot-db',
+        action='store_true',
+        help='Lit une copie cohérente de la base Plex (backup en ligne vers /dev/shm) au lieu de la base vivante'
+    )
+    
+    parser.add_argument(
+        '--snapshot-dir',
+        type=str,
+        metavar='DIR',
+        help='Répertoire de la copie de la base (défaut: /dev/shm si disponible)'
+    )
+    
+    parser.add_argument(
+        '--rating-index',
+        type=str,
+        nargs='?',
+        const='',
+        metavar='PATH',
+        help='Lit les ratings via un index local rafraîchi depuis Plex (défaut: ~/.cache/plex_ratings_sync/rating_index.db)'
+    )
+    
+    parser.add_argument(
+        '--benchmark-db',
+        type=int,
+        nargs='?',
+        const=3,
+        metavar='N',
+        help='Compare la lecture directe et la lecture via copie (N passes, défaut: 3) puis quitte'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Ne traite que les ratings modifiés depuis la dernière exécution réelle'
+    )
+    
+    parser.add_argument(
+        '--state-db',
+        type=str,
+        help='Base d\'état locale pour le mode incrémental (défaut: ~/.cache/plex_ratings_sync/state.db)'
+    )
+    
     parser.add_argument(
         '--cleanup-logs',
         type=int,
@@ -1181,10 +1965,44 @@ Exemples:
     
     return parser.parse_args()
 
+def manage_backup_store(args) -> int:
+    """Restaurations et purge du magasin de sauvegarde; retourne le code de sortie"""
+    store = ContentBackupStore(Path(args.backup))
+    failures = 0
+    try:
+        for original_path in args.restore:
+            try:
+                restored = store.restore(original_path)
+                print(f"♻️ Restauré: {restored}")
+            except (FileNotFoundError, FileExistsError) as e:
+                print(f"❌ {e}")
+                failures += 1
+        
+        if args.prune_backup_store is not None:
+            entries, blobs = store.prune(args.prune_backup_store)
+            print(f"🧹 Magasin de sauvegarde: {entries} sauvegarde(s) oubliée(s), {blobs} blob(s) supprimé(s)")
+    finally:
+        store.close()
+    return 1 if failures else 0
+
 def main():
     """Fonction principale"""
     args = parse_arguments()
     
+    # Opérations sur le magasin de sauvegarde: pas besoin de la base Plex
+    if args.restore or args.prune_backup_store is not None:
+        if not args.backup:
+            print("❌ --restore et --prune-backup-store nécessitent --backup (racine du magasin)")
+            sys.exit(1)
+        sys.exit(manage_backup_store(args))
+    
+    # Correspondances de chemins: refusées d'emblée si elles ne sont pas réversibles
+    try:
+        PathMapper(args.path_map)
+    except ValueError as e:
+        print(f"❌ --path-map: {e}")
+        sys.exit(1)
+    
     # Déterminer le chemin de la base Plex
     plex_db_path = args.plex_db
     
@@ -1203,16 +2021,49 @@ def main():
         'target_rating': args.rating,
         'backup_dir': args.backup,
         'log_level': 'DEBUG' if args.verbose else 'INFO',
-        'dry_run': not args.delete
+        'dry_run': not args.delete,
+        'songrec_jobs': args.songrec_jobs,
+        'songrec_timeout': args.songrec_timeout,
+        'songrec_deadline': args.songrec_deadline,
+        'songrec_cache': not args.no_songrec_cache,
+        'songrec_cache_db': args.songrec_cache,
+        'songrec_negative_ttl_days': args.songrec_negative_ttl,
+        'snapshot_db': args.snapshot_db,
+        'snapshot_dir': args.snapshot_dir,
+        'rating_index': args.rating_index is not None,
+        'rating_index_db': args.rating_index or None,
+        'scan_jobs': args.scan_jobs,
+        'backup_jobs': args.backup_jobs,
+        'backup_store': args.backup_store,
+        'deletion_journal': args.deletion_journal,
+        'path_mappings': args.path_map
     }
     
     # Initialiser le synchroniseur
+    syncer = None
     try:
         syncer = PlexRatingsSync(plex_db_path, config)
         
+        # Mode comparaison lecture directe / copie
+        if args.benchmark_db:
+            timings = syncer.benchmark_read_modes(args.benchmark_db)
+            print(f"⏱️ Lecture des ratings ({args.benchmark_db} passes, médianes):")
+            print(f"    🗃️ Base vivante: {timings['direct']:.3f} s")
+            print(f"    📸 Copie: {timings['snapshot_total']:.3f} s "
+                  f"(backup {timings['backup']:.3f} s + lecture {timings['snapshot_read']:.3f} s)")
+            print(f"    ✅ Mode le plus rapide: {'--snapshot-db' if timings['recommended'] == 'snapshot' else 'lecture directe'}")
+            return
+        
+        # Mode plan: une seule lecture pour tout le workflow quotidien
+        if args.emit_plan:
+            if not syncer.verify_plex_database():
+                sys.exit(1)
+            syncer.emit_plan(args.emit_plan)
+            return
+        
         # Mode statistiques
         if args.stats:
-            syncer.show_rating_statistics()
+            syncer.show_rating_statistics(args.stats_by)
             return
         
         # Mode nettoyage des logs
@@ -1227,6 +2078,9 @@ def main():
             print(f"    🗑️ Total supprimé: {cleaned_logs['total']}")
             return
         
+        if args.incremental:
+            syncer.enable_incremental(args.state_db)
+        
         # Avertissements de sécurité
         if args.delete:
             print(f"⚠️  ATTENTION: Mode suppression réelle activé!")
@@ -1255,10 +2109,6 @@ def main():
             delete_artists=args.delete_artists
         )
         
-        # Sauvegarder le rapport si des suppressions ont eu lieu
-        if args.delete and syncer.deleted_files:
-            syncer.save_deletion_report()
-        
         if not result['success']:
             print(f"❌ Erreur: {result.get('error', 'Erreur inconnue')}")
             sys.exit(1)
@@ -1269,6 +2119,10 @@ def main():
     except Exception as e:
         print(f"❌ Erreur inattendue: {e}")
         sys.exit(1)
+    finally:
+        # Supprime aussi la copie de la base en mode --snapshot-db
+        if syncer is not None:
+            syncer.plex_db.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Index local des ratings Plex (base SQLite annexe)
+
+Le schéma Plex ne peut pas recevoir nos index: on tient une table dénormalisée
+(guid, type, parent, grand-parent, rating, lectures, fichier, dernier
+changement) avec ses propres index, rafraîchie de façon incrémentale depuis
+la base Plex attachée en lecture seule. Filtrage par rating et expansion
+album/artiste deviennent des recherches indexées au lieu de parcours complets.
+"""
+
+import sqlite3
+from pathlib import Path
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from plex_db import settings_join
+from sync_state import plex_change_expression
+
+DEFAULT_RATING_INDEX_DB = Path.home() / '.cache' / 'plex_ratings_sync' / 'rating_index.db'
+
+# Longueur maximale des listes IN (limite des paramètres SQLite)
+SQL_IN_CHUNK_SIZE = 500
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER NOT NULL,            -- metadata_items.id
+    part_id INTEGER NOT NULL,       -- media_parts.id (0 pour albums/artistes)
+    guid TEXT,
+    metadata_type INTEGER NOT NULL,
+    parent_id INTEGER,
+    grandparent_id INTEGER,
+    title TEXT,
+    "index" INTEGER,
+    duration INTEGER,
+    year INTEGER,
+    rating REAL,
+    view_count INTEGER,
+    file TEXT,
+    updated_at INTEGER,             -- dernier changement Plex (métadonnées ou settings)
+    PRIMARY KEY (id, part_id)
+);
+CREATE INDEX IF NOT EXISTS items_rated ON items (metadata_type, rating) WHERE rating IS NOT NULL;
+CREATE INDEX IF NOT EXISTS items_parent ON items (parent_id, "index") WHERE metadata_type = 10;
+CREATE INDEX IF NOT EXISTS items_grandparent ON items (grandparent_id) WHERE metadata_type = 10;
+CREATE INDEX IF NOT EXISTS items_part ON items (part_id) WHERE part_id != 0;
+CREATE INDEX IF NOT EXISTS items_guid ON items (guid);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class RatingIndex:
+    """Base annexe indexée des ratings, synchronisée depuis la base Plex"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else DEFAULT_RATING_INDEX_DB
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # uri=True: la base Plex est attachée par URI (mode=ro)
+        self.conn = sqlite3.connect(str(self.db_path), uri=True, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+
+    def get_watermark(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'changed_at'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _meta_counts(self, cursor: sqlite3.Cursor, table: str) -> Optional[Tuple[int, int]]:
+        row = cursor.execute("SELECT value FROM meta WHERE key = ?", (f"{table}_counts",)).fetchone()
+        if row is None:
+            return None
+        count, max_id = row[0].split(':')
+        return int(count), int(max_id)
+
+    def refresh(self, plex_uri: str, full: bool = False) -> Tuple[int, int]:
+        """Met à jour l'index depuis la base Plex (URI SQLite en lecture seule)
+
+        Sont relus: les éléments modifiés depuis le dernier rafraîchissement,
+        les pistes des albums modifiés (déplacement d'album) et les pistes
+        ayant un fichier apparu depuis (id de media_parts au-delà du dernier
+        vu). Les éléments et fichiers disparus de Plex ne sont recherchés que
+        si des lignes ont été supprimées côté Plex depuis le dernier passage
+        (ou avec full). Retourne (lignes relues, lignes supprimées).
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("ATTACH DATABASE ? AS plex", (plex_uri,))
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                refreshed, removed = self._refresh(cursor, 0 if full else self.get_watermark(), full)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            cursor.execute("DETACH DATABASE plex")
+        return refreshed, removed
+
+    def _refresh(self, cursor: sqlite3.Cursor, watermark: int, full: bool = False) -> Tuple[int, int]:
+        settings_change = plex_change_expression(cursor) or '0'
+        cursor.execute("PRAGMA plex.table_info(metadata_items)")
+        if 'updated_at' in {row[1] for row in cursor.fetchall()}:
+            change_expression = f"MAX(COALESCE(mi.updated_at, 0), {settings_change})"
+        else:
+            change_expression = settings_change
+        # Une ligne de settings par élément (rating du compte propriétaire en priorité)
+        settings_on = settings_join(cursor, schema='plex.')
+
+        # Plex numérote ses lignes en AUTOINCREMENT (ids jamais réutilisés): des
+        # suppressions ont eu lieu si le nombre de lignes n'a pas suivi l'id maximal
+        plex_counts = {}
+        swept_tables = []
+        for table in ('metadata_items', 'media_parts'):
+            plex_counts[table] = cursor.execute(
+                f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM plex.{table}").fetchone()
+            last = self._meta_counts(cursor, table)
+            count, max_id = plex_counts[table]
+            if full or last is None or count != last[0] + (max_id - last[1]):
+                swept_tables.append(table)
+        last_parts = self._meta_counts(cursor, 'media_parts')
+        last_part_id = 0 if full or last_parts is None else last_parts[1]
+
+        cursor.execute("DROP TABLE IF EXISTS temp.changed")
+        cursor.execute("CREATE TEMP TABLE changed (id INTEGER PRIMARY KEY, changed_at INTEGER)")
+        # Changement de n'importe quel compte: l'élément est relu
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO temp.changed (id, changed_at)
+            SELECT mi.id, MAX({change_expression})
+            FROM plex.metadata_items mi
+            LEFT JOIN plex.metadata_item_settings mis ON mi.guid = mis.guid
+            WHERE mi.metadata_type IN (2, 3, 10)
+            AND {change_expression} >= ?
+            GROUP BY mi.id
+        """, (watermark,))
+        # Pistes des albums modifiés: leur grand-parent a pu changer
+        cursor.execute("""
+            INSERT OR IGNORE INTO temp.changed (id)
+            SELECT mi.id FROM plex.metadata_items mi
+            WHERE mi.metadata_type = 10
+            AND mi.parent_id IN (SELECT id FROM temp.changed)
+        """)
+        # Fichiers ajoutés depuis le dernier rafraîchissement (parcours de la clé primaire)
+        cursor.execute("""
+            INSERT OR IGNORE INTO temp.changed (id)
+            SELECT media.metadata_item_id
+            FROM plex.media_parts mp
+            JOIN plex.media_items media ON media.id = mp.media_item_id
+            JOIN plex.metadata_items mi ON mi.id = media.metadata_item_id AND mi.metadata_type = 10
+            WHERE mp.id > ?
+            AND mp.file IS NOT NULL
+        """, (last_part_id,))
+
+        cursor.execute("DELETE FROM items WHERE id IN (SELECT id FROM temp.changed)")
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO items
+                (id, part_id, guid, metadata_type, parent_id, grandparent_id, title, "index",
+                 duration, year, rating, view_count, file, updated_at)
+            SELECT
+                mi.id,
+                COALESCE(mp.id, 0),
+                mi.guid,
+                mi.metadata_type,
+                mi.parent_id,
+                parent_mi.parent_id,
+                mi.title,
+                mi."index",
+                mi.duration,
+                mi.year,
+                mis.rating,
+                mis.view_count,
+                mp.file,
+                {change_expression}
+            FROM plex.metadata_items mi
+            JOIN temp.changed c ON c.id = mi.id
+            LEFT JOIN plex.metadata_items parent_mi ON mi.parent_id = parent_mi.id
+            LEFT JOIN plex.media_items media ON mi.metadata_type = 10 AND mi.id = media.metadata_item_id
+            LEFT JOIN plex.media_parts mp ON media.id = mp.media_item_id
+            LEFT JOIN plex.metadata_item_settings mis ON {settings_on}
+            WHERE mi.metadata_type IN (2, 3)
+            OR (mi.metadata_type = 10 AND mp.file IS NOT NULL)
+        """)
+        refreshed = cursor.rowcount
+
+        # Éléments et fichiers disparus de Plex (seulement s'il y a eu des suppressions)
+        removed = 0
+        if 'metadata_items' in swept_tables:
+            cursor.execute("DELETE FROM items WHERE id NOT IN (SELECT id FROM plex.metadata_items)")
+            removed += cursor.rowcount
+        if 'media_parts' in swept_tables:
+            cursor.execute("""
+                DELETE FROM items
+                WHERE part_id != 0 AND part_id NOT IN (SELECT id FROM plex.media_parts)
+            """)
+            removed += cursor.rowcount
+
+        row = cursor.execute("SELECT MAX(changed_at) FROM temp.changed").fetchone()
+        if row[0] is not None and row[0] > watermark:
+            cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('changed_at', ?)", (str(row[0]),))
+        for table, (count, max_id) in plex_counts.items():
+            cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                           (f"{table}_counts", f"{count}:{max_id}"))
+        cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)",
+                       (datetime.now().isoformat(),))
+        cursor.execute("DROP TABLE temp.changed")
+
+        return refreshed, removed
+
+    def entities(self) -> sqlite3.Cursor:
+        """Albums et artistes: (id, type, parent_id, titre, rating, changement)"""
+        return self.conn.execute("""
+            SELECT id, metadata_type, parent_id, title, rating, updated_at
+            FROM items WHERE metadata_type IN (2, 3)
+        """)
+
+    def rated_tracks(self, changed_since: Optional[int] = None) -> sqlite3.Cursor:
+        """Pistes ratées (index items_rated), au format des tuples de RatingsSnapshot.add_track
+        suivis de l'horodatage du dernier changement"""
+        change_filter = ''
+        params: Tuple = ()
+        if changed_since is not None:
+            change_filter = "AND updated_at >= ?"
+            params = (changed_since,)
+        return self.conn.execute(f"""
+            SELECT parent_id, title, "index", duration, year, rating, view_count, file, guid, updated_at
+            FROM items
+            WHERE metadata_type = 10 AND rating IS NOT NULL
+            {change_filter}
+        """, params)
+
+    def files_for_parents(self, parent_ids: Iterable[int], level: str) -> List[Tuple]:
+        """Fichiers des albums (level='album') ou artistes ('artist') demandés
+
+        Lignes (parent_id, titre piste, fichier, titre album, nom artiste) dans
+        l'ordre des pistes, via les index items_parent / items_grandparent.
+        """
+        ids = sorted(set(parent_ids))
+        parent_column = 't.parent_id' if level == 'album' else 't.grandparent_id'
+        order = 't."index"' if level == 'album' else 'album.title, t."index"'
+
+        rows = []
+        for start in range(0, len(ids), SQL_IN_CHUNK_SIZE):
+            chunk = ids[start:start + SQL_IN_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows.extend(self.conn.execute(f"""
+                SELECT {parent_column}, t.title, t.file, album.title, artist.title
+                FROM items t
+                JOIN items album ON album.id = t.parent_id AND album.part_id = 0
+                LEFT JOIN items artist ON artist.id = t.grandparent_id AND artist.part_id = 0
+                WHERE t.metadata_type = 10
+                AND {parent_column} IN ({placeholders})
+                ORDER BY {order}
+            """, chunk))
+        return rows
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,101 @@
+"""
+Statistiques des ratings Plex calculées dans SQLite
+
+Les histogrammes (nombre d'éléments par rating) sont des agrégats GROUP BY
+exécutés sur la base Plex: seuls les comptes remontent en Python, aucun
+titre ni chemin de fichier n'est lu. Les ventilations par artiste ou par
+album sont optionnelles.
+"""
+
+import sqlite3
+from typing import Dict, Optional
+
+from plex_db import settings_join
+
+# Types metadata_items Plex (numérotation utilisée par les autres requêtes du dépôt)
+TYPE_ALBUM = 2
+TYPE_ARTIST = 3
+TYPE_TRACK = 10
+
+# Colonne de regroupement des pistes pour chaque ventilation
+BREAKDOWN_LEVELS = {
+    'album': ('album_mi.id', 'album_mi.title'),
+    'artist': ('album_mi.parent_id', 'artist_mi.title'),
+}
+
+def normalize_rating(user_rating: float) -> float:
+    """Convertit un rating Plex (stocké parfois sur 10, parfois sur 5) en étoiles 1-5"""
+    if user_rating > 5:
+        return user_rating / 2  # Conversion 10 -> 5
+    return user_rating
+
+def _merge(rows) -> Dict[float, int]:
+    # Ratings bruts 3 et 6 tombent sur la même étoile: comptes fusionnés
+    counts = {}
+    for user_rating, count in rows:
+        rating = normalize_rating(user_rating)
+        counts[rating] = counts.get(rating, 0) + count
+    return counts
+
+def track_rating_counts(cursor: sqlite3.Cursor) -> Dict[float, int]:
+    """Nombre de pistes (fichiers) par rating en étoiles"""
+    # Une ligne de settings par piste, même avec plusieurs comptes Plex
+    cursor.execute(f"""
+    SELECT mis.rating, COUNT(*)
+    FROM metadata_items mi
+    JOIN media_items media ON mi.id = media.metadata_item_id
+    JOIN media_parts mp ON media.id = mp.media_item_id
+    JOIN metadata_item_settings mis ON {settings_join(cursor)}
+    WHERE mi.metadata_type = ?
+    AND mp.file IS NOT NULL
+    AND mis.rating IS NOT NULL AND mis.rating != 0
+    GROUP BY mis.rating
+    """, (TYPE_TRACK,))
+    return _merge(cursor.fetchall())
+
+def entity_rating_counts(cursor: sqlite3.Cursor, metadata_type: int) -> Dict[float, int]:
+    """Nombre d'albums (type 2) ou d'artistes (type 3) par rating en étoiles"""
+    cursor.execute(f"""
+    SELECT mis.rating, COUNT(*)
+    FROM metadata_items mi
+    JOIN metadata_item_settings mis ON {settings_join(cursor)}
+    WHERE mi.metadata_type = ?
+    AND mis.rating IS NOT NULL AND mis.rating != 0
+    GROUP BY mis.rating
+    """, (metadata_type,))
+    return _merge(cursor.fetchall())
+
+def rating_breakdown(cursor: sqlite3.Cursor, level: str) -> Dict[str, Dict[float, int]]:
+    """Histogramme des pistes ratées par album ou par artiste (titre -> rating -> nombre)"""
+    group_column, title_column = BREAKDOWN_LEVELS[level]
+    cursor.execute(f"""
+    SELECT {title_column}, mis.rating, COUNT(*)
+    FROM metadata_items mi
+    JOIN media_items media ON mi.id = media.metadata_item_id
+    JOIN media_parts mp ON media.id = mp.media_item_id
+    JOIN metadata_item_settings mis ON {settings_join(cursor)}
+    LEFT JOIN metadata_items album_mi ON mi.parent_id = album_mi.id
+    LEFT JOIN metadata_items artist_mi ON album_mi.parent_id = artist_mi.id
+    WHERE mi.metadata_type = ?
+    AND mp.file IS NOT NULL
+    AND mis.rating IS NOT NULL AND mis.rating != 0
+    GROUP BY {group_column}, mis.rating
+    """, (TYPE_TRACK,))
+
+    breakdown = {}
+    for title, user_rating, count in cursor:
+        counts = breakdown.setdefault(title or ('Unknown Album' if level == 'album' else 'Unknown Artist'), {})
+        rating = normalize_rating(user_rating)
+        counts[rating] = counts.get(rating, 0) + count
+    return breakdown
+
+def collect_rating_stats(cursor: sqlite3.Cursor, breakdown: Optional[str] = None) -> Dict:
+    """Histogrammes pistes/albums/artistes, plus la ventilation demandée ('album' ou 'artist')"""
+    stats = {
+        'tracks': track_rating_counts(cursor),
+        'albums': entity_rating_counts(cursor, TYPE_ALBUM),
+        'artists': entity_rating_counts(cursor, TYPE_ARTIST),
+    }
+    if breakdown is not None:
+        stats['breakdown'] = rating_breakdown(cursor, breakdown)
+    return stats
@@ -8,16 +8,21 @@ import json
 import sys
 import argparse
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Iterable, Iterator, Tuple
 import logging
 
+from worker_pool import run_bounded
+
+# Résultats de synchronisation d'un fichier
+STATUS_PROCESSED = 'processed'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+# Extensions lues en flux comme JSON Lines (un objet par ligne) sans --jsonl
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+
 try:
-    from mutagen.id3 import ID3
-    from mutagen.id3._frames import POPM
-    from mutagen.mp3 import MP3
-    from mutagen.mp4 import MP4
-    from mutagen.flac import FLAC
-    from mutagen._file import File
+    from tag_writers import writer_for
 except ImportError:
     print("❌ Erreur: Module 'mutagen' requis. Installez avec: pip3 install mutagen")
     sys.exit(1)
@@ -26,9 +31,12 @@ class RatingSync:
     def __init__(self, verbose: bool = False):
         self.verbose = verbose
         self.setup_logging()
-        self.processed_files = []
+        # Compteur pour les succès, listes seulement pour les fichiers à signaler
+        self.processed_count = 0
         self.failed_files = []
         self.skipped_files = []
+        self.invalid_lines = 0
+        self.duplicate_count = 0
         
     def setup_logging(self):
         log_format = '%(asctime)s - %(levelname)s - %(message)s'
@@ -40,184 +48,206 @@ class RatingSync:
         )
         self.logger = logging.getLogger(__name__)
 
-    def rating_to_stars_255(self, rating: float) -> int:
-        """Convertit rating 1-5 étoiles vers valeur 0-255 pour POPM"""
-        # Mapping standard: 1⭐=1, 2⭐=64, 3⭐=128, 4⭐=196, 5⭐=255
-        mapping = {
-            1.0: 1,
-            2.0: 64, 
-            3.0: 128,
-            4.0: 196,
-            5.0: 255
-        }
-        return mapping.get(rating, 128)  # Default 3 étoiles si inconnu
-
-    def set_mp3_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier MP3"""
-        try:
-            audio = MP3(file_path, ID3=ID3)
-            
-            # Ajouter tags ID3 si absent
-            if audio.tags is None:
-                audio.add_tags()
-            
-            if audio.tags is not None:
-                # POPM frame pour rating (Windows Media Player, etc.)
-                rating_255 = self.rating_to_stars_255(rating)
-                if play_count is not None:
-                    audio.tags.add(POPM(email="no@email", rating=rating_255, count=play_count))
-                else:
-                    audio.tags.add(POPM(email="no@email", rating=rating_255, count=1))
-            
-                # Sauvegarder
-                audio.save()
-            
-                log_msg = f"✅ MP3 rating {rating}⭐"
-                if play_count is not None:
-                    log_msg += f" + {play_count} lectures"
-                log_msg += f" écrit: {file_path.name}"
-                self.logger.info(log_msg)
-                return True
-            else:
-                self.logger.error(f"❌ Impossible de créer tags ID3: {file_path.name}")
-                return False
-            
-        except Exception as e:
-            self.logger.error(f"❌ Erreur MP3 {file_path.name}: {e}")
-            return False
-
-    def set_mp4_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier MP4/M4A"""
-        try:
-            audio = MP4(file_path)
-            
-            # Tag ---- pour rating iTunes (0-100)
-            rating_100 = int(rating * 20)  # 1⭐=20, 5⭐=100
-            audio["----:com.apple.iTunes:rating"] = str(rating_100).encode('utf-8')
-            
-            # Tag rtng alternatif
-            audio["rtng"] = [rating_100]
-            
-            # Play count si fourni
-            if play_count is not None:
-                audio["plct"] = [play_count]  # Play count iTunes
-            
-            audio.save()
-            
-            log_msg = f"✅ MP4 rating {rating}⭐"
-            if play_count is not None:
-                log_msg += f" + {play_count} lectures"
-            log_msg += f" écrit: {file_path.name}"
-            self.logger.info(log_msg)
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"❌ Erreur MP4 {file_path.name}: {e}")
-            return False
-
-    def set_flac_rating(self, file_path: Path, rating: float, play_count: Optional[int] = None) -> bool:
-        """Définit le rating et play count pour fichier FLAC"""
-        try:
-            audio = FLAC(file_path)
-            
-            # Tag RATING standard (0-100)
-            rating_100 = str(int(rating * 20))
-            audio["RATING"] = rating_100
-            
-            # Tag FMPS_RATING alternatif (0.0-1.0)
-            rating_decimal = str(rating / 5.0)
-            audio["FMPS_RATING"] = rating_decimal
-            
-            # Play count si fourni
-            if play_count is not None:
-                audio["PLAYCOUNT"] = str(play_count)  # Tag standard FLAC
-            
-            audio.save()
-            
-            log_msg = f"✅ FLAC rating {rating}⭐"
-            if play_count is not None:
-                log_msg += f" + {play_count} lectures"
-            log_msg += f" écrit: {file_path.name}"
-            self.logger.info(log_msg)
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"❌ Erreur FLAC {file_path.name}: {e}")
-            return False
-
-    def sync_file_rating(self, file_info: Dict) -> bool:
-        """Synchronise le rating et play count d'un fichier vers ses métadonnées"""
+    def rate_file(self, file_info: Dict) -> str:
+        """Écrit rating et play count d'un fichier et retourne le statut (utilisable en parallèle)"""
         file_path = Path(file_info['file_path'])
         rating = float(file_info['rating'])
         play_count = file_info.get('play_count')  # Optionnel
         
         if not file_path.exists():
             self.logger.warning(f"❌ Fichier introuvable: {file_path}")
-            self.skipped_files.append(file_info)
-            return False
+            return STATUS_SKIPPED
         
-        # Déterminer le type de fichier
-        suffix = file_path.suffix.lower()
-        
-        success = False
-        if suffix in ['.mp3']:
-            success = self.set_mp3_rating(file_path, rating, play_count)
-        elif suffix in ['.mp4', '.m4a', '.aac']:
-            success = self.set_mp4_rating(file_path, rating, play_count)
-        elif suffix in ['.flac']:
-            success = self.set_flac_rating(file_path, rating, play_count)
+        writer = writer_for(file_path)
+        if writer is None:
+            self.logger.warning(f"⚠️ Format non supporté: {file_path.suffix.lower()} - {file_path.name}")
+            return STATUS_SKIPPED
+
+        try:
+            save = writer.prepare(file_path, rating, play_count)
+            if save is None:
+                self.logger.debug(f"⏸️ {writer.kind} rating {rating}⭐ déjà présent, inchangé: {file_path.name}")
+                return STATUS_PROCESSED
+            save()
+        except Exception as e:
+            self.logger.error(f"❌ Erreur {writer.kind} {file_path.name}: {e}")
+            return STATUS_FAILED
+
+        log_msg = f"✅ {writer.kind} rating {rating}⭐"
+        if play_count is not None:
+            log_msg += f" + {play_count} lectures"
+        log_msg += f" écrit: {file_path.name}"
+        self.logger.info(log_msg)
+        return STATUS_PROCESSED
+
+    def record_result(self, file_info: Dict, status: str) -> bool:
+        """Range le fichier dans la liste correspondant à son statut"""
+        if status == STATUS_PROCESSED:
+            self.processed_count += 1
+        elif status == STATUS_FAILED:
+            self.failed_files.append(file_info)
         else:
-            self.logger.warning(f"⚠️ Format non supporté: {suffix} - {file_path.name}")
             self.skipped_files.append(file_info)
-            return False
-        
-        if success:
-            self.processed_files.append(file_info)
-        else:
-            self.failed_files.append(file_info)
-            
-        return success
+        return status == STATUS_PROCESSED
+
+    def sync_file_rating(self, file_info: Dict) -> bool:
+        """Synchronise le rating et play count d'un fichier vers ses métadonnées"""
+        return self.record_result(file_info, self.rate_file(file_info))
+
+    def unique_files(self, records: Iterable, key: Callable[[object], Dict] = lambda record: record) -> Iterator:
+        """Écarte les entrées d'un fichier déjà rencontré (première occurrence gardée)
+
+        Un export peut lister un fichier plusieurs fois (une ligne par compte
+        Plex dans les anciens exports): deux workers écriraient alors le même
+        fichier en même temps.
+        """
+        seen = set()
+        for record in records:
+            file_path = key(record).get('file_path')
+            if file_path is not None:
+                if file_path in seen:
+                    self.duplicate_count += 1
+                    self.logger.debug(f"🔁 Doublon ignoré: {file_path}")
+                    continue
+                seen.add(file_path)
+            yield record
+
+    def sync_ratings_from_json(self, json_file: Path, jobs: int = 1) -> Dict:
+        """Synchronise tous les ratings depuis un fichier JSON
 
-    def sync_ratings_from_json(self, json_file: Path) -> Dict:
-        """Synchronise tous les ratings depuis un fichier JSON"""
+        Accepte une liste de fichiers ou un export de plex_rating_sync_complete.py
+        ({"ratings": [...]}).
+        """
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
                 files_data = json.load(f)
+            if isinstance(files_data, dict):
+                files_data = files_data.get('ratings', [])
+            files_data = list(self.unique_files(files_data))
                 
             self.logger.info(f"🎵 Synchronisation ratings pour {len(files_data)} fichiers...")
             
-            for file_info in files_data:
-                self.sync_file_rating(file_info)
+            # Résultats rangés dans l'ordre d'entrée pour un résumé déterministe
+            statuses = [None] * len(files_data)
+            for index, _file_info, status in run_bounded(self.rate_file, files_data, jobs):
+                statuses[index] = status
             
-            # Statistiques
-            stats = {
-                'total_files': len(files_data),
-                'processed': len(self.processed_files),
-                'failed': len(self.failed_files),
-                'skipped': len(self.skipped_files)
-            }
+            for file_info, status in zip(files_data, statuses):
+                self.record_result(file_info, status)
             
-            self.logger.info(f"✅ Synchronisation terminée:")
-            self.logger.info(f"   📊 Total: {stats['total_files']}")
-            self.logger.info(f"   ✅ Traités: {stats['processed']}")
-            self.logger.info(f"   ❌ Échecs: {stats['failed']}")
-            self.logger.info(f"   ⚠️ Ignorés: {stats['skipped']}")
-            
-            return stats
+            return self.log_summary(len(files_data))
             
         except Exception as e:
             self.logger.error(f"❌ Erreur lecture JSON {json_file}: {e}")
             return {'total_files': 0, 'processed': 0, 'failed': 0, 'skipped': 0}
 
+    def iter_jsonl(self, json_file: Path, start_offset: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """Lit un fichier JSON Lines à partir d'un offset (octets), ligne par ligne
+
+        Produit (offset de fin de ligne, objet): l'offset de fin est le point de
+        reprise une fois la ligne traitée. Les lignes illisibles sont comptées
+        et ignorées.
+        """
+        with open(json_file, 'rb') as f:
+            f.seek(start_offset)
+            offset = start_offset
+            for line in f:
+                line_start = offset
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield offset, json.loads(line)
+                except ValueError as e:
+                    self.invalid_lines += 1
+                    self.logger.error(f"❌ Ligne JSON invalide (offset {line_start}): {e}")
+
+    def sync_ratings_from_jsonl(self, json_file: Path, jobs: int = 1, start_offset: int = 0) -> Dict:
+        """Synchronise les ratings d'un fichier JSON Lines, traité en flux
+
+        Les lignes sont lues au fur et à mesure de l'avancement des workers:
+        seul l'ensemble des chemins déjà vus (dédoublonnage) grandit avec le
+        fichier. next_offset (dans les statistiques) est l'offset à passer à
+        --start-offset pour reprendre: toutes les lignes avant lui sont
+        traitées, même avec plusieurs workers.
+        """
+        if start_offset:
+            self.logger.info(f"⏩ Reprise à l'offset {start_offset}")
+        self.logger.info(f"🎵 Synchronisation ratings en flux depuis {json_file}...")
+
+        total = 0
+        next_offset = start_offset
+        # Offsets de fin des lignes terminées hors ordre (workers parallèles)
+        finished = {}
+        next_index = 0
+        interrupted = False
+
+        try:
+            records = self.unique_files(self.iter_jsonl(json_file, start_offset), key=lambda record: record[1])
+            for index, (end_offset, file_info), status in run_bounded(
+                    lambda record: self.rate_file(record[1]), records, jobs):
+                self.record_result(file_info, status)
+                total += 1
+                finished[index] = end_offset
+                while next_index in finished:
+                    next_offset = finished.pop(next_index)
+                    next_index += 1
+        except KeyboardInterrupt:
+            interrupted = True
+            self.logger.warning(f"⏹️ Interrompu: reprendre avec --start-offset {next_offset}")
+        except Exception as e:
+            self.logger.error(f"❌ Erreur lecture JSON Lines {json_file}: {e}")
+
+        stats = self.log_summary(total)
+        stats['next_offset'] = next_offset
+        stats['interrupted'] = interrupted
+        if self.invalid_lines:
+            self.logger.info(f"   ⚠️ Lignes invalides: {self.invalid_lines}")
+        return stats
+
+    def log_summary(self, total_files: int) -> Dict:
+        """Affiche et retourne les statistiques de la synchronisation"""
+        stats = {
+            'total_files': total_files,
+            'processed': self.processed_count,
+            'failed': len(self.failed_files),
+            'skipped': len(self.skipped_files),
+            'duplicates': self.duplicate_count
+        }
+        
+        self.logger.info(f"✅ Synchronisation terminée:")
+        self.logger.info(f"   📊 Total: {stats['total_files']}")
+        self.logger.info(f"   ✅ Traités: {stats['processed']}")
+        self.logger.info(f"   ❌ Échecs: {stats['failed']}")
+        self.logger.info(f"   ⚠️ Ignorés: {stats['skipped']}")
+        if self.duplicate_count:
+            self.logger.info(f"   🔁 Doublons ignorés: {stats['duplicates']}")
+        
+        return stats
+
 def main():
     parser = argparse.ArgumentParser(
         description='Synchronise les ratings Plex vers les métadonnées ID3 des fichiers audio'
     )
     parser.add_argument('json_file', 
-                        help='Fichier JSON contenant les informations de rating')
+                        help='Fichier JSON (ou JSON Lines) contenant les informations de rating')
     parser.add_argument('--verbose', '-v', 
                         action='store_true',
                         help='Mode verbeux')
+    parser.add_argument('--jobs', '-j',
+                        type=int,
+                        default=1,
+                        metavar='N',
+                        help='Nombre de fichiers traités en parallèle (défaut: 1)')
+    parser.add_argument('--jsonl',
+                        action='store_true',
+                        help='Lit le fichier en JSON Lines, en flux (automatique pour .jsonl/.ndjson)')
+    parser.add_argument('--start-offset',
+                        type=int,
+                        default=0,
+                        metavar='BYTES',
+                        help='JSON Lines: reprend la lecture à cet offset (affiché en fin de run)')
     
     args = parser.parse_args()
     
@@ -228,7 +258,13 @@ def main():
     
     # Synchronisation
     sync = RatingSync(verbose=args.verbose)
-    stats = sync.sync_ratings_from_json(json_file)
+    if args.jsonl or args.start_offset or json_file.suffix.lower() in JSONL_SUFFIXES:
+        stats = sync.sync_ratings_from_jsonl(json_file, jobs=args.jobs, start_offset=args.start_offset)
+        print(f"⏩ Offset de reprise: {stats['next_offset']}")
+        if stats['interrupted']:
+            sys.exit(1)
+    else:
+        stats = sync.sync_ratings_from_json(json_file, jobs=args.jobs)
     
     # Code de sortie selon résultats
     if stats['failed'] > 0:
@@ -0,0 +1,296 @@
+"""
+État local persistant des synchronisations Plex
+
+Base SQLite locale partagée par plex_ratings_sync.py et
+plex_rating_sync_complete.py pour les exécutions incrémentales:
+- filigrane (watermark) des colonnes updated_at/last_rated_at de Plex
+- dernier rating, nombre de lectures et empreinte du fichier par guid de piste
+- point de reprise des runs interrompus (dernier id de piste traité)
+
+Contient aussi le cache des identifications songrec, indexé par empreinte
+du contenu audio.
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+
+DEFAULT_STATE_DB = Path.home() / '.cache' / 'plex_ratings_sync' / 'state.db'
+DEFAULT_SONGREC_CACHE_DB = Path.home() / '.cache' / 'plex_ratings_sync' / 'songrec_cache.db'
+
+# Taille des blocs hachés en début et fin de fichier pour l'empreinte de contenu
+CONTENT_SAMPLE_SIZE = 1024 * 1024
+
+# Colonnes de metadata_item_settings indiquant un changement de rating/lecture
+PLEX_CHANGE_COLUMNS = ('updated_at', 'last_rated_at')
+
+def file_fingerprint(file_path: str) -> Optional[Tuple[int, int]]:
+    """Empreinte légère d'un fichier: (taille, mtime en ns)"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def content_fingerprint(file_path: str) -> Optional[str]:
+    """Empreinte de contenu: taille + SHA-1 du premier et du dernier Mo
+
+    Indépendante du chemin et du mtime: un fichier renommé ou simplement
+    touché garde la même empreinte.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            digest = hashlib.sha1(f.read(CONTENT_SAMPLE_SIZE))
+            if size > CONTENT_SAMPLE_SIZE:
+                f.seek(max(CONTENT_SAMPLE_SIZE, size - CONTENT_SAMPLE_SIZE))
+                digest.update(f.read(CONTENT_SAMPLE_SIZE))
+    except OSError:
+        return None
+    return f"{size}:{digest.hexdigest()}"
+
+def plex_change_expression(cursor: sqlite3.Cursor, alias: str = 'mis') -> Optional[str]:
+    """Expression SQL du dernier changement d'un metadata_item_settings
+
+    Retourne None si aucune des colonnes attendues n'existe (schéma ancien):
+    le mode incrémental n'est alors pas possible.
+    """
+    cursor.execute("PRAGMA table_info(metadata_item_settings)")
+    columns = {row[1] for row in cursor.fetchall()}
+    available = [f"COALESCE({alias}.{column}, 0)" for column in PLEX_CHANGE_COLUMNS if column in columns]
+
+    if not available:
+        return None
+    if len(available) == 1:
+        return available[0]
+    return f"MAX({', '.join(available)})"
+
+class SyncStateStore:
+    """Magasin d'état SQLite pour la synchronisation incrémentale
+
+    Utilisable depuis plusieurs threads (étages du pipeline de synchronisation).
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else DEFAULT_STATE_DB
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS watermarks (
+            consumer TEXT PRIMARY KEY,
+            changed_at INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS track_state (
+            consumer TEXT NOT NULL,
+            guid TEXT NOT NULL,
+            rating REAL,
+            view_count INTEGER,
+            file_path TEXT,
+            file_size INTEGER,
+            file_mtime_ns INTEGER,
+            synced_at TEXT NOT NULL,
+            PRIMARY KEY (consumer, guid)
+        );
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            consumer TEXT PRIMARY KEY,
+            last_item_id INTEGER NOT NULL,  -- toutes les pistes d'id <= sont traitées
+            changed_since INTEGER,          -- périmètre du run interrompu (NULL: complet)
+            max_changed_at INTEGER NOT NULL,
+            retry_changed_at INTEGER,       -- plus petit horodatage des pistes à retenter (NULL: aucune)
+            started_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """)
+        # Bases créées avant la colonne retry_changed_at
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(checkpoints)")}
+        if 'retry_changed_at' not in columns:
+            self.conn.execute("ALTER TABLE checkpoints ADD COLUMN retry_changed_at INTEGER")
+
+    def get_watermark(self, consumer: str) -> int:
+        """Dernier horodatage Plex traité par ce consommateur (0 si jamais)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT changed_at FROM watermarks WHERE consumer = ?", (consumer,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_watermark(self, consumer: str, changed_at: int):
+        """Avance le filigrane (ne recule jamais)"""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO watermarks (consumer, changed_at, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(consumer) DO UPDATE SET
+                    changed_at = MAX(changed_at, excluded.changed_at),
+                    updated_at = excluded.updated_at
+            """, (consumer, changed_at, datetime.now().isoformat()))
+
+    def is_unchanged(self, consumer: str, guid: Optional[str], rating: float,
+                     view_count: Optional[int], file_path: str,
+                     fingerprint: Callable[[str], Optional[Tuple[int, int]]] = file_fingerprint) -> bool:
+        """Vrai si ce rating/play count a déjà été écrit dans ce fichier inchangé
+
+        fingerprint fournit (taille, mtime en ns): stat direct par défaut, ou
+        FileCatalog.stat pour réutiliser un listage de répertoires.
+        """
+        if not guid:
+            return False
+
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT rating, view_count, file_path, file_size, file_mtime_ns
+                FROM track_state WHERE consumer = ? AND guid = ?
+            """, (consumer, guid)).fetchone()
+        if row is None:
+            return False
+
+        stored_rating, stored_views, stored_path, size, mtime_ns = row
+        if (stored_rating, stored_views, stored_path) != (rating, view_count, file_path):
+            return False
+        return fingerprint(file_path) == (size, mtime_ns)
+
+    def record_track(self, consumer: str, guid: Optional[str], rating: float,
+                     view_count: Optional[int], file_path: str):
+        """Mémorise ce qui vient d'être écrit (empreinte prise après écriture)"""
+        if not guid:
+            return
+
+        size, mtime_ns = file_fingerprint(file_path) or (None, None)
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO track_state
+                    (consumer, guid, rating, view_count, file_path, file_size, file_mtime_ns, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (consumer, guid, rating, view_count, file_path, size, mtime_ns, datetime.now().isoformat()))
+
+    def get_checkpoint(self, consumer: str) -> Optional[Dict]:
+        """Point de reprise d'un run interrompu, ou None"""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT last_item_id, changed_since, max_changed_at, retry_changed_at, started_at, updated_at
+                FROM checkpoints WHERE consumer = ?
+            """, (consumer,)).fetchone()
+        if row is None:
+            return None
+        last_item_id, changed_since, max_changed_at, retry_changed_at, started_at, updated_at = row
+        return {
+            'last_item_id': last_item_id,
+            'changed_since': changed_since,
+            'max_changed_at': max_changed_at,
+            'retry_changed_at': retry_changed_at,
+            'started_at': started_at,
+            'updated_at': updated_at
+        }
+
+    def save_checkpoint(self, consumer: str, last_item_id: int, changed_since: Optional[int],
+                        max_changed_at: int, started_at: str, retry_changed_at: Optional[int] = None):
+        """Enregistre l'avancement (visible après le prochain commit)
+
+        retry_changed_at: plus petit horodatage Plex des pistes ignorées ou
+        en échec, sous lequel le filigrane ne doit pas avancer.
+        """
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO checkpoints
+                    (consumer, last_item_id, changed_since, max_changed_at, retry_changed_at,
+                     started_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (consumer, last_item_id, changed_since, max_changed_at, retry_changed_at,
+                  started_at, datetime.now().isoformat()))
+
+    def clear_checkpoint(self, consumer: str):
+        """Oublie le point de reprise (run terminé)"""
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE consumer = ?", (consumer,))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+class SongrecCache:
+    """Cache disque des résultats songrec, indexé par empreinte de contenu
+
+    Les identifications réussies sont conservées indéfiniment; les morceaux
+    non reconnus expirent après negative_ttl_days. Les erreurs (songrec en
+    échec, réseau, timeout) ne sont pas mémorisées et seront retentées.
+    Utilisable depuis plusieurs threads.
+    """
+
+    # Statuts mis en cache: résultats stables pour un contenu donné
+    POSITIVE_STATUSES = ('identified',)
+    NEGATIVE_STATUSES = ('no_result',)
+
+    def __init__(self, db_path: Optional[str] = None, negative_ttl_days: float = 7):
+        self.db_path = Path(db_path) if db_path else DEFAULT_SONGREC_CACHE_DB
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.negative_ttl = timedelta(days=negative_ttl_days)
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS songrec_results (
+            fingerprint TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            error TEXT,
+            songrec_result TEXT,
+            file_path TEXT,
+            cached_at TEXT NOT NULL
+        );
+        """)
+
+    def get(self, fingerprint: str) -> Optional[Dict]:
+        """Résultat en cache pour ce contenu, ou None (absent ou échec expiré)"""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT status, error, songrec_result, cached_at
+                FROM songrec_results WHERE fingerprint = ?
+            """, (fingerprint,)).fetchone()
+        if row is None:
+            return None
+
+        status, error, songrec_result, cached_at = row
+        if status in self.NEGATIVE_STATUSES:
+            if datetime.now() - datetime.fromisoformat(cached_at) > self.negative_ttl:
+                return None
+
+        return {
+            'status': status,
+            'identified': status in self.POSITIVE_STATUSES,
+            'error': error,
+            'songrec_result': json.loads(songrec_result) if songrec_result else None
+        }
+
+    def put(self, fingerprint: str, detail: Dict):
+        """Mémorise le résultat d'une identification (ignoré si transitoire: timeout...)"""
+        status = detail['status']
+        if status not in self.POSITIVE_STATUSES + self.NEGATIVE_STATUSES:
+            return
+
+        songrec_result = detail.get('songrec_result')
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO songrec_results
+                    (fingerprint, status, error, songrec_result, file_path, cached_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (fingerprint, status, detail.get('error'),
+                  json.dumps(songrec_result, ensure_ascii=False) if songrec_result else None,
+                  detail.get('file_path'), datetime.now().isoformat()))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
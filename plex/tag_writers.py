@@ -0,0 +1,283 @@
+"""
+Registre des écrivains de tags de rating par format de conteneur
+
+Partagé par plex_rating_sync_complete.py et sync_ratings_to_id3.py. Le
+conteneur est détecté sur les premiers octets du fichier (l'extension ne sert
+qu'en dernier recours), puis un écrivain réutilisable charge le strict
+nécessaire: ID3(fichier) pour un MP3 (pas de parcours des frames audio), les
+seuls blocs de métadonnées pour FLAC, les pages d'en-tête pour Ogg.
+
+Chaque écrivain compare les tags existants à la cible avant d'écrire:
+prepare() retourne None si le fichier est déjà à jour, sinon l'écriture à
+faire (les tags sont modifiés en mémoire, save() touche le disque).
+"""
+
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from mutagen._file import File
+from mutagen.asf import ASF
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3, ID3NoHeaderError
+from mutagen.id3._frames import POPM
+from mutagen.mp4 import MP4, MP4FreeForm
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+from mutagen.wave import WAVE
+
+# Rating 1-5 étoiles -> POPM 0-255 (convention Windows Media Player)
+POPM_RATINGS = {1.0: 1, 2.0: 64, 3.0: 128, 4.0: 196, 5.0: 255}
+POPM_EMAIL = "no@email"
+# Rating 1-5 étoiles -> WM/SharedUserRating 0-99
+ASF_RATINGS = {1.0: 1, 2.0: 25, 3.0: 50, 4.0: 75, 5.0: 99}
+
+# Octets lus pour reconnaître le conteneur
+HEADER_SIZE = 64
+ASF_GUID = b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'
+
+# Conteneur supposé d'après l'extension quand l'en-tête ne suffit pas
+SUFFIX_CONTAINERS = {
+    '.mp3': 'mp3',
+    '.mp4': 'mp4', '.m4a': 'mp4', '.aac': 'mp4',
+    '.flac': 'flac',
+    '.ogg': 'ogg_vorbis', '.oga': 'ogg_vorbis',
+    '.opus': 'ogg_opus',
+    '.wma': 'asf',
+    '.wav': 'wav',
+}
+
+def popm_rating(rating: float) -> int:
+    """Convertit rating 1-5 étoiles vers valeur 0-255 pour POPM (3⭐ si inconnu)"""
+    return POPM_RATINGS.get(rating, 128)
+
+def detect_container(file_path: Path) -> Optional[str]:
+    """Conteneur d'après la signature du fichier, puis d'après l'extension"""
+    suffix_container = SUFFIX_CONTAINERS.get(file_path.suffix.lower())
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return suffix_container
+
+    if header.startswith(b'ID3'):
+        # Un tag ID3 peut précéder un flux FLAC ou AAC: l'extension tranche
+        return suffix_container or 'mp3'
+    if header.startswith(b'fLaC'):
+        return 'flac'
+    if header.startswith(b'OggS'):
+        if b'OpusHead' in header:
+            return 'ogg_opus'
+        if b'\x01vorbis' in header:
+            return 'ogg_vorbis'
+        return None  # Ogg FLAC, Speex...: pas d'écrivain
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    if header.startswith(ASF_GUID):
+        return 'asf'
+    if header.startswith(b'RIFF') and header[8:12] == b'WAVE':
+        return 'wav'
+    if len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and header[1] & 0x06:
+        return 'mp3'  # Synchro de frame MPEG audio (couche I-III) sans tag ID3
+    return suffix_container
+
+class TagWriter:
+    """Écrivain de rating/play count pour un conteneur (sans état, réutilisé pour tous les fichiers)"""
+
+    kind = ''  # Libellé du format dans les logs
+
+    def load(self, file_path: Path):
+        """Charge les tags seuls (le moins possible du reste du fichier)"""
+        raise NotImplementedError
+
+    def matches(self, tags, rating: float, play_count: Optional[int]) -> bool:
+        """Vrai si les tags contiennent déjà le rating et le play count cibles"""
+        raise NotImplementedError
+
+    def apply(self, tags, rating: float, play_count: Optional[int]):
+        """Modifie les tags en mémoire"""
+        raise NotImplementedError
+
+    def save(self, tags, file_path: Path):
+        tags.save()
+
+    def prepare(self, file_path: Path, rating: float, play_count: Optional[int] = None,
+                force: bool = False) -> Optional[Callable[[], None]]:
+        """Lit et compare; retourne l'écriture à faire, ou None si déjà à jour"""
+        tags = self.load(file_path)
+        if not force and self.matches(tags, rating, play_count):
+            return None
+        self.apply(tags, rating, play_count)
+        return lambda: self.save(tags, file_path)
+
+class ID3Writer(TagWriter):
+    """MP3: frame POPM du tag ID3, lu sans parcourir les frames audio"""
+
+    kind = 'MP3'
+
+    def load(self, file_path: Path):
+        try:
+            return ID3(file_path)
+        except ID3NoHeaderError:
+            return ID3()
+
+    def _frames(self, tags):
+        return tags
+
+    def matches(self, tags, rating: float, play_count: Optional[int]) -> bool:
+        current = self._frames(tags).get(f"POPM:{POPM_EMAIL}")
+        count = play_count if play_count is not None else 1
+        return (current is not None and current.rating == popm_rating(rating)
+                and getattr(current, 'count', None) == count)
+
+    def apply(self, tags, rating: float, play_count: Optional[int]):
+        count = play_count if play_count is not None else 1
+        self._frames(tags).add(POPM(email=POPM_EMAIL, rating=popm_rating(rating), count=count))
+
+    def save(self, tags, file_path: Path):
+        tags.save(file_path)
+
+class WaveWriter(ID3Writer):
+    """WAV: même frame POPM, dans le bloc RIFF « id3 » (seuls les en-têtes de blocs sont lus)"""
+
+    kind = 'WAV'
+
+    def load(self, file_path: Path):
+        audio = WAVE(file_path)
+        if audio.tags is None:
+            audio.add_tags()
+        return audio
+
+    def _frames(self, tags):
+        return tags.tags
+
+    def save(self, tags, file_path: Path):
+        tags.save()
+
+class MP4Writer(TagWriter):
+    """MP4/M4A: atomes iTunes rtng (0-100), plct et ----:com.apple.iTunes:rating"""
+
+    kind = 'MP4'
+
+    def load(self, file_path: Path):
+        return MP4(file_path)
+
+    def matches(self, tags, rating: float, play_count: Optional[int]) -> bool:
+        if tags.get("rtng") != [int(rating * 20)]:
+            return False
+        return play_count is None or [str(v) for v in tags.get("plct", [])] == [str(play_count)]
+
+    def apply(self, tags, rating: float, play_count: Optional[int]):
+        rating_100 = int(rating * 20)  # 1⭐=20, 5⭐=100
+        tags["rtng"] = [rating_100]
+        tags["----:com.apple.iTunes:rating"] = [MP4FreeForm(str(rating_100).encode('utf-8'))]
+        if play_count is not None:
+            tags["plct"] = [str(play_count)]  # Atome texte pour mutagen
+
+class VorbisWriter(TagWriter):
+    """FLAC, Ogg Vorbis, Opus: commentaires RATING (0-100), FMPS_RATING (0-1), PLAYCOUNT"""
+
+    def __init__(self, kind: str, file_type):
+        self.kind = kind
+        self.file_type = file_type
+
+    def load(self, file_path: Path):
+        return self.file_type(file_path)
+
+    def matches(self, tags, rating: float, play_count: Optional[int]) -> bool:
+        if tags.tags is None:
+            return False
+        if tags.get("RATING") != [str(int(rating * 20))] or tags.get("FMPS_RATING") != [str(rating / 5.0)]:
+            return False
+        return play_count is None or tags.get("PLAYCOUNT") == [str(play_count)]
+
+    def apply(self, tags, rating: float, play_count: Optional[int]):
+        if tags.tags is None:
+            tags.add_tags()
+        tags["RATING"] = str(int(rating * 20))
+        tags["FMPS_RATING"] = str(rating / 5.0)
+        if play_count is not None:
+            tags["PLAYCOUNT"] = str(play_count)
+
+class ASFWriter(TagWriter):
+    """WMA: WM/SharedUserRating (0-99); ASF n'a pas de champ standard de nombre de lectures"""
+
+    kind = 'WMA'
+
+    def load(self, file_path: Path):
+        return ASF(file_path)
+
+    def matches(self, tags, rating: float, play_count: Optional[int]) -> bool:
+        current = tags.get("WM/SharedUserRating")
+        return bool(current) and current[0].value == ASF_RATINGS.get(rating, 50)
+
+    def apply(self, tags, rating: float, play_count: Optional[int]):
+        tags["WM/SharedUserRating"] = [ASF_RATINGS.get(rating, 50)]  # int -> DWORD
+
+WRITERS: Dict[str, TagWriter] = {
+    'mp3': ID3Writer(),
+    'wav': WaveWriter(),
+    'mp4': MP4Writer(),
+    'flac': VorbisWriter('FLAC', FLAC),
+    'ogg_vorbis': VorbisWriter('OGG', OggVorbis),
+    'ogg_opus': VorbisWriter('OPUS', OggOpus),
+    'asf': ASFWriter(),
+}
+
+def register_writer(container: str, writer: TagWriter, suffixes: Iterable[str] = ()):
+    """Ajoute (ou remplace) l'écrivain d'un conteneur et les extensions qui y mènent"""
+    WRITERS[container] = writer
+    for suffix in suffixes:
+        SUFFIX_CONTAINERS[suffix.lower()] = container
+
+def writer_for(file_path: Path) -> Optional[TagWriter]:
+    """Écrivain adapté au fichier, ou None si le format n'est pas pris en charge"""
+    container = detect_container(file_path)
+    return WRITERS.get(container) if container else None
+
+def benchmark_writers(paths: Iterable[str], rounds: int = 5) -> Dict[str, Dict]:
+    """Micro-benchmark par conteneur, médianes en millisecondes
+
+    Pour chaque conteneur (premier fichier rencontré): 'minimal' = chargement
+    par l'écrivain du registre, 'full' = mutagen.File (tags + infos audio),
+    'write' = préparation + écriture forcée sur une copie temporaire. Les
+    fichiers d'origine ne sont jamais modifiés. Une mesure dont l'opération
+    échoue (fichier sans frames audio valides pour mutagen.File...) vaut None.
+    """
+    samples: Dict[str, Path] = {}
+    for path in map(Path, paths):
+        if not path.is_file():
+            continue
+        container = detect_container(path)
+        if container in WRITERS and container not in samples:
+            samples[container] = path
+
+    def median_ms(operation: Callable[[], object]) -> Optional[float]:
+        timings: List[float] = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            try:
+                operation()
+            except Exception:
+                return None
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1000
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='tag_bench_') as scratch:
+        for container, path in samples.items():
+            writer = WRITERS[container]
+            copy = Path(scratch) / f"sample{path.suffix}"
+            shutil.copyfile(path, copy)
+            results[container] = {
+                'file': str(path),
+                'size': os.path.getsize(path),
+                'minimal': median_ms(lambda: writer.load(path)),
+                'full': median_ms(lambda: File(path)),
+                'write': median_ms(lambda: writer.prepare(copy, 3.0, 1, force=True)()),
+            }
+    return results
@@ -0,0 +1,68 @@
+"""
+Pool de workers borné partagé par les scripts de synchronisation
+
+Les tâches (écriture de tags, appels songrec...) sont surtout des attentes
+d'E/S disque ou de sous-processus: un pool de threads suffit. Le nombre de
+tâches en vol est borné pour ne pas matérialiser toute la file d'entrée.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+def run_bounded(func: Callable[[Any], Any], items: Iterable[Any], jobs: int = 1,
+                max_pending: Optional[int] = None,
+                deadline: Optional[float] = None) -> Iterator[Tuple[int, Any, Any]]:
+    """Exécute func(item) pour chaque item avec au plus `jobs` workers
+
+    Produit des tuples (index, item, résultat) au fil des fins de tâches
+    (ordre d'achèvement, pas d'entrée: trier sur l'index pour un résumé
+    déterministe). Au plus max_pending tâches (défaut: 2 x jobs) sont en vol
+    et les items sont consommés paresseusement.
+
+    deadline est une échéance time.monotonic(): une fois dépassée, plus
+    aucune tâche n'est démarrée; celles en cours vont à leur terme.
+    Les exceptions levées par func sont propagées à l'appelant.
+    """
+    if jobs <= 1:
+        for index, item in enumerate(items):
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            yield index, item, func(item)
+        return
+
+    max_pending = max(max_pending or jobs * 2, jobs)
+    iterator = enumerate(items)
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        def submit_next() -> bool:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            try:
+                index, item = next(iterator)
+            except StopIteration:
+                return False
+            pending[executor.submit(func, item)] = (index, item)
+            return True
+
+        while len(pending) < max_pending and submit_next():
+            pass
+
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = pending.pop(future)
+                    yield index, item, future.result()
+                if deadline is not None and time.monotonic() >= deadline:
+                    # Échéance: abandonner les tâches soumises mais pas encore démarrées
+                    for future in list(pending):
+                        if future.cancel():
+                            del pending[future]
+                while len(pending) < max_pending and submit_next():
+                    pass
+        finally:
+            # Interruption (exception, KeyboardInterrupt, générateur abandonné)
+            for future in pending:
+                future.cancel()
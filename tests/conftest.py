@@ -0,0 +1,147 @@
+"""
+Fixtures communes: base Plex factice et imports des scripts de plex/
+
+Les scripts importent leurs modules voisins par leur nom (from plex_db
+import ...): le répertoire plex/ est ajouté au chemin d'import.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+PLEX_DIR = Path(__file__).resolve().parent.parent / 'plex'
+sys.path.insert(0, str(PLEX_DIR))
+
+PLEX_SCHEMA = """
+CREATE TABLE metadata_items (id INTEGER PRIMARY KEY, guid TEXT, metadata_type INT, parent_id INT,
+                             title TEXT, "index" INT, duration INT, year INT, updated_at INT);
+CREATE TABLE metadata_item_settings (id INTEGER PRIMARY KEY, account_id INT, guid TEXT, rating REAL,
+                                     view_count INT, updated_at INT, last_rated_at INT);
+CREATE INDEX mis_guid ON metadata_item_settings(guid);
+CREATE TABLE media_items (id INTEGER PRIMARY KEY, metadata_item_id INT);
+CREATE TABLE media_parts (id INTEGER PRIMARY KEY, media_item_id INT, file TEXT);
+"""
+
+FAKE_SONGREC = """#!{python}
+import json, pathlib, sys, time
+
+path = pathlib.Path(sys.argv[-1])
+log = pathlib.Path({log!r})
+with open(log, 'a') as f:
+    f.write(f"start {{time.monotonic()}} {{path}}\\n")
+time.sleep({delay})
+with open(log, 'a') as f:
+    f.write(f"end {{time.monotonic()}} {{path}}\\n")
+if 'fail' in path.name and pathlib.Path({fail_marker!r}).exists():
+    print('échec simulé', file=sys.stderr)
+    sys.exit(1)
+print(json.dumps({{'track': {{'title': path.stem, 'subtitle': 'Artiste'}}}}))
+"""
+
+class FakeSongrec:
+    """Exécutable songrec factice: journalise ses lancements, échoue sur les fichiers « fail* » tant que
+    fail_marker existe"""
+
+    def __init__(self, root: Path, delay: float = 0.0):
+        self.log = root / 'songrec.log'
+        self.fail_marker = root / 'songrec_fail'
+        self.bin = root / 'songrec'
+        self.bin.write_text(FAKE_SONGREC.format(python=sys.executable, log=str(self.log), delay=delay,
+                                                fail_marker=str(self.fail_marker)), encoding='utf-8')
+        self.bin.chmod(0o755)
+
+    def runs(self) -> List[Tuple[str, float, str]]:
+        """(événement, instant, fichier) dans l'ordre du journal"""
+        if not self.log.exists():
+            return []
+        events = []
+        for line in self.log.read_text(encoding='utf-8').splitlines():
+            event, instant, path = line.split(' ', 2)
+            events.append((event, float(instant), path))
+        return events
+
+    def max_concurrency(self) -> int:
+        running = peak = 0
+        # À instant égal, une fin passe avant un début
+        for event, _instant, _path in sorted(self.runs(), key=lambda e: (e[1], e[0] == 'start')):
+            running += 1 if event == 'start' else -1
+            peak = max(peak, running)
+        return peak
+
+class FakePlexLibrary:
+    """Base Plex minimale (schéma des tables lues par les scripts) et fichiers audio vides"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.music_dir = root / 'music'
+        self.music_dir.mkdir()
+        self.db_path = root / 'plex.db'
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(PLEX_SCHEMA)
+        self._next_id = 1
+
+    def _item(self, metadata_type: int, title: str, parent_id: Optional[int] = None,
+              index: Optional[int] = None) -> int:
+        item_id = self._next_id
+        self._next_id += 1
+        self.conn.execute(
+            'INSERT INTO metadata_items (id, guid, metadata_type, parent_id, title, "index") VALUES (?, ?, ?, ?, ?, ?)',
+            (item_id, f"plex://item/{item_id}", metadata_type, parent_id, title, index))
+        return item_id
+
+    def rate(self, item_id: int, ratings: Dict[int, float], view_count: int = 0, changed_at: int = 1000):
+        """Une ligne de settings par compte: {account_id: rating Plex (0-10)}"""
+        for account_id, rating in ratings.items():
+            self.conn.execute(
+                "INSERT INTO metadata_item_settings (account_id, guid, rating, view_count, updated_at, last_rated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (account_id, f"plex://item/{item_id}", rating, view_count, changed_at, changed_at))
+        self.conn.commit()
+
+    def add_artist(self, title: str, ratings: Optional[Dict[int, float]] = None) -> int:
+        artist_id = self._item(3, title)
+        if ratings:
+            self.rate(artist_id, ratings)
+        return artist_id
+
+    def add_album(self, artist_id: int, title: str, ratings: Optional[Dict[int, float]] = None) -> int:
+        album_id = self._item(2, title, artist_id)
+        if ratings:
+            self.rate(album_id, ratings)
+        return album_id
+
+    def add_track(self, album_id: int, title: str, ratings: Optional[Dict[int, float]] = None,
+                  view_count: int = 0, file_name: Optional[str] = None, changed_at: int = 1000) -> Path:
+        """Piste avec un fichier (vide) sous music/; retourne le chemin du fichier"""
+        track_id = self._item(10, title, album_id, index=self._next_id)
+        file_path = self.music_dir / (file_name or f"{track_id:03d}.mp3")
+        if not file_path.exists():
+            file_path.write_bytes(b'')
+        self.conn.execute("INSERT INTO media_items (id, metadata_item_id) VALUES (?, ?)", (track_id, track_id))
+        self.conn.execute("INSERT INTO media_parts (media_item_id, file) VALUES (?, ?)", (track_id, str(file_path)))
+        self.conn.commit()
+        if ratings:
+            self.rate(track_id, ratings, view_count, changed_at)
+        return file_path
+
+    def count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+@pytest.fixture(autouse=True)
+def isolated_cwd(tmp_path, monkeypatch):
+    """Les scripts écrivent logs et rapports dans le répertoire courant"""
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture
+def fake_songrec(tmp_path):
+    """Fabrique de songrec factices (delay: durée de chaque identification)"""
+    return lambda delay=0.0: FakeSongrec(tmp_path, delay)
+
+@pytest.fixture
+def plex_library(tmp_path):
+    library = FakePlexLibrary(tmp_path)
+    yield library
+    library.conn.close()
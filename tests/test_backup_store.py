@@ -0,0 +1,87 @@
+"""Magasin de sauvegarde dédupliqué: déduplication, restauration, reprise après interruption"""
+
+import os
+
+import pytest
+
+from backup_store import ContentBackupStore
+
+def make_file(path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+def test_same_content_is_stored_once_and_restored_by_path(tmp_path):
+    store = ContentBackupStore(tmp_path / 'store')
+    first = make_file(tmp_path / 'music' / 'a' / '01.mp3', b'same audio')
+    second = make_file(tmp_path / 'music' / 'b' / '01.mp3', b'same audio')
+
+    method, digest = store.put(first, move=True)
+    assert method == 'rename' and not first.exists()
+    assert store.put(second, move=True) == ('dedup', digest)
+    assert len(list((tmp_path / 'store' / 'blobs').rglob('*'))) == 3  # ab/, ab/cd/, blob
+
+    assert store.restore(str(first)).read_bytes() == b'same audio'
+    with pytest.raises(FileExistsError):
+        store.restore(str(first))
+    with pytest.raises(FileNotFoundError):
+        store.restore(str(tmp_path / 'never_backed_up.mp3'))
+    store.close()
+
+def test_failed_placement_leaves_no_entry(tmp_path, monkeypatch):
+    store = ContentBackupStore(tmp_path / 'store')
+    track = make_file(tmp_path / 'music' / '01.mp3', b'audio')
+
+    def failing_place_at(source, destination, move=False):
+        raise OSError('disque plein')
+    monkeypatch.setattr(store.strategy, 'place_at', failing_place_at)
+
+    with pytest.raises(OSError):
+        store.put(track, move=True)
+    assert track.exists()
+    assert store.versions(str(track)) == []
+    assert store.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 0
+    store.close()
+
+def test_interruption_before_move_cancels_the_entry(tmp_path, monkeypatch):
+    store = ContentBackupStore(tmp_path / 'store')
+    track = make_file(tmp_path / 'music' / '01.mp3', b'audio')
+
+    def interrupted_place_at(source, destination, move=False):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(store.strategy, 'place_at', interrupted_place_at)
+
+    with pytest.raises(KeyboardInterrupt):
+        store.put(track, move=True)
+    store.conn.close()
+
+    reopened = ContentBackupStore(tmp_path / 'store')
+    assert reopened.recovered == (0, 1)
+    assert track.exists()
+    assert reopened.versions(str(track)) == []
+    reopened.close()
+
+def test_interruption_after_move_keeps_the_file(tmp_path, monkeypatch):
+    store = ContentBackupStore(tmp_path / 'store')
+    track = make_file(tmp_path / 'music' / '01.mp3', b'audio')
+
+    real_replace = os.replace
+    def interrupted_replace(source, destination):
+        # Le fichier part bien vers le nom temporaire; la promotion en blob est interrompue
+        if not str(destination).endswith('.tmp'):
+            raise KeyboardInterrupt
+        real_replace(source, destination)
+    monkeypatch.setattr(os, 'replace', interrupted_replace)
+
+    with pytest.raises(KeyboardInterrupt):
+        store.put(track, move=True)
+    monkeypatch.undo()
+    store.conn.close()
+    assert not track.exists()
+
+    reopened = ContentBackupStore(tmp_path / 'store')
+    assert reopened.recovered == (1, 0)
+    assert len(reopened.versions(str(track))) == 1
+    assert reopened.restore(str(track)).read_bytes() == b'audio'
+    assert not list((tmp_path / 'store' / 'blobs').rglob('*.tmp'))
+    reopened.close()
@@ -0,0 +1,44 @@
+"""Purges journalisées: reprise après interruption"""
+
+from deletion_journal import DeletionJournal
+from plex_ratings_sync import PlexRatingsSync
+
+def make_syncer(plex_library, tmp_path):
+    return PlexRatingsSync(str(plex_library.db_path),
+                           {'deletion_journal': str(tmp_path / 'journal.jsonl')})
+
+def test_replay_after_locked_database_reports_cleaned_entries(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    tracks = [plex_library.add_track(album, f"Piste {n}", ratings={1: 1.0}) for n in range(3)]
+
+    # Premier passage: fichiers supprimés, base Plex verrouillée au nettoyage
+    interrupted = make_syncer(plex_library, tmp_path)
+    def locked_cleanup(deleted_files):
+        interrupted.errors.append("database is locked")
+        return 0
+    interrupted.cleanup_plex_database = locked_cleanup
+    first = interrupted.sync_ratings(dry_run=False)
+
+    assert first['deleted_files'] == 3
+    assert not any(track.exists() for track in tracks)
+    assert DeletionJournal(str(tmp_path / 'journal.jsonl')).pending
+
+    # Passage suivant: le journal est rejoué et la base nettoyée
+    second = make_syncer(plex_library, tmp_path).sync_ratings(dry_run=False)
+
+    assert second['replayed_files'] == 3
+    assert second['cleaned_plex_entries'] == 3
+    assert plex_library.count('media_parts') == 0
+    assert not DeletionJournal(str(tmp_path / 'journal.jsonl')).pending
+
+def test_cleaned_count_survives_in_the_journal(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = DeletionJournal(path)
+    journal.begin([{'file_path': '/music/a.mp3'}])
+    journal.record_deleted({'file_path': '/music/a.mp3'})
+    journal.mark_db_cleaned(5)
+    journal.close()
+
+    reloaded = DeletionJournal(path)
+    assert reloaded.pending and reloaded.db_cleaned
+    assert reloaded.cleaned_entries == 5
@@ -0,0 +1,50 @@
+"""Sauvegarde avant suppression: rename, hardlink, reflink, copie"""
+
+import errno
+import os
+
+from file_backup import BackupStrategy
+
+def make_tracks(tmp_path, count: int):
+    music = tmp_path / 'music'
+    music.mkdir()
+    tracks = []
+    for n in range(count):
+        track = music / f"{n}.mp3"
+        track.write_bytes(b'audio %d' % n)
+        tracks.append(track)
+    return tracks
+
+def refusing_hardlink(monkeypatch, error: int, refused: set):
+    """os.link refusé (errno donné) pour les fichiers de refused; appels comptés"""
+    calls = []
+    link = BackupStrategy._hardlink
+
+    def hardlink(source, destination):
+        calls.append(source)
+        if source in refused:
+            raise OSError(error, os.strerror(error))
+        link(source, destination)
+    monkeypatch.setattr(BackupStrategy, '_hardlink', staticmethod(hardlink))
+    return calls
+
+def test_per_file_refusal_does_not_disable_hardlinks(tmp_path, monkeypatch):
+    first, second = make_tracks(tmp_path, 2)
+    calls = refusing_hardlink(monkeypatch, errno.EPERM, {first})
+    strategy = BackupStrategy(tmp_path / 'backup')
+
+    assert strategy.place(first)[0] in ('reflink', 'copy')
+    assert strategy.place(second)[0] == 'hardlink'
+    assert calls == [first, second]
+
+def test_device_refusal_is_remembered(tmp_path, monkeypatch):
+    first, second = make_tracks(tmp_path, 2)
+    calls = refusing_hardlink(monkeypatch, errno.EXDEV, {first, second})
+    strategy = BackupStrategy(tmp_path / 'backup')
+
+    strategy.place(first)
+    strategy.place(second)
+
+    assert calls == [first]
+    assert strategy.counts['hardlink'] == 0
+    assert strategy.backup_path(second).read_bytes() == b'audio 1'
@@ -0,0 +1,51 @@
+"""Mode incrémental de plex_ratings_sync.py: filigrane du magasin d'état"""
+
+from plex_ratings_sync import STATE_CONSUMER, PlexRatingsSync
+
+def make_syncer(plex_library, tmp_path, **config):
+    syncer = PlexRatingsSync(str(plex_library.db_path),
+                             {'deletion_journal': str(tmp_path / 'journal.jsonl'), **config})
+    syncer.enable_incremental(str(tmp_path / 'state.db'))
+    return syncer
+
+def test_watermark_advances_after_successful_run(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    plex_library.add_track(album, 'Piste', ratings={1: 8.0}, changed_at=4242)
+    syncer = make_syncer(plex_library, tmp_path)
+
+    result = syncer.sync_ratings(dry_run=False)
+
+    assert result['errors'] == 0
+    assert syncer.state_store.get_watermark(STATE_CONSUMER) == 4242
+
+def test_failed_snapshot_load_counts_error_and_keeps_watermark(plex_library, tmp_path):
+    plex_library.conn.execute("DROP TABLE metadata_item_settings")
+    plex_library.conn.commit()
+    syncer = make_syncer(plex_library, tmp_path)
+    syncer.state_store.set_watermark(STATE_CONSUMER, 100)
+
+    result = syncer.sync_ratings(dry_run=False)
+
+    assert result['errors'] >= 1
+    assert syncer.state_store.get_watermark(STATE_CONSUMER) == 100
+
+def test_unfinished_two_star_files_hold_the_watermark(plex_library, tmp_path, fake_songrec):
+    songrec = fake_songrec()
+    songrec.fail_marker.touch()
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    plex_library.add_track(album, 'En échec', ratings={1: 2.0}, file_name='fail.mp3', changed_at=5000)
+    plex_library.add_track(album, 'Reconnue', ratings={1: 2.0}, file_name='ok.mp3', changed_at=6000)
+    config = {'songrec_bin': str(songrec.bin), 'songrec_cache': False}
+
+    first = make_syncer(plex_library, tmp_path, **config).sync_ratings(dry_run=False)
+
+    assert first['songrec_errors'] == 1
+    syncer = make_syncer(plex_library, tmp_path, **config)
+    assert syncer.state_store.get_watermark(STATE_CONSUMER) == 5000
+
+    # songrec répond de nouveau: seul le fichier en échec est réidentifié
+    songrec.fail_marker.unlink()
+    second = syncer.sync_ratings(dry_run=False)
+
+    assert second['songrec_processed'] == 1 and second['songrec_identified'] == 1
+    assert syncer.state_store.get_watermark(STATE_CONSUMER) == 6000
@@ -0,0 +1,44 @@
+"""Correspondances de préfixes Plex <-> hôte"""
+
+import threading
+
+import pytest
+
+from path_mapping import PathMapper, parse_path_mapping
+
+def test_longest_prefix_wins_and_reverses():
+    mapper = PathMapper([('/music', '/mnt/music'), ('/music/live', '/mnt/live')])
+
+    assert mapper.to_host('/music/live/a.mp3') == '/mnt/live/a.mp3'
+    assert mapper.to_host('/music/b.mp3') == '/mnt/music/b.mp3'
+    assert mapper.to_host('/music2/b.mp3') == '/music2/b.mp3'
+    assert mapper.to_plex('/mnt/live/a.mp3') == '/music/live/a.mp3'
+    assert mapper.mapped_count == 2
+
+def test_two_plex_prefixes_on_one_host_prefix_are_rejected():
+    with pytest.raises(ValueError, match='/mnt/music'):
+        PathMapper([parse_path_mapping('/music=/mnt/music'), parse_path_mapping('/data/music/=/mnt/music')])
+
+def test_one_plex_prefix_on_two_host_prefixes_is_rejected():
+    with pytest.raises(ValueError, match='/music'):
+        PathMapper([('/music', '/mnt/a'), ('/music/', '/mnt/b')])
+
+def test_repeated_mapping_is_accepted():
+    mapper = PathMapper([('/music', '/mnt/music'), ('/music/', '/mnt/music/')])
+    assert mapper.to_plex('/mnt/music/a.mp3') == '/music/a.mp3'
+
+def test_mapped_count_is_exact_across_threads():
+    mapper = PathMapper([('/music', '/mnt/music')])
+    per_thread = 20000
+
+    def worker():
+        for _ in range(per_thread):
+            mapper.to_host('/music/a.mp3')
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mapper.mapped_count == 8 * per_thread
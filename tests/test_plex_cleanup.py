@@ -0,0 +1,21 @@
+"""Nettoyage de la base Plex après suppression des fichiers"""
+
+from plex_ratings_sync import PlexRatingsSync
+
+def test_settings_shared_with_a_surviving_item_are_kept(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    deleted = plex_library.add_track(album, 'Supprimée', ratings={1: 1.0})
+    plex_library.add_track(album, 'Conservée', file_name='kept.mp3')
+    lonely = plex_library.add_track(album, 'Seule', ratings={1: 1.0, 2: 3.0})
+    # Deux éléments Plex pour le même guid (même piste dans deux sections)
+    plex_library.conn.execute("UPDATE metadata_items SET guid = (SELECT guid FROM metadata_items WHERE title = 'Supprimée') "
+                              "WHERE title = 'Conservée'")
+    plex_library.conn.commit()
+    syncer = PlexRatingsSync(str(plex_library.db_path), {'deletion_journal': str(tmp_path / 'journal.jsonl')})
+
+    cleaned = syncer.cleanup_plex_database([{'file_path': str(deleted)}, {'file_path': str(lonely)}])
+
+    assert cleaned == 2
+    guids = {row[0] for row in plex_library.conn.execute("SELECT guid FROM metadata_item_settings")}
+    shared_guid = plex_library.conn.execute("SELECT guid FROM metadata_items WHERE title = 'Conservée'").fetchone()[0]
+    assert guids == {shared_guid}
@@ -0,0 +1,56 @@
+"""Index local des ratings (rating_index.py): choix du compte et rafraîchissement incrémental"""
+
+from rating_index import RatingIndex
+
+def plex_uri(plex_library) -> str:
+    return f"{plex_library.db_path.as_uri()}?mode=ro"
+
+def indexed_ratings(index: RatingIndex):
+    return sorted((row[7], row[5]) for row in index.rated_tracks())
+
+def test_owner_rating_wins_whatever_the_row_order(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    first = plex_library.add_track(album, 'Piste 1', ratings={2: 10.0, 1: 2.0})
+    second = plex_library.add_track(album, 'Piste 2', ratings={1: 4.0, 2: 10.0})
+    index = RatingIndex(str(tmp_path / 'index.db'))
+
+    index.refresh(plex_uri(plex_library))
+
+    assert indexed_ratings(index) == [(str(first), 2.0), (str(second), 4.0)]
+
+def test_unchanged_library_rereads_only_the_latest_change(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    plex_library.add_track(album, 'Ancienne', ratings={1: 8.0, 2: 6.0}, changed_at=10)
+    plex_library.add_track(album, 'Récente', ratings={1: 8.0}, changed_at=500)
+    index = RatingIndex(str(tmp_path / 'index.db'))
+    index.refresh(plex_uri(plex_library))
+
+    # Filigrane inclusif: seule la piste au dernier horodatage est relue
+    assert index.refresh(plex_uri(plex_library)) == (1, 0)
+
+def test_new_file_and_removed_track_are_picked_up(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    kept = plex_library.add_track(album, 'Gardée', ratings={1: 8.0}, changed_at=10)
+    gone = plex_library.add_track(album, 'Supprimée', ratings={1: 2.0}, changed_at=10)
+    plex_library.add_track(album, 'Récente', ratings={1: 6.0}, changed_at=500)
+    index = RatingIndex(str(tmp_path / 'index.db'))
+    index.refresh(plex_uri(plex_library))
+
+    # Second fichier pour une piste inchangée (changed_at sous le filigrane)
+    kept_id = plex_library.conn.execute(
+        "SELECT media_item_id FROM media_parts WHERE file = ?", (str(kept),)).fetchone()[0]
+    extra = plex_library.music_dir / 'gardee-bis.flac'
+    plex_library.conn.execute("INSERT INTO media_parts (media_item_id, file) VALUES (?, ?)", (kept_id, str(extra)))
+    # Piste retirée de Plex
+    gone_id = plex_library.conn.execute(
+        "SELECT media_item_id FROM media_parts WHERE file = ?", (str(gone),)).fetchone()[0]
+    plex_library.conn.execute("DELETE FROM media_parts WHERE media_item_id = ?", (gone_id,))
+    plex_library.conn.execute("DELETE FROM metadata_items WHERE id = ?", (gone_id,))
+    plex_library.conn.commit()
+
+    refreshed, removed = index.refresh(plex_uri(plex_library))
+
+    files = [path for path, _rating in indexed_ratings(index)]
+    assert str(extra) in files
+    assert str(gone) not in files
+    assert removed == 1
@@ -0,0 +1,16 @@
+"""Histogrammes --stats calculés dans SQLite"""
+
+from rating_stats import collect_rating_stats
+
+def test_several_accounts_count_each_item_once_with_the_owner_rating(plex_library):
+    artist = plex_library.add_artist('Artiste', ratings={2: 1.0, 1: 4.0})
+    album = plex_library.add_album(artist, 'Album', ratings={2: 5.0, 1: 2.0})
+    for n in range(3):
+        plex_library.add_track(album, f"Piste {n}", ratings={2: 1.0, 1: 3.0})
+
+    stats = collect_rating_stats(plex_library.conn.cursor(), breakdown='album')
+
+    assert stats['tracks'] == {3.0: 3}
+    assert stats['albums'] == {2.0: 1}
+    assert stats['artists'] == {4.0: 1}
+    assert stats['breakdown'] == {'Album': {3.0: 3}}
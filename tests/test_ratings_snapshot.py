@@ -0,0 +1,34 @@
+"""Instantané des ratings (plex_ratings_sync.py) sur une base à plusieurs comptes Plex"""
+
+from plex_ratings_sync import PlexRatingsSync
+
+def build_library(plex_library):
+    artist = plex_library.add_artist('Artiste')
+    album = plex_library.add_album(artist, 'Album 1 étoile', ratings={2: 1.0, 1: 1.0})
+    # Compte 2 enregistré avant le propriétaire: le compte 1 doit quand même l'emporter
+    files = [plex_library.add_track(album, f"Piste {n}", ratings={2: 10.0, 1: 1.0}) for n in range(4)]
+    other = plex_library.add_album(artist, 'Autre album')
+    plex_library.add_track(other, 'Non notée')
+    return files
+
+def test_snapshot_has_one_row_per_track_with_several_accounts(plex_library):
+    files = build_library(plex_library)
+    syncer = PlexRatingsSync(str(plex_library.db_path))
+
+    snapshot = syncer.load_ratings_snapshot()
+
+    assert len(snapshot) == 5
+    one_star = [f['file_path'] for f in snapshot.iter_rated_tracks(1.0)]
+    assert sorted(one_star) == sorted(str(f) for f in files)
+    assert list(snapshot.iter_rated_tracks(5.0)) == []
+
+def test_plan_counts_album_files_once(plex_library):
+    build_library(plex_library)
+    syncer = PlexRatingsSync(str(plex_library.db_path))
+
+    counts = syncer.build_plan()['counts']
+
+    assert counts['albums_1_star'] == 1
+    assert counts['files_from_albums_1_star'] == 4
+    assert counts['files_from_tracks_1_star'] == 4
+    assert counts['files_1_star_total'] == 4
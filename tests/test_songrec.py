@@ -0,0 +1,56 @@
+"""Identifications songrec concurrentes: borne de parallélisme, échéance globale, rapport"""
+
+from plex_ratings_sync import PlexRatingsSync
+
+def make_syncer(plex_library, tmp_path, songrec, **config):
+    return PlexRatingsSync(str(plex_library.db_path), {
+        'deletion_journal': str(tmp_path / 'journal.jsonl'),
+        'songrec_bin': str(songrec.bin),
+        'songrec_cache': False,
+        **config
+    })
+
+def two_star_tracks(plex_library, count: int):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    return [plex_library.add_track(album, f"Piste {n}", ratings={1: 2.0}) for n in range(count)]
+
+def test_identifications_never_exceed_songrec_jobs(plex_library, tmp_path, fake_songrec):
+    songrec = fake_songrec(delay=0.3)
+    two_star_tracks(plex_library, 6)
+
+    result = make_syncer(plex_library, tmp_path, songrec, songrec_jobs=3).sync_ratings(dry_run=True)
+
+    assert result['songrec_processed'] == 6
+    assert result['songrec_identified'] == 6
+    assert result['songrec_deadline_skipped'] == 0
+    assert songrec.max_concurrency() == 3
+
+def test_deadline_stops_new_identifications_and_reports_the_rest(plex_library, tmp_path, fake_songrec):
+    songrec = fake_songrec(delay=0.6)
+    files = two_star_tracks(plex_library, 6)
+    syncer = make_syncer(plex_library, tmp_path, songrec, songrec_jobs=2, songrec_deadline=1.0)
+    syncer.load_ratings_snapshot()
+
+    # Lancements à ~0 s et ~0,6 s; à ~1,2 s l'échéance est passée
+    results = syncer.process_two_star_files(syncer.get_files_with_rating(2.0))
+
+    assert results['processed'] == 4
+    assert results['deadline_skipped'] == 2
+    started = {path for event, _instant, path in songrec.runs() if event == 'start'}
+    skipped = {detail['file_path'] for detail in results['file_details'] if detail['status'] == 'deadline_exceeded'}
+    assert len(started) == 4 and len(skipped) == 2
+    assert started | skipped == {str(f) for f in files}
+    assert not started & skipped
+
+def test_songrec_failure_is_counted_as_an_error(plex_library, tmp_path, fake_songrec):
+    songrec = fake_songrec()
+    songrec.fail_marker.touch()
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    plex_library.add_track(album, 'Ratée', ratings={1: 2.0}, file_name='fail.mp3')
+    plex_library.add_track(album, 'Reconnue', ratings={1: 2.0}, file_name='ok.mp3')
+
+    result = make_syncer(plex_library, tmp_path, songrec).sync_ratings(dry_run=True)
+
+    assert result['songrec_processed'] == 2
+    assert result['songrec_identified'] == 1
+    assert result['songrec_errors'] == 1
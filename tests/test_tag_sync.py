@@ -0,0 +1,150 @@
+"""Écriture des ratings dans les tags (plex_rating_sync_complete.py, sync_ratings_to_id3.py)"""
+
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+pytest.importorskip('mutagen')
+
+from plex_rating_sync_complete import STATE_CONSUMER, PlexRatingSync
+from sync_ratings_to_id3 import RatingSync
+from sync_state import SyncStateStore
+
+def rated_library(plex_library, tracks: int = 21):
+    """Pistes notées par deux comptes: le propriétaire (1) et un second compte (2)"""
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    return [plex_library.add_track(album, f"Piste {n}", ratings={2: 2.0, 1: 8.0}, view_count=n)
+            for n in range(tracks)]
+
+def counting_writes(syncer: PlexRatingSync) -> Counter:
+    """Compte les écritures par fichier et échoue si deux se chevauchent sur le même fichier"""
+    writes = Counter()
+    active = set()
+    lock = threading.Lock()
+    write_tags = syncer.write_tags
+
+    def write(track, pending):
+        with lock:
+            assert track.file_path not in active, f"écritures simultanées: {track.file_path}"
+            active.add(track.file_path)
+            writes[track.file_path] += 1
+        try:
+            return write_tags(track, pending)
+        finally:
+            with lock:
+                active.discard(track.file_path)
+
+    syncer.write_tags = write
+    return writes
+
+def test_iter_plex_ratings_reads_owner_rating_once_per_track(plex_library):
+    files = rated_library(plex_library, tracks=3)
+    syncer = PlexRatingSync(str(plex_library.db_path))
+
+    tracks = list(syncer.iter_plex_ratings())
+
+    assert sorted(track.file_path for track in tracks) == sorted(str(f) for f in files)
+    assert {track.rating for track in tracks} == {4.0}
+
+def test_parallel_sync_writes_each_file_once_with_several_accounts(plex_library, tmp_path):
+    files = rated_library(plex_library)
+    syncer = PlexRatingSync(str(plex_library.db_path))
+    writes = counting_writes(syncer)
+
+    stats = syncer.sync_all_ratings(state_db=str(tmp_path / 'state.db'), jobs=4)
+
+    assert stats['success']
+    assert stats['total_ratings'] == len(files)
+    assert stats['written'] == len(files)
+    assert set(writes.values()) == {1}
+
+def test_file_shared_by_several_tracks_has_a_single_writer(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    shared = [plex_library.add_track(album, f"Version {n}", ratings={1: 2.0 + n % 4}, file_name=f"{n % 3}.mp3")
+              for n in range(12)]
+    syncer = PlexRatingSync(str(plex_library.db_path))
+    writes = counting_writes(syncer)
+
+    stats = syncer.sync_all_ratings(state_db=str(tmp_path / 'state.db'), jobs=4, read_jobs=4)
+
+    assert stats['success']
+    assert stats['written'] == 3
+    assert stats['duplicates'] == 9
+    assert writes == Counter({str(path): 1 for path in set(shared)})
+
+def test_id3_sync_ignores_duplicate_files(plex_library, tmp_path):
+    files = rated_library(plex_library, tracks=5)
+    entries = [{'file_path': str(f), 'rating': rating, 'play_count': 1}
+               for rating in (4.0, 1.0) for f in files]
+    json_file = tmp_path / 'ratings.json'
+    json_file.write_text(json.dumps(entries), encoding='utf-8')
+
+    stats = RatingSync().sync_ratings_from_json(json_file, jobs=4)
+
+    assert stats['processed'] == len(files)
+    assert stats['duplicates'] == len(files)
+
+def test_id3_jsonl_sync_ignores_duplicate_files(plex_library, tmp_path):
+    files = rated_library(plex_library, tracks=5)
+    jsonl_file = tmp_path / 'ratings.jsonl'
+    jsonl_file.write_text(''.join(json.dumps({'file_path': str(f), 'rating': 4.0}) + '\n'
+                                  for f in files + files), encoding='utf-8')
+
+    stats = RatingSync().sync_ratings_from_jsonl(jsonl_file, jobs=4)
+
+    assert stats['processed'] == len(files)
+    assert stats['duplicates'] == len(files)
+
+def test_interrupted_run_resumes_after_its_checkpoint(plex_library, tmp_path):
+    files = rated_library(plex_library, tracks=10)
+    state_db = str(tmp_path / 'state.db')
+
+    # Premier run: le disque « disparaît » à la 5e écriture
+    interrupted = PlexRatingSync(str(plex_library.db_path))
+    first_writes = counting_writes(interrupted)
+    write_tags = interrupted.write_tags
+    def failing_write(track, pending):
+        if sum(first_writes.values()) == 4:
+            raise OSError('disque démonté')
+        return write_tags(track, pending)
+    interrupted.write_tags = failing_write
+
+    assert not interrupted.sync_all_ratings(state_db=state_db)['success']
+    assert len(first_writes) == 4
+
+    # Reprise: seules les pistes après le point de reprise sont relues
+    resumed = PlexRatingSync(str(plex_library.db_path))
+    second_writes = counting_writes(resumed)
+    stats = resumed.sync_all_ratings(state_db=state_db, resume=True)
+
+    assert stats['success']
+    # Point de reprise prudent: quelques pistes déjà écrites peuvent être relues (inchangées)
+    assert len(files) - len(first_writes) <= stats['total_ratings'] < len(files)
+    assert set(first_writes) | set(second_writes) == {str(f) for f in files}
+    assert not set(first_writes) & set(second_writes)
+    assert SyncStateStore(state_db).get_checkpoint(STATE_CONSUMER) is None
+
+def test_missing_file_is_retried_by_the_next_incremental_run(plex_library, tmp_path):
+    album = plex_library.add_album(plex_library.add_artist('Artiste'), 'Album')
+    missing = plex_library.add_track(album, 'Disque démonté', ratings={1: 4.0}, changed_at=5000)
+    present = plex_library.add_track(album, 'Présente', ratings={1: 3.0}, changed_at=6000)
+    missing.unlink()
+    state_db = str(tmp_path / 'state.db')
+
+    first = PlexRatingSync(str(plex_library.db_path)).sync_all_ratings(incremental=True, state_db=state_db)
+
+    assert first['skipped'] == 1 and first['written'] == 1
+    assert SyncStateStore(state_db).get_watermark(STATE_CONSUMER) == 5000
+
+    # Le disque revient: la piste ignorée est relue et écrite, le filigrane avance
+    missing.write_bytes(b'')
+    syncer = PlexRatingSync(str(plex_library.db_path))
+    writes = counting_writes(syncer)
+    second = syncer.sync_all_ratings(incremental=True, state_db=state_db)
+
+    assert second['skipped'] == 0 and second['up_to_date'] == 1
+    assert writes == Counter({str(missing): 1})
+    assert str(present) not in writes
+    assert SyncStateStore(state_db).get_watermark(STATE_CONSUMER) == 6000